@@ -1,25 +1,63 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
-from typing import List
-from app.services.rag_pipeline import query_multi_pdf_collections
+from typing import List, Optional
+from app.services.rag_pipeline import query_multi_pdf_collections, stream_multi_pdf_answer
+from app.db.collection_catalog import UnknownCollectionError
+from app.api.streaming import FORMAT_PATTERN, SSE, event_response
 
 router = APIRouter()
 
 class QuestionRequest(BaseModel):
     question: str = Field(..., example="What is the key innovation in these papers?")
     collection_names: List[str] = Field(..., example=["paper_0_llm", "paper_1_diffusion"])
+    deadline_ms: Optional[int] = Field(None, gt=0, description="Answer from the papers searched within this many ms")
 
-@router.post("/ask-question")
-async def ask_question(payload: QuestionRequest):
+def _validate(payload: QuestionRequest):
     if not payload.collection_names or not payload.question.strip():
         raise HTTPException(status_code=400, detail="Question and collection_names are required.")
 
+@router.post("/ask-question")
+async def ask_question(payload: QuestionRequest):
+    _validate(payload)
+
     try:
         response = await query_multi_pdf_collections(
             collection_names=payload.collection_names,
-            question=payload.question
+            question=payload.question,
+            deadline_ms=payload.deadline_ms,
         )
+    except UnknownCollectionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG pipeline error: {str(e)}")
 
     return {"answer": response}
+
+@router.post("/ask-question/stream")
+async def ask_question_stream(payload: QuestionRequest, format: str = Query(SSE, pattern=FORMAT_PATTERN)):
+    """
+    Same answer as /ask-question, relayed as "token" events while the model writes
+    it and closed by a "done" event carrying the full answer.
+    """
+    _validate(payload)
+
+    # Retrieval errors still surface as HTTP errors; only generation is streamed
+    try:
+        pieces = await stream_multi_pdf_answer(
+            collection_names=payload.collection_names,
+            question=payload.question,
+            deadline_ms=payload.deadline_ms,
+        )
+    except UnknownCollectionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"RAG pipeline error: {str(e)}")
+
+    async def events():
+        parts = []
+        async for piece in pieces:
+            parts.append(piece)
+            yield "token", {"text": piece}
+        yield "done", {"answer": "".join(parts)}
+
+    return event_response(events(), format)
@@ -1,24 +1,56 @@
 # app/api/generate.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from typing import List
-from app.services.summarizer import summarize_papers
+from app.services.summarizer import SummaryProgress, stream_record_summary, summarize_records
 from app.models.pdf_log import PDFLog
 from app.models.schemas import SimpleSummary  # ✅ Use from your schema
+from app.api.streaming import FORMAT_PATTERN, SSE, event_response, merge_streams
 
 router = APIRouter()
 
-@router.post("/generate-summary/latest", response_model=List[SimpleSummary])
-async def generate_summary_latest_pdfs(limit: int = 2):
+async def _latest_records(limit: int):
     records = await PDFLog.all().order_by("-uploaded_at").limit(limit)
 
     if not records:
         raise HTTPException(status_code=404, detail="No uploaded PDFs found.")
+    return records
 
-    paper_titles = [record.title for record in records]
-    paper_texts = [getattr(record, "full_text", record.full_text) for record in records]
+@router.post("/generate-summary/latest", response_model=List[SimpleSummary])
+async def generate_summary_latest_pdfs(limit: int = 2):
+    records = await _latest_records(limit)
 
-    summaries = await summarize_papers(paper_titles, paper_texts)
+    # Unchanged papers are answered from PDFLog.summary without calling the model
+    summaries = await summarize_records(records)
 
     # Ensure they match the structure expected by SimpleSummary
     return [SimpleSummary(**summary) for summary in summaries]
+
+@router.post("/generate-summary/latest/stream")
+async def generate_summary_latest_pdfs_stream(limit: int = 2, format: str = Query(SSE, pattern=FORMAT_PATTERN)):
+    """
+    Summaries of the latest papers, generated concurrently. Emits a "paper" event
+    per paper, then, tagged with the paper's index, "progress" events while its
+    chunks are summarized and combined, "token" events as its summary is written
+    and a "summary" event when it completes, and a final "done".
+    """
+    records = await _latest_records(limit)
+
+    async def paper_events(record):
+        parts = []
+        async for piece in stream_record_summary(record):
+            if isinstance(piece, SummaryProgress):
+                yield "progress", piece.as_dict()
+                continue
+            parts.append(piece)
+            yield "token", {"text": piece}
+        yield "summary", SimpleSummary(title=record.title, summary="".join(parts).strip()).model_dump()
+
+    async def events():
+        for index, record in enumerate(records):
+            yield "paper", {"index": index, "title": record.title}
+        async for index, (event, data) in merge_streams([paper_events(record) for record in records]):
+            yield event, {"index": index, **data}
+        yield "done", {}
+
+    return event_response(events(), format)
@@ -0,0 +1,96 @@
+# app/api/ingest.py
+
+import os
+import tempfile
+
+from celery.result import AsyncResult
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.models.schemas import IngestJobResponse, IngestJobStatus
+from app.services.ingest_pipeline import find_paper_by_content
+from app.tasks import (
+    STAGE_PROGRESS,
+    celery_app,
+    claim_ingest_job,
+    ingest_job_id,
+    ingest_pdf,
+    release_ingest_job,
+    upload_path,
+)
+from app.utils.config import settings
+from app.utils.hashing import sha256_hex
+
+router = APIRouter()
+
+
+def _save_upload(contents: bytes, content_sha256: str) -> None:
+    """
+    Write the upload atomically to its content-addressed path.
+    """
+    path = upload_path(content_sha256)
+    if os.path.exists(path):
+        return
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.UPLOAD_DIR, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(contents)
+    os.replace(tmp_path, path)
+
+
+@router.post("/ingest", status_code=202, response_model=IngestJobResponse)
+async def ingest(file: UploadFile = File(...)):
+    """
+    Store the upload and queue a background ingest job; poll the returned status URL.
+    A file that is already ingested, or already queued, is not stored or queued again.
+    """
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail=f"File '{file.filename}' is not a valid PDF.")
+
+    contents = await file.read()
+    content_sha256 = sha256_hex(contents)
+    job_id = ingest_job_id(content_sha256)
+    status_url = f"/api/ingest/{job_id}"
+
+    if await find_paper_by_content(content_sha256):
+        return IngestJobResponse(job_id=job_id, status="SUCCESS", status_url=status_url)
+
+    # Only the request that sets the marker stores the file and queues the job
+    if not await run_in_threadpool(claim_ingest_job, job_id):
+        state = AsyncResult(job_id, app=celery_app).state
+        return IngestJobResponse(job_id=job_id, status=state, status_url=status_url)
+
+    try:
+        await run_in_threadpool(_save_upload, contents, content_sha256)
+        ingest_pdf.apply_async(args=[file.filename, content_sha256], task_id=job_id)
+    except Exception:
+        await run_in_threadpool(release_ingest_job, job_id)
+        raise
+
+    return IngestJobResponse(job_id=job_id, status="PENDING", status_url=status_url)
+
+
+@router.get("/ingest/{job_id}", response_model=IngestJobStatus)
+async def ingest_status(job_id: str):
+    result = AsyncResult(job_id, app=celery_app)
+    status = IngestJobStatus(job_id=job_id, status=result.state)
+
+    if result.state == "PENDING":
+        # Unknown to the backend: the paper may have been ingested before (or its result expired)
+        paper = await find_paper_by_content(job_id.removeprefix("ingest-"))
+        if paper:
+            status.status, status.stage, status.progress = "SUCCESS", "done", STAGE_PROGRESS["done"]
+            status.collection_name, status.title = paper.collection_name, paper.title
+        else:
+            status.stage, status.progress = "queued", STAGE_PROGRESS["queued"]
+    elif result.state == "PROGRESS" and isinstance(result.info, dict):
+        status.stage = result.info.get("stage")
+        status.progress = result.info.get("progress")
+    elif result.state == "SUCCESS":
+        status.stage, status.progress = "done", STAGE_PROGRESS["done"]
+        status.collection_name = result.result.get("collection_name")
+        status.title = result.result.get("title")
+    elif result.state in ("FAILURE", "RETRY"):
+        status.error = str(result.info)
+
+    return status
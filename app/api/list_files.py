@@ -1,5 +1,7 @@
 from fastapi import APIRouter
+from starlette.concurrency import run_in_threadpool
 from app.models.pdf_log import PDFLog
+from app.db.collection_catalog import get_collection_catalog
 from typing import List 
 
 router = APIRouter()
@@ -18,5 +20,11 @@ async def list_uploaded_pdfs():
     ]
 @router.get("/list-uploaded-collections", response_model=List[str])
 async def list_uploaded_collections():
-    collections = await PDFLog.all().distinct().values_list("collection_name", flat=True)
-    return collections
\ No newline at end of file
+    # Served from the in-process catalog; it only touches the store when stale, and
+    # pdf_logs only for papers another process stored since the last re-list
+    catalog = get_collection_catalog()
+    unchecked = await run_in_threadpool(catalog.unlogged_names)
+    if unchecked:
+        found = await PDFLog.filter(collection_name__in=unchecked).values_list("collection_name", flat=True)
+        catalog.mark_logged(found, checked=unchecked)
+    return await run_in_threadpool(catalog.names)
@@ -0,0 +1,77 @@
+# app/api/streaming.py
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, List, Tuple
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger("uvicorn.error")
+
+# Wire formats of the streaming endpoints (`format` query parameter)
+SSE = "sse"
+NDJSON = "ndjson"
+FORMAT_PATTERN = f"^({SSE}|{NDJSON})$"
+
+MEDIA_TYPES = {SSE: "text/event-stream", NDJSON: "application/x-ndjson"}
+
+_DONE = object()
+
+
+def encode_event(fmt: str, event: str, data: dict) -> str:
+    """
+    One event: an SSE frame, or an NDJSON line with the event name under "event".
+    """
+    if fmt == SSE:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
+
+
+def event_response(events: AsyncIterator[Tuple[str, dict]], fmt: str) -> StreamingResponse:
+    """
+    Stream (event, data) pairs to the client as they are produced. A failure after
+    the response has started is reported as a final "error" event.
+    """
+    async def body():
+        try:
+            async for event, data in events:
+                yield encode_event(fmt, event, data)
+        except Exception as e:
+            logger.error(f"❌ Stream aborted: {e}")
+            yield encode_event(fmt, "error", {"detail": str(e)})
+
+    # no-cache / no proxy buffering, so every event reaches the client immediately
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+async def merge_streams(streams: List[AsyncIterator[Any]]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Items of several async iterators as (stream index, item), in arrival order.
+    The first failure is re-raised; leaving early cancels the rest.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump(index: int, stream: AsyncIterator[Any]):
+        try:
+            async for item in stream:
+                await queue.put((index, item))
+            await queue.put((index, _DONE))
+        except Exception as e:
+            await queue.put((index, e))
+
+    tasks = [asyncio.create_task(pump(i, stream)) for i, stream in enumerate(streams)]
+    try:
+        running = len(tasks)
+        while running:
+            index, item = await queue.get()
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield index, item
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,24 +1,26 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from starlette.concurrency import run_in_threadpool
-from typing import List
-from uuid import uuid4
-from app.utils.sanitizer import sanitize_collection_name, sanitize_text
+import asyncio
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from typing import List, Optional, Tuple
+from app.models.paper_comparison import PaperComparison
 from app.models.pdf_log import PDFLog
-from app.services.pdf_extractor import extract_pdf_data
+from app.services.ingest_pipeline import IngestError, chunk_position, find_paper_by_content, ingest_files
 from app.services.embeddings import embed_and_store
-from app.db.chroma_db import get_or_create_collection
+from app.db.chroma_db import get_paper_chunks
 from app.models.schemas import ComparisonResult
 import logging
-import asyncio
-from app.services.novelty_detector import get_unique_chunks
-from mistralai.client import MistralClient
+import numpy as np
+from app.services.novelty_detector import get_unique_chunks_for_papers
+from app.services.context_packer import context_budget, pack_context
+from app.services.quantization import quantize
+from app.services.llm_gateway import chat, chat_stream
+from app.api.streaming import FORMAT_PATTERN, SSE, event_response, merge_streams
 from app.utils.config import settings
+from app.utils.hashing import sha256_hex
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 logger = logging.getLogger("uvicorn.error")
 
-mistral = MistralClient(api_key=settings.MISTRAL_API_KEY)
-
 PROMPT_TEMPLATE = """
 Compare the following research content for the paper titled "{title}" against other papers titled: {other_titles}.
 
@@ -46,8 +48,9 @@ Missing Gaps:
 <your answer>
 """
 
-MAX_CONTEXT_CHUNKS = 50      # max chunks to include in prompt
-MAX_CHUNK_CHARS = 1500      # max chars per chunk to avoid token overflow
+CHAT_MODEL = "mistral-medium"
+# Bump when the prompt or the novelty selection changes so stored comparisons are retired
+COMPARISON_VERSION = "compare-v1"
 
 
 def parse_rag_output(output: str) -> dict:
@@ -80,130 +83,300 @@ def parse_rag_output(output: str) -> dict:
     return parsed
 
 
+def build_comparison_prompt(title: str, unique_chunks: List[dict], other_titles: List[str]) -> str:
+    # Merge overlapping chunks, drop near-duplicates and fill the model's token budget
+    budget = context_budget(CHAT_MODEL, PROMPT_TEMPLATE.format(title=title, other_titles=", ".join(other_titles), context=""))
+    context = pack_context(
+        [
+            {"text": chunk["text"], "vector": chunk.get("embedding"), "position": chunk_position(chunk.get("id"))}
+            for chunk in unique_chunks
+        ],
+        budget,
+    )
+
+    # Formulate prompt with context and question (with explicit title and other_titles)
+    return PROMPT_TEMPLATE.format(title=title, other_titles=", ".join(other_titles), context=context)
+
+
 async def generate_full_rag_summary(title: str, unique_chunks: List[dict], other_titles: List[str]) -> str:
     """
     Build prompt and query Mistral LLM to get full RAG output (novelty, similarity, gaps).
     """
-    # Prepare context by joining unique chunks, trimming each chunk
-    texts = [
-        chunk["text"][:MAX_CHUNK_CHARS] + "..." if len(chunk["text"]) > MAX_CHUNK_CHARS else chunk["text"] 
-        for chunk in unique_chunks
-    ]
+    # Tokenizing and packing the context is CPU-bound; keep it off the event loop
+    prompt = await run_in_threadpool(build_comparison_prompt, title, unique_chunks, other_titles)
 
-    # Limit total chunks to avoid huge prompt
-    texts = texts[:MAX_CONTEXT_CHUNKS]
+    return await chat(CHAT_MODEL, prompt)
 
-    context = "\n\n---\n\n".join(texts)
 
-    # Formulate prompt with context and question (with explicit title and other_titles)
-    prompt = PROMPT_TEMPLATE.format(title=title, other_titles=", ".join(other_titles), context=context)
-
-    # Run blocking call in executor to not block event loop
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        None,
-        lambda: mistral.chat(
-            model="mistral-medium",
-            messages=[{"role": "user", "content": prompt}]
-        )
+async def save_comparison(title: str, collection_name: str, rag_output: str) -> ComparisonResult:
+    """
+    Parse a comparison answer, store its sections on the paper's log and return them.
+    """
+    parsed = parse_rag_output(rag_output)
+
+    # Save back to DB (the collection identifies the paper; titles are not unique)
+    log = await PDFLog.filter(collection_name=collection_name).first()
+    if log:
+        log.novel_insights = parsed["novel_insights"]
+        log.similarities = parsed["similarities"]
+        log.missing_gaps = parsed["missing_gaps"]
+        await log.save()
+
+    return ComparisonResult(
+        title=title,
+        novel_insights=[parsed["novel_insights"]],
+        similarities=[parsed["similarities"]],
+        missing_gaps=[parsed["missing_gaps"]]
     )
 
-    return response.choices[0].message.content
 
+def comparison_key(content_hashes: List[str]) -> str:
+    # The same papers uploaded in any order (or twice) compare the same way
+    return sha256_hex(COMPARISON_VERSION, CHAT_MODEL, *sorted(set(content_hashes)))
 
-@router.post("/upload-and-compare", response_model=List[ComparisonResult])
-async def upload_and_compare(files: List[UploadFile] = File(...)):
+
+async def stored_comparison(content_hashes: List[str]) -> Optional[List[ComparisonResult]]:
+    """
+    Results of an earlier comparison of the same set of papers, in upload order.
+    """
+    record = await PaperComparison.get_or_none(key=comparison_key(content_hashes))
+    if record is None or not all(h in record.results for h in content_hashes):
+        return None
+    return [ComparisonResult(**record.results[h]) for h in content_hashes]
+
+
+async def store_comparison(content_hashes: List[str], results: List[ComparisonResult]) -> None:
+    await PaperComparison.update_or_create(
+        key=comparison_key(content_hashes),
+        defaults={"results": {h: result.model_dump() for h, result in zip(content_hashes, results)}},
+    )
+
+
+async def read_uploads(files: List[UploadFile]) -> List[Tuple[UploadFile, bytes, str]]:
+    """
+    Validate the uploads and read them. Returns (file, contents, content hash) per upload.
+    """
     if not (2 <= len(files) <= 5):
         raise HTTPException(status_code=400, detail="Please upload between 2 to 5 PDF files.")
 
-    collection_names = []
-    paper_titles = []
-
-    # UPLOAD + EMBEDDING PHASE
     for file in files:
         if not file.filename.endswith(".pdf"):
             raise HTTPException(status_code=400, detail=f"File '{file.filename}' is not a valid PDF.")
 
+    uploads = []
+    for file in files:
         try:
-            existing_log = await PDFLog.filter(filename=file.filename).first()
-
-            if not existing_log:
-                contents = await file.read()
-                result = await run_in_threadpool(extract_pdf_data, contents, file.filename)
-
-                base_name = file.filename.replace(".pdf", "")
-                safe_name = sanitize_collection_name(base_name)
-                collection_name = f"{safe_name}_{uuid4().hex[:8]}"
-
-                clean_title = sanitize_text(result["title"])
-                clean_excerpt = sanitize_text(result["text_excerpt"])
-                clean_full_text = sanitize_text(result["text"])
+            contents = await file.read()
+        except Exception as e:
+            logger.exception(f"Failed to process '{file.filename}'.")
+            raise HTTPException(status_code=500, detail=f"Failed to process '{file.filename}': {e}")
+        uploads.append((file, contents, sha256_hex(contents)))
+    return uploads
 
-                await embed_and_store(clean_full_text, collection_name)
 
-                await PDFLog.create(
-                    filename=file.filename,
-                    title=clean_title,
-                    collection_name=collection_name,
-                    text_excerpt=clean_excerpt,
-                    full_text=clean_full_text,
-                )
+async def prepare_comparison(uploads: List[Tuple[UploadFile, bytes, str]]) -> Tuple[List[str], List[str], List[List[dict]]]:
+    """
+    Ingest the uploads (reusing identical papers) and find each paper's unique chunks.
+    Returns (paper titles, collection names, unique chunks per paper).
+    """
+    collection_names = [None] * len(uploads)
+    paper_titles = [None] * len(uploads)
+    jobs = []
+    first_index = {}  # content hash -> index of the job ingesting it in this request
+    content_hashes = [content_hash for _, _, content_hash in uploads]
 
-                collection_names.append(collection_name)
-                paper_titles.append(clean_title)
+    # UPLOAD + EMBEDDING PHASE
+    for i, (file, contents, content_hash) in enumerate(uploads):
+        try:
+            # Identical bytes were ingested before: no extraction or embedding needed
+            existing_log = await find_paper_by_content(content_hash)
 
-            else:
-                collection_names.append(existing_log.collection_name)
-                paper_titles.append(existing_log.title)
+            if existing_log:
+                collection_names[i] = existing_log.collection_name
+                paper_titles[i] = existing_log.title
+            elif content_hash not in first_index:
+                first_index[content_hash] = i
+                jobs.append({"index": i, "filename": file.filename, "contents": contents, "content_sha256": content_hash})
 
         except Exception as e:
             logger.exception(f"Failed to process '{file.filename}'.")
             raise HTTPException(status_code=500, detail=f"Failed to process '{file.filename}': {e}")
 
+    # Extraction, embedding and storage overlap across files
+    try:
+        ingested = await ingest_files(jobs) if jobs else {}
+    except IngestError as e:
+        logger.exception(f"Failed to process '{e.filename}'.")
+        raise HTTPException(status_code=500, detail=f"Failed to process '{e.filename}': {e}")
+
+    for i in range(len(uploads)):
+        if collection_names[i] is None:
+            entry = ingested[first_index[content_hashes[i]]]
+            collection_names[i] = entry["collection_name"]
+            paper_titles[i] = entry["title"]
+
     # RETRIEVE EMBEDDINGS PER PDF
     all_papers_data = []
     for name in collection_names:
-        collection = get_or_create_collection(name)
-        paper_data = collection.get(include=["documents", "embeddings"])
+        paper_data = get_paper_chunks(name)
         if not paper_data or not paper_data.get("ids"):
             log_entry = await PDFLog.filter(collection_name=name).first()
             if log_entry and log_entry.full_text:
                 await embed_and_store(log_entry.full_text, name)
-                paper_data = collection.get(include=["documents", "embeddings"])
+                paper_data = get_paper_chunks(name)
             else:
                 raise HTTPException(status_code=404, detail=f"No stored text for '{name}' to re-embed.")
 
-        combined_data = [{"text": doc, "embedding": emb} for doc, emb in zip(paper_data["documents"], paper_data["embeddings"])]
+        # One compact matrix per paper; chunks hold row views into it
+        vectors = quantize(np.asarray(paper_data["embeddings"], dtype=np.float32), settings.EMBEDDING_QUANTIZATION)
+        combined_data = [
+            {"id": chunk_id, "text": doc, "embedding": vectors[i]}
+            for i, (chunk_id, doc) in enumerate(zip(paper_data["ids"], paper_data["documents"]))
+        ]
         all_papers_data.append(combined_data)
 
-    results = []
+    # Novelty for all papers at once: every cross-paper block is computed a single time
+    unique_per_paper = await get_unique_chunks_for_papers(all_papers_data)
+    return paper_titles, collection_names, unique_per_paper
 
-    # For each PDF, find unique chunks, then generate full RAG output focused on that PDF
-    for i in range(len(paper_titles)):
-        base_title = paper_titles[i]
-        base_chunks = all_papers_data[i]
 
+def comparison_deadline() -> Optional[float]:
+    return settings.COMPARE_DEADLINE_SECONDS or None
+
+
+def _deadline_message() -> str:
+    return f"Comparison deadline of {settings.COMPARE_DEADLINE_SECONDS}s passed before this paper finished"
+
+
+def timed_out_result(title: str) -> ComparisonResult:
+    return ComparisonResult(title=title, novel_insights=[], similarities=[], missing_gaps=[], error=_deadline_message())
+
+
+async def compare_papers(paper_titles: List[str], collection_names: List[str], unique_per_paper: List[List[dict]]) -> List[ComparisonResult]:
+    """
+    Each paper's comparison against the others, COMPARE_MAX_CONCURRENCY papers at a
+    time and all within COMPARE_DEADLINE_SECONDS. The first failure cancels the rest.
+    Papers still running at the deadline are cancelled and come back as error entries
+    (see timed_out_result) next to the finished ones.
+    """
+    slots = asyncio.Semaphore(settings.COMPARE_MAX_CONCURRENCY)
+
+    async def compare(i: int) -> ComparisonResult:
+        base_title = paper_titles[i]
         others_titles = [paper_titles[j] for j in range(len(paper_titles)) if j != i]
-        other_chunks = [chunk for j in range(len(paper_titles)) if j != i for chunk in all_papers_data[j]]
+        async with slots:
+            # Generate full RAG output focused on the paper's unique chunks
+            rag_output = await generate_full_rag_summary(base_title, unique_per_paper[i], others_titles)
+        return await save_comparison(base_title, collection_names[i], rag_output)
+
+    tasks = [asyncio.create_task(compare(i)) for i in range(len(paper_titles))]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=comparison_deadline(), return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        # Cancelled comparisons must finish unwinding (release their slot, stop writing) first
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    failed = [task for task in done if task.exception() is not None]
+    if failed:
+        raise failed[0].exception()
+    if pending:
+        logger.warning(f"⏱️ Comparison deadline passed with {len(pending)} of {len(tasks)} papers unfinished")
+    return [timed_out_result(paper_titles[i]) if task in pending else task.result() for i, task in enumerate(tasks)]
 
-        unique_chunks = await get_unique_chunks(base_chunks, other_chunks)
 
-        rag_output = await generate_full_rag_summary(base_title, unique_chunks, others_titles)
-        parsed = parse_rag_output(rag_output)
+@router.post("/upload-and-compare", response_model=List[ComparisonResult])
+async def upload_and_compare(files: List[UploadFile] = File(...)):
+    uploads = await read_uploads(files)
+    content_hashes = [content_hash for _, _, content_hash in uploads]
+
+    # The same set of papers was compared before: nothing to ingest or generate
+    cached = await stored_comparison(content_hashes)
+    if cached is not None:
+        logger.info(f"Serving stored comparison of {len(cached)} papers")
+        return cached
 
-        # Save back to DB
-        log = await PDFLog.filter(title=base_title).first()
-        if log:
-            log.novel_insights = parsed["novel_insights"]
-            log.similarities = parsed["similarities"]
-            log.missing_gaps = parsed["missing_gaps"]
-            await log.save()
+    paper_titles, collection_names, unique_per_paper = await prepare_comparison(uploads)
 
-        results.append(ComparisonResult(
-            title=base_title,
-            novel_insights=[parsed["novel_insights"]],
-            similarities=[parsed["similarities"]],
-            missing_gaps=[parsed["missing_gaps"]]
-        ))
+    # Papers are compared concurrently, so the wait is about that of the slowest one
+    results = await compare_papers(paper_titles, collection_names, unique_per_paper)
 
+    # A comparison cut short by the deadline is returned but not stored
+    if not any(result.error for result in results):
+        await store_comparison(content_hashes, results)
     return results
+
+
+@router.post("/upload-and-compare/stream")
+async def upload_and_compare_stream(files: List[UploadFile] = File(...), format: str = Query(SSE, pattern=FORMAT_PATTERN)):
+    """
+    /upload-and-compare with the comparisons generated concurrently and streamed:
+    a "paper" event per paper, then, tagged with the paper's index, "token" events
+    as its comparison is written and a "result" event with its parsed sections
+    (a ComparisonResult) as soon as it is ready, and a final "done".
+    A stored comparison is replayed as "paper" and "result" events only.
+    Upload, ingest and novelty errors are still returned as HTTP errors. At a missed
+    deadline each unfinished paper gets an "error" event with its index, then "done";
+    such a partial comparison is not stored.
+    """
+    uploads = await read_uploads(files)
+    content_hashes = [content_hash for _, _, content_hash in uploads]
+    cached = await stored_comparison(content_hashes)
+
+    async def replay():
+        for i, result in enumerate(cached):
+            yield "paper", {"index": i, "title": result.title}
+            yield "result", {"index": i, **result.model_dump()}
+        yield "done", {}
+
+    if cached is not None:
+        return event_response(replay(), format)
+
+    paper_titles, collection_names, unique_per_paper = await prepare_comparison(uploads)
+    slots = asyncio.Semaphore(settings.COMPARE_MAX_CONCURRENCY)
+    results = {}
+
+    async def paper_events(i: int):
+        base_title = paper_titles[i]
+        others_titles = [paper_titles[j] for j in range(len(paper_titles)) if j != i]
+        prompt = await run_in_threadpool(build_comparison_prompt, base_title, unique_per_paper[i], others_titles)
+
+        parts = []
+        async with slots:
+            async for piece in chat_stream(CHAT_MODEL, prompt):
+                parts.append(piece)
+                yield "token", {"text": piece}
+        results[i] = await save_comparison(base_title, collection_names[i], "".join(parts))
+        yield "result", results[i].model_dump()
+
+    async def events():
+        for i, base_title in enumerate(paper_titles):
+            yield "paper", {"index": i, "title": base_title}
+
+        deadline = comparison_deadline()
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + deadline if deadline else None
+        merged = merge_streams([paper_events(i) for i in range(len(paper_titles))])
+        try:
+            while True:
+                try:
+                    index, (event, data) = await asyncio.wait_for(
+                        merged.__anext__(), None if expires is None else max(0.0, expires - loop.time())
+                    )
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    break
+                yield event, {"index": index, **data}
+        finally:
+            await merged.aclose()
+
+        unfinished = [i for i in range(len(paper_titles)) if i not in results]
+        for i in unfinished:
+            yield "error", {"index": i, "detail": _deadline_message()}
+        if not unfinished:
+            await store_comparison(content_hashes, [results[i] for i in range(len(paper_titles))])
+        yield "done", {}
+
+    return event_response(events(), format)
@@ -1,13 +1,188 @@
 # app/db/chroma_db.py
 
-import chromadb
+from typing import Dict, List, Optional, Tuple
 
-# ✅ Persistent ChromaDB client (no embedding_function here)
-chroma_client = chromadb.PersistentClient(path="./chroma_storage")
+from app.db.vector_store import VectorStore, get_vector_store
+from app.utils.config import settings
 
-def get_or_create_collection(name: str):
+# Storage modes: one collection per paper, or every paper in one shared
+# collection with chunks tagged by `paper_id` metadata
+PER_PAPER_MODE = "per_paper"
+SHARED_MODE = "shared"
+
+# Records read per page when scanning the shared collection's metadata
+DESCRIBE_PAGE_SIZE = 5_000
+
+
+def vector_store() -> VectorStore:
+    """
+    The configured vector store backend (VECTOR_BACKEND); see app.db.vector_store.
+    """
+    return get_vector_store()
+
+
+def is_shared_mode() -> bool:
+    return settings.VECTOR_STORE_MODE == SHARED_MODE
+
+
+def collection_for(paper_id: str) -> str:
+    """
+    Name of the store collection holding a paper's chunks in the current mode.
+    """
+    return settings.SHARED_COLLECTION_NAME if is_shared_mode() else paper_id
+
+
+def shared_chunk_id(paper_id: str, chunk_id: str) -> str:
+    """
+    Chunk ids must be unique across papers once they share a collection.
+    """
+    return f"{paper_id}:{chunk_id}"
+
+
+def add_paper_chunks(
+    paper_id: str,
+    ids: List[str],
+    documents: List[str],
+    embeddings: List[List[float]],
+    upsert: bool = False,
+) -> None:
+    """
+    Store a paper's chunks. `paper_id` is the paper's logical collection name
+    (PDFLog.collection_name) in either storage mode.
+    """
+    if is_shared_mode():
+        ids = [shared_chunk_id(paper_id, chunk_id) for chunk_id in ids]
+        metadatas = [{"paper_id": paper_id, "collection_name": paper_id} for _ in ids]
+        vector_store().add(collection_for(paper_id), ids, documents, embeddings, metadatas=metadatas, upsert=upsert)
+    else:
+        vector_store().add(paper_id, ids, documents, embeddings, upsert=upsert)
+
+
+def delete_paper_chunks(paper_id: str) -> None:
+    """
+    Remove every stored chunk of one paper (its collection in per-paper mode).
+    """
+    store = vector_store()
+    if is_shared_mode():
+        stored = store.get(collection_for(paper_id), where={"paper_id": paper_id}, include=[])
+        store.delete(collection_for(paper_id), ids=stored["ids"])
+    elif store.exists(paper_id):
+        store.delete(paper_id)
+
+
+def get_paper_chunks(paper_id: str, include: Optional[List[str]] = None) -> Dict:
+    """
+    All stored chunks of one paper: {"ids"} plus one list per `include` entry.
     """
-    Get or create a ChromaDB collection without an automatic embedding function.
-    We'll pass precomputed embeddings manually.
+    include = include or ["documents", "embeddings"]
+    if is_shared_mode():
+        return vector_store().get(collection_for(paper_id), where={"paper_id": paper_id}, include=include)
+    return vector_store().get(paper_id, include=include)
+
+
+def _hits(results: Dict, paper_id: Optional[str] = None) -> List[Dict]:
+    count = len(results["ids"])
+    metadatas = results.get("metadatas") or [None] * count
+    embeddings = results.get("embeddings")
+    embeddings = embeddings if embeddings is not None else [None] * count
+    return [
+        {
+            "id": chunk_id,
+            "document": document,
+            "distance": distance,
+            "paper_id": paper_id or (metadata or {}).get("paper_id"),
+            "embedding": embedding,
+        }
+        for chunk_id, document, distance, metadata, embedding in zip(
+            results["ids"], results["documents"], results["distances"], metadatas, embeddings
+        )
+    ]
+
+
+def query_paper(paper_id: str, query_embedding: List[float], n_results: int) -> List[Dict]:
+    """
+    Nearest chunks of one paper as hits {"id", "document", "distance", "paper_id", "embedding"}.
+    """
+    if is_shared_mode():
+        return query_shared(query_embedding, n_results, [paper_id])
+
+    try:
+        results = vector_store().query(
+            paper_id, query_embedding, n_results, include=["documents", "distances", "embeddings"]
+        )
+    except Exception as e:
+        raise ValueError(f"Collection '{paper_id}' not found or invalid: {str(e)}")
+    return _hits(results, paper_id)
+
+
+def query_shared(query_embedding: List[float], n_results: int, paper_ids: List[str]) -> List[Dict]:
+    """
+    One filtered query over the shared collection, restricted to `paper_ids`.
+    """
+    results = vector_store().query(
+        settings.SHARED_COLLECTION_NAME,
+        query_embedding,
+        n_results,
+        where={"paper_id": {"$in": list(paper_ids)}},
+        include=["documents", "distances", "metadatas", "embeddings"],
+    )
+    return _hits(results)
+
+
+def get_chunks_by_id(paper_id: str, ids: List[str], include: Optional[List[str]] = None) -> Dict:
     """
-    return chroma_client.get_or_create_collection(name=name)
+    Specific chunks of one paper by their stored ids (as returned by queries).
+    """
+    return vector_store().get(collection_for(paper_id), ids=list(ids), include=include or ["documents"])
+
+
+def _dim(results: Dict) -> Optional[int]:
+    embeddings = results.get("embeddings")
+    return len(embeddings[0]) if embeddings is not None and len(embeddings) else None
+
+
+def describe_paper(paper_id: str) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    (chunk count, vector dim) of one paper, or None if nothing is stored for it.
+    Read-only: never creates a collection.
+    """
+    store = vector_store()
+    if is_shared_mode():
+        stored = store.get(collection_for(paper_id), where={"paper_id": paper_id}, include=[])
+        if not stored["ids"]:
+            return None
+        first = store.get(collection_for(paper_id), ids=stored["ids"][:1], include=["embeddings"])
+        return len(stored["ids"]), _dim(first)
+
+    if not store.exists(paper_id):
+        return None
+    return store.count(paper_id), _dim(store.get(paper_id, include=["embeddings"], limit=1))
+
+
+def describe_papers() -> Dict[str, Tuple[int, Optional[int]]]:
+    """
+    (chunk count, vector dim) of every stored paper.
+    """
+    store = vector_store()
+    if not is_shared_mode():
+        return {
+            name: (store.count(name), _dim(store.get(name, include=["embeddings"], limit=1)))
+            for name in store.list_collections()
+        }
+
+    name = settings.SHARED_COLLECTION_NAME
+    if not store.exists(name):
+        return {}
+    dim = _dim(store.get(name, include=["embeddings"], limit=1))
+    counts: Dict[str, int] = {}
+    offset = 0
+    while True:
+        page = store.get(name, include=["metadatas"], limit=DESCRIBE_PAGE_SIZE, offset=offset)
+        for metadata in page["metadatas"]:
+            paper_id = (metadata or {}).get("paper_id")
+            if paper_id is not None:
+                counts[paper_id] = counts.get(paper_id, 0) + 1
+        if len(page["ids"]) < DESCRIBE_PAGE_SIZE:
+            break
+        offset += DESCRIBE_PAGE_SIZE
+    return {paper_id: (count, dim) for paper_id, count in counts.items()}
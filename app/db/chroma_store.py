@@ -0,0 +1,102 @@
+# app/db/chroma_store.py
+
+import threading
+from typing import Dict, List, Optional
+
+import chromadb
+from chromadb.errors import NotFoundError
+
+from app.db.vector_store import DEFAULT_INCLUDE, VectorStore
+
+
+def _empty(include: List[str], query: bool = False) -> Dict:
+    result = {"ids": [], **{key: [] for key in include}}
+    if query:
+        result["distances"] = []
+    return result
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    VectorStore on a persistent ChromaDB client. Embeddings are always passed in
+    precomputed, so collections have no embedding function.
+
+    Collection handles are cached per process. Writes get-or-create; reads only
+    look collections up, so a mistyped name never leaves an empty collection behind.
+    """
+
+    def __init__(self, path: str):
+        self.client = chromadb.PersistentClient(path=path)
+        self._handles: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str, create: bool = True):
+        """
+        Cached handle, or None when the collection does not exist and `create` is off.
+        """
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle
+        with self._lock:
+            handle = self._handles.get(name)
+            if handle is None:
+                if create:
+                    handle = self.client.get_or_create_collection(name=name)
+                else:
+                    try:
+                        handle = self.client.get_collection(name=name)
+                    except NotFoundError:
+                        return None
+                self._handles[name] = handle
+        return handle
+
+    def add(self, name, ids, documents, embeddings, metadatas=None, upsert=False) -> None:
+        collection = self.collection(name)
+        write = collection.upsert if upsert else collection.add
+        if metadatas is None:
+            write(ids=ids, documents=documents, embeddings=embeddings)
+        else:
+            write(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def query(self, name, query_embedding, n_results, where=None, include=None) -> Dict:
+        include = list(DEFAULT_INCLUDE if include is None else include)
+        collection = self.collection(name, create=False)
+        if collection is None:
+            return _empty(include, query=True)
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=where,
+            include=include + (["distances"] if "distances" not in include else []),
+        )
+        # Single query: unwrap the per-query lists
+        return {
+            key: (value[0] if value is not None else None)
+            for key, value in results.items()
+            if key in ("ids", "documents", "embeddings", "metadatas", "distances")
+        }
+
+    def get(self, name, ids=None, where=None, include=None, limit=None, offset=None) -> Dict:
+        include = list(DEFAULT_INCLUDE if include is None else include)
+        collection = self.collection(name, create=False)
+        if collection is None:
+            return _empty(include)
+        return collection.get(ids=ids, where=where, include=include, limit=limit, offset=offset)
+
+    def delete(self, name: str, ids: Optional[List[str]] = None) -> None:
+        if ids is None:
+            with self._lock:
+                self._handles.pop(name, None)
+                self.client.delete_collection(name)
+        elif ids:
+            self.collection(name).delete(ids=ids)
+
+    def count(self, name: str) -> int:
+        collection = self.collection(name, create=False)
+        return collection.count() if collection is not None else 0
+
+    def exists(self, name: str) -> bool:
+        return self.collection(name, create=False) is not None
+
+    def list_collections(self) -> List[str]:
+        return [collection.name for collection in self.client.list_collections()]
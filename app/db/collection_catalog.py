@@ -0,0 +1,168 @@
+# app/db/collection_catalog.py
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.db.chroma_db import describe_paper, describe_papers
+from app.utils.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class UnknownCollectionError(ValueError):
+    """
+    Query named collections that hold no stored chunks.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        super().__init__(f"Unknown collection(s): {', '.join(names)}")
+
+
+class CollectionInfo:
+    __slots__ = ("name", "count", "dim")
+
+    def __init__(self, name: str, count: int, dim: Optional[int]):
+        self.name = name
+        self.count = count
+        self.dim = dim
+
+
+class CollectionCatalog:
+    """
+    Process-local view of the stored papers: chunk count and vector dim per
+    logical collection (PDFLog.collection_name), in either storage mode.
+
+    Filled by `warm` at startup and re-listed at most every `refresh_seconds`
+    when names are asked for. Writers in this process update it through
+    `refresh`; papers stored by other processes (the ingest worker) are found on
+    their first `lookup`. Every path is read-only against the store.
+
+    It also tracks which stored papers have a pdf_logs row, so chunks left behind
+    by an aborted ingest are not listed: loaded once at startup (`set_logged`),
+    kept current by writers (`mark_logged` / `forget_logged`), and for papers
+    that appear in the store later, checked once per re-list (`unlogged_names`).
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._entries: Dict[str, CollectionInfo] = {}
+        self._warmed_at: Optional[float] = None
+        self._logged: Set[str] = set()     # stored papers known to have a pdf_logs row
+        self._orphans: Set[str] = set()    # stored papers checked and found without one
+        self._lock = threading.Lock()
+
+    def warm(self) -> int:
+        """
+        Re-list every stored paper. Returns how many there are.
+        """
+        started = time.monotonic()
+        entries = {name: CollectionInfo(name, count, dim) for name, (count, dim) in describe_papers().items()}
+        with self._lock:
+            self._entries = entries
+            self._warmed_at = started
+            self._orphans = set()   # re-checked once: their pdf_logs row may have landed since
+        logger.info(f"📚 Collection catalog: {len(entries)} papers ({(time.monotonic() - started) * 1000:.0f} ms)")
+        return len(entries)
+
+    def _warm_if_stale(self) -> None:
+        if self._warmed_at is None or time.monotonic() - self._warmed_at > self.refresh_seconds:
+            self.warm()
+
+    def names(self) -> List[str]:
+        """
+        Names of the stored papers that have a pdf_logs row, re-listed first if the
+        catalog is stale.
+        """
+        self._warm_if_stale()
+        with self._lock:
+            return sorted(name for name, info in self._entries.items() if info.count and name in self._logged)
+
+    def unlogged_names(self) -> List[str]:
+        """
+        Stored papers not yet checked against pdf_logs (e.g. ingested by another
+        process); resolve them with `mark_logged(found, checked=...)`.
+        """
+        self._warm_if_stale()
+        with self._lock:
+            return sorted(
+                name for name, info in self._entries.items()
+                if info.count and name not in self._logged and name not in self._orphans
+            )
+
+    def set_logged(self, names: Iterable[str]) -> None:
+        """
+        Replace the set of papers with a pdf_logs row (loaded at startup).
+        """
+        with self._lock:
+            self._logged = set(names)
+            self._orphans = set()
+
+    def mark_logged(self, names: Iterable[str], checked: Iterable[str] = ()) -> None:
+        """
+        Record papers as having a pdf_logs row; `checked` names not among them have none.
+        """
+        names = set(names)
+        with self._lock:
+            self._logged |= names
+            self._orphans = (self._orphans | set(checked)) - names
+
+    def forget_logged(self, name: str) -> None:
+        with self._lock:
+            self._logged.discard(name)
+
+    def lookup(self, name: str) -> Optional[CollectionInfo]:
+        """
+        A paper's entry, probing the store once when it is not cached yet.
+        None if nothing is stored under that name.
+        """
+        info = self._entries.get(name)
+        return info if info is not None else self.refresh(name)
+
+    def refresh(self, name: str) -> Optional[CollectionInfo]:
+        """
+        Re-read one paper from the store; writers call this after storing chunks.
+        """
+        description = describe_paper(name)
+        with self._lock:
+            if description is None:
+                self._entries.pop(name, None)
+                return None
+            info = self._entries[name] = CollectionInfo(name, *description)
+        return info
+
+    def total_chunks(self, names: Iterable[str]) -> int:
+        """
+        Chunks stored across the given papers, from the cached counts.
+        """
+        return sum(info.count for info in map(self.lookup, names) if info is not None)
+
+    def require(self, names: Iterable[str]) -> List[str]:
+        """
+        The given papers that hold chunks, in order. Raises UnknownCollectionError
+        naming any that have nothing stored.
+        """
+        names = list(names)
+        infos = [self.lookup(name) for name in names]
+        unknown = [name for name, info in zip(names, infos) if info is None or not info.count]
+        if unknown:
+            raise UnknownCollectionError(unknown)
+        return names
+
+
+_catalog: Optional[CollectionCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_collection_catalog() -> CollectionCatalog:
+    """
+    Process-wide catalog instance.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CollectionCatalog(refresh_seconds=settings.CATALOG_REFRESH_SECONDS)
+    return _catalog
@@ -0,0 +1,626 @@
+# app/db/local_store.py
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.db.vector_store import DEFAULT_INCLUDE, VectorStore
+from app.services.quantization import CODE_DTYPES, FLOAT32, INT8, QuantizedVectors, dequantize, quantize
+from app.utils.hashing import sha256_hex
+
+logger = logging.getLogger("uvicorn.error")
+
+# Rows allocated when a collection's matrix is created; it doubles when full
+INITIAL_CAPACITY = 1024
+# Rows scored per matmul when scanning the matrix
+SCAN_BLOCK_ROWS = 65_536
+# SQLite limit on bound parameters per statement, with headroom
+SQL_BATCH = 500
+
+# IVF parameters
+IVF_MAX_LISTS = 4096
+IVF_SAMPLE_PER_LIST = 64          # k-means training rows per list
+IVF_TRAIN_ITERATIONS = 10
+IVF_RETRAIN_FRACTION = 0.25       # retrain once this share of rows is new or rewritten
+
+
+def _squared_l2(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", vectors, vectors) - 2.0 * (vectors @ query) + float(query @ query)
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    return np.argmin(centroid_norms[None, :] - 2.0 * (vectors @ centroids.T), axis=1)
+
+
+def _map(path: str, dtype, shape: Tuple[int, ...]) -> np.memmap:
+    """
+    Read-write memmap of `shape`, creating or growing the file as needed.
+    """
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+class _Codes:
+    """
+    Quantized copy of a collection's matrix that queries scan instead of the
+    float32 rows: `<hash>.<kind>` codes, `<hash>.scales` for int8, and
+    `<hash>.<kind>.version`, the collection version the copy is in sync with.
+    """
+
+    def __init__(self, base: str, kind: str, dim: int, capacity: int):
+        self.kind = kind
+        self.dim = dim
+        self.path = f"{base}.{kind}"
+        self.scales_path = f"{base}.scales"
+        self.version_path = f"{self.path}.version"
+        self.open(capacity)
+
+    def open(self, capacity: int) -> None:
+        self.codes = _map(self.path, CODE_DTYPES[self.kind], (capacity, self.dim))
+        self.scales = _map(self.scales_path, np.float32, (capacity,)) if self.kind == INT8 else None
+
+    def write(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        encoded = quantize(vectors, self.kind)
+        self.codes[rows] = encoded.codes
+        if self.scales is not None:
+            self.scales[rows] = encoded.scales
+
+    def read(self, rows: np.ndarray) -> np.ndarray:
+        scales = self.scales[rows] if self.scales is not None else None
+        return dequantize(QuantizedVectors(self.kind, self.codes[rows], scales))
+
+    def flush(self) -> None:
+        self.codes.flush()
+        if self.scales is not None:
+            self.scales.flush()
+
+    def synced_version(self) -> Optional[int]:
+        try:
+            with open(self.version_path) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def mark_synced(self, version: int) -> None:
+        self.flush()
+        tmp_path = f"{self.version_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(version))
+        os.replace(tmp_path, self.version_path)
+
+    def files(self) -> List[str]:
+        return [self.path, self.scales_path, self.version_path]
+
+
+class _Matrix:
+    """
+    One collection's vectors: a float32 memmap of `capacity` rows, of which the
+    first `rows` are in use, plus its tombstones, (optional) IVF index and
+    (optional) quantized scan copy.
+    """
+
+    def __init__(self, path: str, dim: int, rows: int, quantization: str = FLOAT32):
+        self.path = path
+        self.dim = dim
+        self.rows = rows
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate(INITIAL_CAPACITY * dim * 4)
+        self.capacity = os.path.getsize(path) // (dim * 4)
+        self.data = np.memmap(path, dtype=np.float32, mode="r+", shape=(self.capacity, dim))
+        self.deleted = np.zeros(self.capacity, dtype=bool)
+        self.codes = _Codes(self.base, quantization, dim, self.capacity) if quantization != FLOAT32 else None
+
+        # IVF: rows order[offsets[l]:offsets[l + 1]] belong to list l; rows >= indexed_rows are unindexed
+        self.centroids: Optional[np.ndarray] = None
+        self.order: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.indexed_rows = 0
+        self.rewritten = 0
+        self.version = 0   # collections.version this state reflects
+
+    def reserve(self, rows: int) -> None:
+        if rows <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < rows:
+            capacity *= 2
+        self.data.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.capacity = capacity
+        self.data = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        if self.codes is not None:
+            self.codes.flush()
+            self.codes.open(capacity)
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[:len(self.deleted)] = self.deleted
+        self.deleted = deleted
+
+    @property
+    def base(self) -> str:
+        return self.path[:-len(".f32")]
+
+    @property
+    def ivf_path(self) -> str:
+        return self.base + ".ivf.npz"
+
+    def write(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        self.data[rows] = vectors
+        self.data.flush()
+        if self.codes is not None:
+            self.codes.write(rows, vectors)
+            self.codes.flush()
+
+    def sync_codes(self) -> None:
+        """
+        Re-encode the quantized copy when it lags the collection (written by a
+        process with quantization off, or quantization just switched on).
+        """
+        if self.codes is None or self.codes.synced_version() == self.version:
+            return
+        logger.info(f"🗜️ Encoding {self.rows} rows as {self.codes.kind} for '{os.path.basename(self.path)}'")
+        for start in range(0, self.rows, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self.rows)
+            self.codes.write(np.arange(start, end), np.asarray(self.data[start:end]))
+        self.codes.mark_synced(self.version)
+
+    def scan(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Vectors of `rows` for scoring: from the quantized copy when there is one.
+        """
+        return self.codes.read(rows) if self.codes is not None else np.asarray(self.data[rows])
+
+    def load_ivf(self) -> None:
+        try:
+            with np.load(self.ivf_path, allow_pickle=False) as ivf:
+                self.centroids = ivf["centroids"]
+                self.order = ivf["order"]
+                self.offsets = ivf["offsets"]
+                self.indexed_rows = int(ivf["indexed_rows"])
+        except FileNotFoundError:
+            pass
+
+    def train_ivf(self) -> None:
+        """
+        k-means coarse quantizer on a sample of live rows, then assign every row.
+        """
+        live = np.flatnonzero(~self.deleted[:self.rows])
+        n_lists = int(min(IVF_MAX_LISTS, max(8, math.sqrt(len(live)))))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(live, size=min(len(live), n_lists * IVF_SAMPLE_PER_LIST), replace=False))
+        points = np.asarray(self.data[sample])
+        centroids = points[rng.choice(len(points), size=n_lists, replace=False)].copy()
+
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            assignment = _nearest_centroid(points, centroids)
+            counts = np.bincount(assignment, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, points)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assignment = np.empty(self.rows, dtype=np.int32)
+        for start in range(0, self.rows, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self.rows)
+            assignment[start:end] = _nearest_centroid(np.asarray(self.data[start:end]), centroids)
+
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1)).astype(np.int64)
+
+        tmp_path = f"{self.ivf_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, centroids=centroids, order=order, offsets=offsets, indexed_rows=np.int64(self.rows))
+        os.replace(tmp_path, self.ivf_path)
+        self.centroids, self.order, self.offsets = centroids, order, offsets
+        self.indexed_rows = self.rows
+        self.rewritten = 0
+
+    def needs_training(self, min_rows: int) -> bool:
+        if self.rows < min_rows:
+            return False
+        if self.centroids is None:
+            return True
+        return (self.rows - self.indexed_rows) + self.rewritten > IVF_RETRAIN_FRACTION * self.indexed_rows
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> Optional[np.ndarray]:
+        """
+        Rows to score for a query: the nprobe closest IVF lists plus unindexed rows.
+        None means scan everything (no index yet).
+        """
+        if self.centroids is None:
+            return None
+        lists = np.argsort(_squared_l2(self.centroids, query))[:nprobe]
+        parts = [self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]
+        parts.append(np.arange(self.indexed_rows, self.rows))
+        return np.concatenate(parts)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store. Each collection's vectors live in a memory-mapped
+    float32 matrix (`<hash>.f32`); ids, documents and metadata live in one SQLite
+    file. Opening a collection maps the file without reading it, so a restarted
+    process serves queries immediately and the OS page cache does the warming.
+
+    Small collections are searched exactly. Once a collection reaches
+    `ivf_min_rows` an IVF index (k-means lists, `nprobe` probed per query) is
+    trained and persisted next to the matrix, and retrained as rows accumulate.
+
+    With `quantization` ("float16" or "int8") queries scan a compact copy of the
+    matrix instead (2x / ~4x fewer bytes to page in and keep cached), then
+    re-score the best `rerank_factor * n_results` candidates against the float32
+    rows, which stay the source of truth for `get` and index training.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ivf_min_rows: int = 20_000,
+        nprobe: int = 16,
+        quantization: str = FLOAT32,
+        rerank_factor: int = 4,
+    ):
+        if quantization not in CODE_DTYPES:
+            raise ValueError(f"Unknown quantization '{quantization}'")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self._lock = threading.RLock()
+        self._matrices: Dict[str, _Matrix] = {}
+
+        self._conn = sqlite3.connect(os.path.join(path, "store.sqlite3"), timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            " name TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " rows INTEGER NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " collection TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " row INTEGER NOT NULL,"
+            " document TEXT,"
+            " metadata TEXT,"
+            " deleted INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (collection, id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_row ON records (collection, row)")
+        # Shared-collection mode filters on paper_id
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_records_paper ON records (collection, json_extract(metadata, '$.paper_id'))"
+        )
+        self._conn.commit()
+
+    # --- collections -------------------------------------------------------
+
+    def _matrix_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{sha256_hex(name)[:32]}.f32")
+
+    def _matrix(self, name: str, dim: Optional[int] = None) -> Optional[_Matrix]:
+        """
+        Open (or, given `dim`, create) a collection's matrix. None if it does not exist.
+        A cached matrix is reopened when another process has written the collection.
+        """
+        row = self._conn.execute("SELECT dim, rows, version FROM collections WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self._matrices.pop(name, None)
+            if dim is None:
+                return None
+            self._conn.execute("INSERT INTO collections (name, dim, rows, version) VALUES (?, ?, 0, 0)", (name, dim))
+            row = (dim, 0, 0)
+
+        matrix = self._matrices.get(name)
+        if matrix is not None and matrix.version == row[2]:
+            return matrix
+
+        matrix = _Matrix(self._matrix_path(name), dim=row[0], rows=row[1], quantization=self.quantization)
+        matrix.version = row[2]
+        matrix.reserve(matrix.rows)
+        deleted = [r for (r,) in self._conn.execute(
+            "SELECT row FROM records WHERE collection = ? AND deleted = 1", (name,)
+        )]
+        matrix.deleted[deleted] = True
+        matrix.load_ivf()
+        matrix.sync_codes()
+        self._matrices[name] = matrix
+        return matrix
+
+    def _bump_version(self, name: str, matrix: _Matrix) -> None:
+        matrix.version += 1
+        self._conn.execute(
+            "UPDATE collections SET rows = ?, version = ? WHERE name = ?", (matrix.rows, matrix.version, name)
+        )
+        if matrix.codes is not None:
+            # Ahead of the commit: a rollback leaves the copy marked stale, never wrongly fresh
+            matrix.codes.mark_synced(matrix.version)
+
+    def list_collections(self) -> List[str]:
+        with self._lock:
+            return [name for (name,) in self._conn.execute("SELECT name FROM collections ORDER BY name")]
+
+    def exists(self, name: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM collections WHERE name = ?", (name,)).fetchone() is not None
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM records WHERE collection = ? AND deleted = 0", (name,)
+            ).fetchone()[0]
+
+    # --- writes ------------------------------------------------------------
+
+    def _existing_rows(self, name: str, ids: List[str]) -> Dict[str, Tuple[int, int]]:
+        existing = {}
+        for i in range(0, len(ids), SQL_BATCH):
+            part = ids[i:i + SQL_BATCH]
+            for chunk_id, row, deleted in self._conn.execute(
+                f"SELECT id, row, deleted FROM records WHERE collection = ? AND id IN ({','.join('?' * len(part))})",
+                [name] + part,
+            ):
+                existing[chunk_id] = (row, deleted)
+        return existing
+
+    def add(self, name, ids, documents, embeddings, metadatas=None, upsert=False) -> None:
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so row allocation is safe across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                matrix = self._add(name, list(ids), documents, vectors, metadatas, upsert)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                self._matrices.pop(name, None)   # in-memory state may be ahead of the rolled back rows
+                raise
+
+            if matrix.needs_training(self.ivf_min_rows):
+                logger.info(f"🧭 Training IVF index for '{name}' ({matrix.rows} rows)")
+                matrix.train_ivf()
+
+    def _add(self, name, ids, documents, vectors, metadatas, upsert) -> _Matrix:
+        matrix = self._matrix(name, dim=vectors.shape[1])
+        if vectors.shape[1] != matrix.dim:
+            raise ValueError(f"Collection '{name}' holds {matrix.dim}-d vectors, got {vectors.shape[1]}-d")
+
+        existing = self._existing_rows(name, ids)
+        rows = np.empty(len(ids), dtype=np.int64)
+        keep = np.ones(len(ids), dtype=bool)
+        next_row = matrix.rows
+        for i, chunk_id in enumerate(ids):
+            if chunk_id in existing:
+                row, deleted = existing[chunk_id]
+                if not upsert and not deleted:
+                    keep[i] = False   # add() leaves existing records alone
+                    continue
+                rows[i] = row
+                if row < matrix.indexed_rows:
+                    matrix.rewritten += 1
+            else:
+                rows[i] = next_row
+                existing[chunk_id] = (next_row, 0)   # a repeated id in this batch reuses the row
+                next_row += 1
+
+        if not keep.any():
+            return matrix
+        matrix.reserve(next_row)
+        matrix.write(rows[keep], vectors[keep])
+        matrix.deleted[rows[keep]] = False
+        matrix.rows = next_row
+
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO records (collection, id, row, document, metadata, deleted) VALUES (?, ?, ?, ?, ?, 0)",
+            [
+                (name, chunk_id, int(row), document, json.dumps(metadata) if metadata else None)
+                for chunk_id, row, document, metadata, kept in zip(ids, rows, documents, metadatas, keep)
+                if kept
+            ],
+        )
+        self._bump_version(name, matrix)
+        return matrix
+
+    def delete(self, name: str, ids: Optional[List[str]] = None) -> None:
+        with self._lock:
+            if ids is None:
+                self._conn.execute("DELETE FROM records WHERE collection = ?", (name,))
+                self._conn.execute("DELETE FROM collections WHERE name = ?", (name,))
+                self._conn.commit()
+                matrix = self._matrices.pop(name, None)
+                path = matrix.path if matrix else self._matrix_path(name)
+                del matrix
+                base = path[:-len(".f32")]
+                sidecars = [f"{base}.{kind}{suffix}" for kind in CODE_DTYPES if kind != FLOAT32 for suffix in ("", ".version")]
+                for file_path in [path, f"{base}.ivf.npz", f"{base}.scales"] + sidecars:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                return
+
+            matrix = self._matrix(name)
+            if matrix is None or not ids:
+                return
+            rows = [row for row, deleted in self._existing_rows(name, list(ids)).values() if not deleted]
+            for i in range(0, len(ids), SQL_BATCH):
+                part = list(ids[i:i + SQL_BATCH])
+                self._conn.execute(
+                    f"UPDATE records SET deleted = 1 WHERE collection = ? AND id IN ({','.join('?' * len(part))})",
+                    [name] + part,
+                )
+            matrix.deleted[rows] = True
+            self._bump_version(name, matrix)
+            self._conn.commit()
+
+    # --- reads -------------------------------------------------------------
+
+    @staticmethod
+    def _where_sql(where: Optional[Dict]) -> Tuple[str, List]:
+        """
+        SQL condition for a metadata filter: {"key": value}, {"key": {"$eq": value}}
+        or {"key": {"$in": [...]}}, several keys ANDed.
+        """
+        if not where:
+            return "", []
+        clauses, params = [], []
+        for key, condition in where.items():
+            if not isinstance(key, str) or key.startswith("$") or not key.replace("_", "").isalnum():
+                raise ValueError(f"Unsupported filter key '{key}'")
+            column = f"json_extract(metadata, '$.{key}')"
+            if isinstance(condition, dict):
+                if set(condition) == {"$eq"}:
+                    clauses.append(f"{column} = ?")
+                    params.append(condition["$eq"])
+                elif set(condition) == {"$in"}:
+                    values = list(condition["$in"])
+                    if not values:
+                        clauses.append("0")
+                        continue
+                    clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                    params.extend(values)
+                else:
+                    raise ValueError(f"Unsupported filter {condition}")
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(condition)
+        return " AND " + " AND ".join(clauses), params
+
+    def _records(self, name: str, rows: np.ndarray) -> Dict[int, Tuple[str, Optional[str], Optional[str]]]:
+        records = {}
+        row_list = [int(r) for r in rows]
+        for i in range(0, len(row_list), SQL_BATCH):
+            part = row_list[i:i + SQL_BATCH]
+            for chunk_id, row, document, metadata in self._conn.execute(
+                f"SELECT id, row, document, metadata FROM records"
+                f" WHERE collection = ? AND deleted = 0 AND row IN ({','.join('?' * len(part))})",
+                [name] + part,
+            ):
+                records[row] = (chunk_id, document, metadata)
+        return records
+
+    def _result(self, matrix: Optional[_Matrix], records: List[Tuple[int, str, Optional[str], Optional[str]]], include: List[str]) -> Dict:
+        result = {"ids": [chunk_id for _, chunk_id, _, _ in records]}
+        if "documents" in include:
+            result["documents"] = [document for _, _, document, _ in records]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(metadata) if metadata else None for _, _, _, metadata in records]
+        if "embeddings" in include:
+            rows = np.asarray([row for row, _, _, _ in records], dtype=np.int64)
+            result["embeddings"] = (
+                np.asarray(matrix.data[rows]) if matrix is not None and len(rows) else np.empty((0, 0), dtype=np.float32)
+            )
+        return result
+
+    def get(self, name, ids=None, where=None, include=None, limit=None, offset=None) -> Dict:
+        include = list(DEFAULT_INCLUDE if include is None else include)
+        where_sql, where_params = self._where_sql(where)
+        with self._lock:
+            matrix = self._matrix(name)
+            if matrix is None:
+                return self._result(None, [], include)
+
+            query = f"SELECT row, id, document, metadata FROM records WHERE collection = ? AND deleted = 0{where_sql}"
+            if ids is not None:
+                records = []
+                for i in range(0, len(ids), SQL_BATCH):
+                    part = list(ids[i:i + SQL_BATCH])
+                    records.extend(self._conn.execute(
+                        f"{query} AND id IN ({','.join('?' * len(part))})", [name] + where_params + part
+                    ))
+                records.sort(key=lambda record: record[0])
+                records = records[offset or 0:(offset or 0) + limit if limit is not None else None]
+            else:
+                records = self._conn.execute(
+                    f"{query} ORDER BY row LIMIT ? OFFSET ?",
+                    [name] + where_params + [limit if limit is not None else -1, offset or 0],
+                ).fetchall()
+            return self._result(matrix, records, include)
+
+    def query(self, name, query_embedding, n_results, where=None, include=None) -> Dict:
+        include = list(DEFAULT_INCLUDE if include is None else include)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        where_sql, where_params = self._where_sql(where)
+
+        with self._lock:
+            matrix = self._matrix(name)
+            if matrix is None or not matrix.rows:
+                return {**self._result(None, [], include), "distances": []}
+            total = matrix.rows
+            deleted = matrix.deleted[:total].copy()
+            if where:
+                allowed = np.fromiter(
+                    (r for (r,) in self._conn.execute(
+                        f"SELECT row FROM records WHERE collection = ? AND deleted = 0{where_sql}", [name] + where_params
+                    )),
+                    dtype=np.int64,
+                )
+            else:
+                allowed = None
+
+        # A narrow filter is cheaper (and exact) to scan directly than through the index
+        if allowed is not None and len(allowed) <= self.ivf_min_rows:
+            candidates = allowed
+        else:
+            candidates = matrix.candidates(query, self.nprobe)
+            if candidates is not None:
+                candidates = candidates[candidates < total]
+            if allowed is not None:
+                candidates = allowed if candidates is None else np.intersect1d(candidates, allowed, assume_unique=True)
+
+        best_rows, best_distances = [], []
+        if candidates is None:
+            for start in range(0, total, SCAN_BLOCK_ROWS):
+                end = min(start + SCAN_BLOCK_ROWS, total)
+                rows = np.arange(start, end)[~deleted[start:end]]
+                best_rows.append(rows)
+                best_distances.append(_squared_l2(matrix.scan(rows), query))
+        else:
+            candidates = np.sort(candidates[~deleted[candidates]])
+            for start in range(0, len(candidates), SCAN_BLOCK_ROWS):
+                rows = candidates[start:start + SCAN_BLOCK_ROWS]
+                best_rows.append(rows)
+                best_distances.append(_squared_l2(matrix.scan(rows), query))
+
+        rows = np.concatenate(best_rows) if best_rows else np.empty(0, dtype=np.int64)
+        distances = np.concatenate(best_distances) if best_distances else np.empty(0, dtype=np.float32)
+        if matrix.codes is not None and self.rerank_factor > 0:
+            # Quantized distances only shortlist; the float32 rows decide the order
+            shortlist = n_results * self.rerank_factor
+            if len(rows) > shortlist:
+                top = np.argpartition(distances, shortlist - 1)[:shortlist]
+                rows = np.sort(rows[top])
+            distances = _squared_l2(np.asarray(matrix.data[rows]), query)
+        if len(rows) > n_results:
+            top = np.argpartition(distances, n_results - 1)[:n_results]
+            rows, distances = rows[top], distances[top]
+        order = np.argsort(distances, kind="stable")
+        rows, distances = rows[order], distances[order]
+
+        with self._lock:
+            found = self._records(name, rows)
+        records, kept = [], []
+        for row, distance in zip(rows.tolist(), distances.tolist()):
+            if row in found:
+                records.append((row, *found[row]))
+                kept.append(max(0.0, distance))
+
+        result = self._result(matrix, records, include)
+        result["distances"] = kept
+        return result
@@ -0,0 +1,77 @@
+# app/db/migrate_shared_collection.py
+#
+# Copy every per-paper collection of the configured vector store into the shared
+# collection, tagging chunks with paper_id/collection_name metadata.
+# Safe to re-run: writes are upserts keyed by "<paper_id>:<chunk_id>".
+#
+# Usage (from the repo root):
+#   python -m app.db.migrate_shared_collection [--dry-run] [--delete-source]
+# then set VECTOR_STORE_MODE=shared.
+
+import argparse
+import logging
+
+from app.db.chroma_db import shared_chunk_id, vector_store
+from app.utils.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+PAGE_SIZE = 1000
+
+
+def migrate_collection(source: str, target: str, dry_run: bool = False) -> int:
+    """
+    Copy one per-paper collection into the shared collection; returns chunks copied.
+    """
+    store = vector_store()
+    paper_id = source
+    total = store.count(source)
+    copied = 0
+
+    for offset in range(0, total, PAGE_SIZE):
+        page = store.get(source, limit=PAGE_SIZE, offset=offset, include=["documents", "embeddings"])
+        if not page["ids"]:
+            break
+        if not dry_run:
+            store.add(
+                target,
+                ids=[shared_chunk_id(paper_id, chunk_id) for chunk_id in page["ids"]],
+                documents=page["documents"],
+                embeddings=page["embeddings"],
+                metadatas=[{"paper_id": paper_id, "collection_name": paper_id} for _ in page["ids"]],
+                upsert=True,
+            )
+        copied += len(page["ids"])
+
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate per-paper collections into the shared collection.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be copied")
+    parser.add_argument("--delete-source", action="store_true", help="drop each source collection once verified")
+    args = parser.parse_args()
+
+    store = vector_store()
+    target = settings.SHARED_COLLECTION_NAME
+    sources = [name for name in store.list_collections() if name != target]
+    print(f"Migrating {len(sources)} collections into '{settings.SHARED_COLLECTION_NAME}'")
+
+    for source in sources:
+        copied = migrate_collection(source, target, dry_run=args.dry_run)
+        if args.dry_run:
+            print(f"  {source}: {copied} chunks (dry run)")
+            continue
+
+        stored = len(store.get(target, where={"paper_id": source}, include=[])["ids"])
+        status = "ok" if stored >= copied else f"MISMATCH ({stored} stored)"
+        print(f"  {source}: {copied} chunks copied, {status}")
+
+        if args.delete_source and stored >= copied:
+            store.delete(source)
+
+    print("Done. Set VECTOR_STORE_MODE=shared to serve from the shared collection.")
+
+
+if __name__ == "__main__":
+    main()
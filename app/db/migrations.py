@@ -0,0 +1,92 @@
+# app/db/migrations.py
+
+import logging
+from typing import List, Optional, Set, Tuple
+
+from tortoise import Tortoise, connections
+
+logger = logging.getLogger("uvicorn.error")
+
+# Columns added to tables after they were first created. `generate_schemas` only
+# creates missing tables, so existing databases get these in place at startup:
+# (table, column, SQL type, unique). Columns are added nullable; a unique column
+# gets its index separately (SQLite rejects ADD COLUMN ... UNIQUE).
+ADDED_COLUMNS: List[Tuple[str, str, str, bool]] = [
+    ("pdf_logs", "content_sha256", "VARCHAR(64)", True),
+    ("pdf_logs", "text_sha256", "VARCHAR(64)", True),
+    ("pdf_logs", "summary_key", "VARCHAR(64)", False),
+]
+
+
+async def _table_columns(conn, dialect: str, table: str) -> Optional[Set[str]]:
+    """
+    Column names of `table`; None if the table does not exist yet.
+    """
+    if dialect == "sqlite":
+        rows = await conn.execute_query_dict(f'PRAGMA table_info("{table}")')
+    else:
+        rows = await conn.execute_query_dict(
+            "SELECT column_name AS name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = $1",
+            [table],
+        )
+    return {row["name"] for row in rows} or None
+
+
+async def _unique_columns(conn, dialect: str, table: str) -> Set[str]:
+    """
+    Columns of `table` covered on their own by a unique index or constraint.
+    """
+    if dialect == "sqlite":
+        unique = set()
+        for index in await conn.execute_query_dict(f'PRAGMA index_list("{table}")'):
+            if not index["unique"]:
+                continue
+            columns = await conn.execute_query_dict(f'PRAGMA index_info("{index["name"]}")')
+            if len(columns) == 1:
+                unique.add(columns[0]["name"])
+        return unique
+
+    rows = await conn.execute_query_dict(
+        "SELECT a.attname AS name FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indrelid "
+        "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0] "
+        "WHERE c.relname = $1 AND c.relnamespace = current_schema()::regnamespace "
+        "AND i.indisunique AND i.indnatts = 1",
+        [table],
+    )
+    return {row["name"] for row in rows}
+
+
+async def migrate_schema() -> None:
+    """
+    Bring existing tables up to the models: add missing columns from ADDED_COLUMNS
+    and their unique indexes. Idempotent; tables that do not exist yet are left to
+    `generate_schemas`.
+    """
+    conn = connections.get("default")
+    dialect = conn.capabilities.dialect
+    if dialect not in ("sqlite", "postgres"):
+        logger.warning(f"⚠️ Schema migrations are not supported for '{dialect}'; skipping")
+        return
+
+    for table, column, sql_type, unique in ADDED_COLUMNS:
+        columns = await _table_columns(conn, dialect, table)
+        if columns is None:
+            continue
+        if column not in columns:
+            await conn.execute_script(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {sql_type} NULL')
+            logger.info(f"🛠️ Added column {table}.{column}")
+        if unique and column not in await _unique_columns(conn, dialect, table):
+            await conn.execute_script(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS "uidx_{table}_{column}" ON "{table}" ("{column}")'
+            )
+            logger.info(f"🛠️ Added unique index on {table}.{column}")
+
+
+async def prepare_schema() -> None:
+    """
+    Migrate existing tables, then create any missing ones. Run after Tortoise.init.
+    """
+    await migrate_schema()
+    await Tortoise.generate_schemas(safe=True)
@@ -1,5 +1,6 @@
 from tortoise.contrib.fastapi import register_tortoise
 from fastapi import FastAPI
+from app.db.migrations import prepare_schema
 from app.utils.config import settings
 import logging
 
@@ -9,13 +10,16 @@ logger = logging.getLogger("uvicorn.error")
 def init_postgres(app: FastAPI):
     """
     Initializes the Tortoise ORM PostgreSQL connection with FastAPI.
-    Automatically creates tables for User, Session, PDFLog.
+    Automatically creates tables for User, Session, PDFLog, after bringing
+    existing ones up to date (see app.db.migrations).
     """
     register_tortoise(
         app,
         db_url=settings.DB_URL,
         modules={"models": ["app.models"]},
-        generate_schemas=True,          # Auto create tables (disable in production)
+        generate_schemas=False,         # Tables are created by prepare_schema below
         add_exception_handlers=True,    # Adds HTTP 422 error handlers
     )
+    # Runs after Tortoise.init: the ORM lifespan wraps the startup handlers
+    app.add_event_handler("startup", prepare_schema)
     logger.info("✅ PostgreSQL/Tortoise ORM initialized")
@@ -0,0 +1,115 @@
+# app/db/vector_store.py
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from app.utils.config import settings
+
+# Vector store backends (VECTOR_BACKEND)
+CHROMA_BACKEND = "chroma"
+LOCAL_BACKEND = "local"
+
+DEFAULT_INCLUDE = ["documents", "embeddings"]
+
+
+class VectorStore(ABC):
+    """
+    Named collections of (id, document, embedding, metadata) records.
+
+    Results are flat dicts keyed like Chroma's: "ids", and for each requested
+    include "documents", "embeddings", "metadatas" (plus "distances" from query).
+    Distances are squared L2. Filters (`where`) support equality and "$in" on
+    metadata keys. Collections are created on first write; reads of a missing
+    collection return empty results and never create it.
+    """
+
+    @abstractmethod
+    def add(
+        self,
+        name: str,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict]] = None,
+        upsert: bool = False,
+    ) -> None:
+        """
+        Insert records. Without `upsert`, ids that already exist are left untouched.
+        """
+
+    @abstractmethod
+    def query(
+        self,
+        name: str,
+        query_embedding: List[float],
+        n_results: int,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict:
+        """
+        Nearest records to `query_embedding`, closest first.
+        """
+
+    @abstractmethod
+    def get(
+        self,
+        name: str,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> Dict:
+        """
+        Records by id and/or filter (all records if neither is given).
+        """
+
+    @abstractmethod
+    def delete(self, name: str, ids: Optional[List[str]] = None) -> None:
+        """
+        Delete records by id, or the whole collection when `ids` is None.
+        """
+
+    @abstractmethod
+    def count(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        ...
+
+    def exists(self, name: str) -> bool:
+        """
+        Whether the collection exists; never creates it.
+        """
+        return name in self.list_collections()
+
+
+_store: Optional[VectorStore] = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Process-wide store for the configured VECTOR_BACKEND.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.VECTOR_BACKEND == CHROMA_BACKEND:
+                    from app.db.chroma_store import ChromaVectorStore
+                    _store = ChromaVectorStore(settings.CHROMA_PATH)
+                elif settings.VECTOR_BACKEND == LOCAL_BACKEND:
+                    from app.db.local_store import LocalVectorStore
+                    _store = LocalVectorStore(
+                        settings.LOCAL_VECTOR_PATH,
+                        ivf_min_rows=settings.IVF_MIN_ROWS,
+                        nprobe=settings.IVF_NPROBE,
+                        quantization=settings.VECTOR_QUANTIZATION,
+                        rerank_factor=settings.VECTOR_RERANK_FACTOR,
+                    )
+                else:
+                    raise ValueError(f"Unknown VECTOR_BACKEND '{settings.VECTOR_BACKEND}'")
+    return _store
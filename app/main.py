@@ -6,9 +6,16 @@ from app.api.upload_and_compare import router as upload_and_compare_router
 from app.api.generate import router as generate_router
 from app.api.list_files import router as list_files_router
 from app.api.ask_question import router as ask_router
+from app.api.ingest import router as ingest_router
 from app.services import rag_compare
 from app.utils.config import settings
 from app.db.postgres import init_postgres
+from app.services.embedding_client import close_http_client
+from app.services.embedding_cache import flush_embedding_cache
+from app.services.llm_gateway import close_llm_client
+from app.db.collection_catalog import get_collection_catalog
+from app.models.pdf_log import PDFLog
+from starlette.concurrency import run_in_threadpool
 
 # 🌟 Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -31,6 +38,7 @@ app.include_router(generate_router, prefix="/api")
 # app.include_router(rag_compare.router, prefix="/api")
 app.include_router(ask_router, prefix="/api")
 app.include_router(list_files_router, prefix="/api")
+app.include_router(ingest_router, prefix="/api")
 
 # 🌐 CORS setup
 app.add_middleware(
@@ -49,6 +57,21 @@ async def log_requests(request: Request, call_next):
     logger.info(f"⬅️ {request.method} {request.url.path} - Status: {response.status_code}")
     return response
 
+@app.on_event("startup")
+async def warm_collection_catalog():
+    try:
+        catalog = get_collection_catalog()
+        catalog.set_logged(await PDFLog.all().distinct().values_list("collection_name", flat=True))
+        await run_in_threadpool(catalog.warm)
+    except Exception as e:
+        logger.warning(f"⚠️ Collection catalog not warmed at startup: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    await close_http_client()
+    await close_llm_client()
+    await run_in_threadpool(flush_embedding_cache)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to AutoResearch AI backend"}
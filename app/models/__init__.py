@@ -7,8 +7,11 @@
 
 # app/models/__init__.py
 from .pdf_log import PDFLog
+from .chunk_summary import ChunkSummary
+from .paper_comparison import PaperComparison
+from .content_alias import ContentAlias
 
-__all__ = ["PDFLog"]
+__all__ = ["PDFLog", "ChunkSummary", "PaperComparison", "ContentAlias"]
  # ✅ Only include what you actually import
 
 
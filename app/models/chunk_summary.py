@@ -0,0 +1,14 @@
+from tortoise import fields
+from tortoise.models import Model
+
+class ChunkSummary(Model):
+    """
+    Summary of one piece of paper text, shared by every paper containing it.
+    `key` fingerprints the text together with the prompt and model that summarized it.
+    """
+    key = fields.CharField(max_length=64, pk=True)
+    summary = fields.TextField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "chunk_summaries"
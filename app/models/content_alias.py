@@ -0,0 +1,14 @@
+from tortoise import fields
+from tortoise.models import Model
+
+class ContentAlias(Model):
+    """
+    Upload bytes (SHA-256) whose text matched an already ingested paper, so the
+    same file is resolved to that paper without extracting it again.
+    """
+    content_sha256 = fields.CharField(max_length=64, pk=True)
+    pdf_log = fields.ForeignKeyField("models.PDFLog", related_name="content_aliases", on_delete=fields.CASCADE)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "content_aliases"
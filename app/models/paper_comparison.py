@@ -0,0 +1,16 @@
+from tortoise import fields
+from tortoise.models import Model
+
+class PaperComparison(Model):
+    """
+    Per-paper results of comparing one set of uploaded papers.
+    `key` fingerprints the sorted content hashes of the papers together with the
+    prompt and model that compared them; `results` maps each paper's content hash
+    to its ComparisonResult fields.
+    """
+    key = fields.CharField(max_length=64, pk=True)
+    results = fields.JSONField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "paper_comparisons"
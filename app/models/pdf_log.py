@@ -7,9 +7,15 @@ class PDFLog(Model):
     filename = fields.CharField(max_length=255)
     collection_name = fields.CharField(max_length=255)        
 
+    # Dedup keys: SHA-256 of the uploaded bytes and of the normalized extracted text
+    content_sha256 = fields.CharField(max_length=64, unique=True, null=True)
+    text_sha256 = fields.CharField(max_length=64, unique=True, null=True)
+
     title = fields.CharField(max_length=512)
     abstract = fields.TextField(null=True)
     summary = fields.TextField(null=True)
+    # Fingerprint of the text + prompt/model versions `summary` was generated from
+    summary_key = fields.CharField(max_length=64, null=True)
 
     full_text = fields.TextField(null=True)
     text_excerpt = fields.TextField(null=True)
@@ -25,6 +25,7 @@ class ComparisonResult(BaseModel):
     novel_insights: List[str]
     similarities: List[str]
     missing_gaps: List[str]
+    error: Optional[str] = None  # set (with empty sections) when this paper's comparison did not finish
 
 class UploadResponse(BaseModel):
     message: str
@@ -34,6 +35,7 @@ class UploadResponse(BaseModel):
 class AskQuestionRequest(BaseModel):
     question: str
     collection_names: List[str]
+    deadline_ms: Optional[int] = None
 
 class AskQuestionResponse(BaseModel):
     answer: str
@@ -42,3 +44,17 @@ class AskQuestionResponse(BaseModel):
 class SimpleSummary(BaseModel):
     title: str
     summary: str
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    progress: Optional[float] = None
+    collection_name: Optional[str] = None
+    title: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,198 @@
+# app/services/context_packer.py
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.config import settings
+from app.utils.text_splitter import encoding
+
+logger = logging.getLogger("uvicorn.error")
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+SEPARATOR_TOKENS = len(encoding.encode(CONTEXT_SEPARATOR))
+ELLIPSIS = "..."
+ELLIPSIS_TOKENS = len(encoding.encode(ELLIPSIS))
+
+# Shortest overlap (chars) taken as evidence that two chunks are adjacent
+MIN_OVERLAP_CHARS = 40
+# Probe taken from the head of a chunk to locate it inside its neighbour
+OVERLAP_PROBE_CHARS = 64
+# A chunk cut to fit the budget must keep at least this many tokens
+MIN_PARTIAL_TOKENS = 64
+
+
+def count_tokens(text: str) -> int:
+    return len(encoding.encode(text))
+
+
+def context_budget(model: str, prompt_without_context: str) -> int:
+    """
+    Tokens available for context: the model's window minus the rest of the prompt
+    and the room reserved for the answer, capped at CONTEXT_MAX_TOKENS.
+    """
+    window = settings.MODEL_CONTEXT_TOKENS.get(model, settings.DEFAULT_CONTEXT_TOKENS)
+    available = window - count_tokens(prompt_without_context) - settings.ANSWER_TOKEN_RESERVE
+    return max(0, min(available, settings.CONTEXT_MAX_TOKENS))
+
+
+def _overlap(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of `left` that is a prefix of `right` (0 if short).
+    """
+    probe = right[:OVERLAP_PROBE_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = left.rfind(probe, max(0, len(left) - len(right)))
+    while start != -1:
+        length = len(left) - start
+        if length >= MIN_OVERLAP_CHARS and right.startswith(left[start:]):
+            return length
+        start = left.rfind(probe, 0, start)
+    return 0
+
+
+def _mean_vector(vectors: Sequence):
+    present = [np.asarray(vector, dtype=np.float32) for vector in vectors if vector is not None]
+    return np.mean(present, axis=0) if present else None
+
+
+def merge_overlapping(items: List[Dict]) -> List[Dict]:
+    """
+    Join consecutive chunks of the same paper (positions p and p + 1) whose texts
+    overlap (the splitter repeats the trailing sentences of a chunk at the start of
+    the next), following runs of neighbours. Items without a position are kept as
+    they are. A merged chunk takes the best rank among its parts and the mean of
+    their vectors. Items are {"text", "vector"?, "paper_id"?, "position"?}.
+    """
+    by_position = {
+        (item.get("paper_id"), item["position"]): i
+        for i, item in enumerate(items)
+        if item.get("position") is not None
+    }
+    successor: Dict[int, Tuple[int, int]] = {}   # i -> (j, overlap chars): j continues i
+    for (paper_id, position), i in by_position.items():
+        j = by_position.get((paper_id, position + 1))
+        if j is not None:
+            length = _overlap(items[i]["text"], items[j]["text"])
+            if length:
+                successor[i] = (j, length)
+    has_predecessor = {j for j, _ in successor.values()}
+
+    merged = []
+    for start in range(len(items)):
+        if start in has_predecessor:
+            continue
+        item = dict(items[start])
+        parts = [start]
+        current = start
+        while current in successor:
+            current, length = successor[current]
+            item["text"] += items[current]["text"][length:]
+            parts.append(current)
+        if len(parts) > 1:
+            item["vector"] = _mean_vector([items[k].get("vector") for k in parts])
+        merged.append((min(parts), item))
+
+    merged.sort(key=lambda entry: entry[0])
+    return [item for _, item in merged]
+
+
+def _unit_rows(vectors: Sequence) -> Optional[np.ndarray]:
+    if not vectors or any(vector is None for vector in vectors):
+        return None
+    matrix = np.asarray([np.asarray(vector, dtype=np.float32) for vector in vectors])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def select_diverse(items: List[Dict], query_vector: Optional[Sequence[float]] = None) -> List[Dict]:
+    """
+    Order items for packing and drop near-duplicates.
+
+    With a query vector this is maximal marginal relevance: repeatedly take the item
+    maximizing lambda * sim(query) - (1 - lambda) * max sim(already taken). Without
+    one, the incoming (relevance) order is kept. Either way an item whose similarity
+    to an already taken one reaches CONTEXT_DUPLICATE_THRESHOLD is dropped.
+    Items without vectors are only deduplicated by exact text.
+    """
+    seen_texts = set()
+    unique = []
+    for item in items:
+        if item["text"] not in seen_texts:
+            seen_texts.add(item["text"])
+            unique.append(item)
+
+    rows = _unit_rows([item.get("vector") for item in unique])
+    if rows is None:
+        return unique
+
+    lam = settings.CONTEXT_MMR_LAMBDA
+    threshold = settings.CONTEXT_DUPLICATE_THRESHOLD
+    if query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = rows @ (query / (np.linalg.norm(query) or 1.0))
+    else:
+        relevance = None
+
+    remaining = list(range(len(unique)))
+    max_sim = np.full(len(unique), -np.inf, dtype=np.float32)
+    chosen = []
+    while remaining:
+        if relevance is None:
+            pick = remaining[0]
+        else:
+            candidates = np.asarray(remaining)
+            redundancy = np.where(np.isfinite(max_sim[candidates]), max_sim[candidates], 0.0)
+            pick = int(candidates[np.argmax(lam * relevance[candidates] - (1 - lam) * redundancy)])
+        remaining.remove(pick)
+        if max_sim[pick] >= threshold:
+            continue
+        chosen.append(unique[pick])
+        np.maximum(max_sim, rows @ rows[pick], out=max_sim)
+
+    return chosen
+
+
+def fill_budget(texts: Sequence[str], budget_tokens: int) -> List[str]:
+    """
+    Take texts in order while they fit in `budget_tokens` (separators included).
+    The first text that does not fit is cut at a token boundary if enough room is left.
+    """
+    packed = []
+    used = 0
+    for text in texts:
+        cost = SEPARATOR_TOKENS if packed else 0
+        tokens = encoding.encode(text)
+        if used + cost + len(tokens) <= budget_tokens:
+            packed.append(text)
+            used += cost + len(tokens)
+            continue
+        room = budget_tokens - used - cost - ELLIPSIS_TOKENS
+        if room >= MIN_PARTIAL_TOKENS:
+            packed.append(encoding.decode(tokens[:room]).rstrip("\ufffd ") + ELLIPSIS)
+        break
+    return packed
+
+
+def pack_context(
+    items: List[Dict],
+    budget_tokens: int,
+    query_vector: Optional[Sequence[float]] = None,
+) -> str:
+    """
+    Build a prompt context from ranked chunks: merge overlapping neighbours, drop
+    near-duplicates (MMR-style), then fill exactly `budget_tokens` tokens.
+    Items are dicts with "text" and optionally "vector", "paper_id" and "position"
+    (the chunk's index within its paper, see chunk_position).
+    """
+    items = [item for item in items if item.get("text") and item["text"].strip()]
+    selected = select_diverse(merge_overlapping(items), query_vector)
+    packed = fill_budget([item["text"] for item in selected], budget_tokens)
+
+    logger.debug(
+        f"📦 Context: {len(items)} chunks -> {len(selected)} after merge/dedup -> {len(packed)} within {budget_tokens} tokens"
+    )
+    return CONTEXT_SEPARATOR.join(packed)
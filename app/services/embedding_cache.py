@@ -0,0 +1,196 @@
+# app/services/embedding_cache.py
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.utils.config import settings
+from app.utils.hashing import normalize_text, sha256_hex
+
+logger = logging.getLogger("uvicorn.error")
+
+# Recency updates from lookups are held in memory and written in batches of this size
+TOUCH_FLUSH_SIZE = 1_000
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Keys are sha256(model + instruction + normalized text). Vectors live in an
+    in-memory LRU tier backed by a local SQLite store, which is trimmed to
+    `max_entries` rows by least-recent use. Lookups never commit: the recency of
+    disk hits is recorded in memory and written with the next put (or once
+    TOUCH_FLUSH_SIZE keys are pending). Calls block on SQLite, so async code
+    runs them in an executor.
+    """
+
+    def __init__(self, path: str, max_entries: int, memory_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._touched: Dict[str, float] = {}   # key -> last use not yet written to disk
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, instruction: str, text: str) -> str:
+        return sha256_hex(model, instruction, normalize_text(text))
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up keys, memory tier first, then disk. Missing keys are absent from the result.
+        """
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            disk_keys = []
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_keys.append(key)
+
+            # SQLite caps the number of bound parameters, so query in slices
+            for i in range(0, len(disk_keys), 500):
+                part = disk_keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                now = time.time()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                    self._touched[key] = now
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touches()
+                self._conn.commit()
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._flush_touches()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            for key, vector in items.items():
+                self._remember(key, vector)
+                self._touched.pop(key, None)
+            self._evict()
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """
+        Write pending recency updates to disk.
+        """
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+
+    def _flush_touches(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = size - self.max_entries
+        if overflow <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (overflow,),
+        )
+        self.evictions += overflow
+        logger.debug(f"🧹 Evicted {overflow} embeddings from cache (max_entries={self.max_entries})")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": size,
+            }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Process-wide cache instance, or None when caching is disabled.
+    """
+    global _cache
+    if not settings.EMBED_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    path=settings.EMBED_CACHE_PATH,
+                    max_entries=settings.EMBED_CACHE_MAX_ENTRIES,
+                    memory_entries=settings.EMBED_CACHE_MEMORY_ENTRIES,
+                )
+    return _cache
+
+
+def flush_embedding_cache() -> None:
+    """
+    Persist pending recency updates of the process-wide cache, if one was opened.
+    """
+    if _cache is not None:
+        _cache.flush()
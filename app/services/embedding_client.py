@@ -0,0 +1,173 @@
+# app/services/embedding_client.py
+
+import asyncio
+import importlib.util
+import logging
+import random
+from typing import List, Optional
+
+import httpx
+import tiktoken
+
+from app.services.rate_limiter import BATCH, get_rate_limiter, retry_after_seconds
+from app.utils.config import settings
+
+# Setup logger
+logger = logging.getLogger("uvicorn.error")
+
+# Tokenizer (Mistral uses cl100k_base like OpenAI)
+encoding = tiktoken.get_encoding("cl100k_base")
+
+# Mistral embedding API
+MISTRAL_EMBED_URL = f"{settings.MISTRAL_API_BASE.rstrip('/')}/v1/embeddings"
+HEADERS = {
+    "Authorization": f"Bearer {settings.MISTRAL_API_KEY}",
+    "Content-Type": "application/json"
+}
+EMBED_MODEL = "mistral-embed"  # 1024-dim embeddings
+
+MAX_RETRIES = 3  # Retry failed batches
+
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 pooling without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Pooled AsyncClient shared for the life of the process, with the semaphore
+    that keeps at most EMBED_MAX_CONCURRENCY batches in flight across all callers
+    (the pool's connection limit). Both are bound to the event loop that created
+    them, so new ones are built when called from a different loop (e.g. asyncio.run
+    in a Celery task, which closes them with `close_http_client` before its loop ends).
+    """
+    global _client, _client_loop, _semaphore
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(settings.EMBED_REQUEST_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.EMBED_MAX_CONCURRENCY,
+                max_keepalive_connections=settings.EMBED_MAX_CONCURRENCY,
+            ),
+        )
+        _client_loop = loop
+        _semaphore = asyncio.Semaphore(settings.EMBED_MAX_CONCURRENCY)
+        logger.debug(f"🌐 Created pooled embedding HTTP client (http2={HTTP2_AVAILABLE})")
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client, _client_loop, _semaphore
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+    _semaphore = None
+
+
+def pack_batches(token_counts: List[int], max_tokens: int, max_items: int) -> List[List[int]]:
+    """
+    Greedily pack item indices into batches bounded by a token budget and item count.
+    An item larger than the budget on its own gets a batch to itself.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for idx, count in enumerate(token_counts):
+        if current and (current_tokens + count > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(idx)
+        current_tokens += count
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _send_batch(
+    client: httpx.AsyncClient, batch: List[str], tokens: int, priority: int, batch_no: int, total: int
+) -> List[Optional[List[float]]]:
+    """
+    Embed one batch, retrying on its own with exponential backoff and jitter.
+    Each attempt is admitted by the shared rate limiter; a 429 pauses it for Retry-After.
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(1, MAX_RETRIES + 1):
+        delay = settings.EMBED_RETRY_BASE_DELAY * 2 ** (attempt - 1) * (1 + random.random())
+        try:
+            await limiter.acquire(tokens, priority)
+            logger.debug(f"📤 Sending batch {batch_no}/{total} (size {len(batch)}) - Attempt {attempt}")
+            payload = {"model": EMBED_MODEL, "input": batch}
+            response = await client.post(MISTRAL_EMBED_URL, headers=HEADERS, json=payload)
+            response.raise_for_status()
+
+            body = response.json()
+            limiter.settle(tokens, (body.get("usage") or {}).get("total_tokens"))
+            embeddings_data = body.get("data", [])
+            if len(embeddings_data) != len(batch):
+                logger.warning(f"⚠️ API returned {len(embeddings_data)} embeddings for {len(batch)} chunks.")
+
+            # The API reports each vector's input position; fall back to response order
+            vectors: List[Optional[List[float]]] = [None] * len(batch)
+            for pos, entry in enumerate(embeddings_data):
+                index = entry.get("index", pos)
+                if 0 <= index < len(batch):
+                    vectors[index] = entry["embedding"]
+            return vectors
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"🚨 Mistral API Error (Attempt {attempt}): {e.response.text}")
+            if e.response.status_code == 429:
+                delay = max(delay, retry_after_seconds(e.response.headers) or 0.0)
+                limiter.pause(delay)
+        except Exception:
+            logger.exception(f"❌ Unexpected error from Mistral API (Attempt {attempt})")
+
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(delay)
+
+    logger.error(f"❌ Failed to embed batch {batch_no}/{total} after {MAX_RETRIES} retries.")
+    return [None] * len(batch)
+
+
+async def dispatch_embeddings(chunks: List[str], priority: int = BATCH) -> List[Optional[List[float]]]:
+    """
+    Embed chunks with token-packed batches, several in flight at once.
+    Returns one entry per chunk in input order, None where its batch failed.
+    """
+    if not chunks:
+        return []
+
+    token_counts = [len(tokens) for tokens in encoding.encode_batch(chunks)]
+    batches = pack_batches(token_counts, settings.EMBED_BATCH_MAX_TOKENS, settings.EMBED_BATCH_MAX_ITEMS)
+
+    logger.debug(
+        f"🔁 Sending {len(chunks)} chunks ({sum(token_counts)} tokens) to Mistral in {len(batches)} batches, "
+        f"up to {settings.EMBED_MAX_CONCURRENCY} in flight."
+    )
+
+    client = get_http_client()
+    # Shared with every other caller, so concurrent ingests never outrun the connection pool
+    semaphore = _semaphore
+
+    async def run(batch_no: int, indices: List[int]):
+        async with semaphore:
+            tokens = sum(token_counts[i] for i in indices)
+            return await _send_batch(client, [chunks[i] for i in indices], tokens, priority, batch_no, len(batches))
+
+    batch_results = await asyncio.gather(*[run(no + 1, indices) for no, indices in enumerate(batches)])
+
+    # Reassemble in input order
+    results: List[Optional[List[float]]] = [None] * len(chunks)
+    for indices, vectors in zip(batches, batch_results):
+        for i, vector in zip(indices, vectors):
+            results[i] = vector
+    return results
@@ -1,14 +1,18 @@
 # app/services/embeddings.py
 
+import asyncio
 import logging
 from uuid import uuid4
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import tiktoken
-import httpx
-import asyncio
-from app.db.chroma_db import get_or_create_collection
+from app.db.chroma_db import add_paper_chunks, delete_paper_chunks
+from app.db.collection_catalog import get_collection_catalog
 from app.utils.text_splitter import chunk_text
-from app.utils.config import settings
+from app.services.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.services.embedding_client import EMBED_MODEL, dispatch_embeddings
+from app.services.rate_limiter import BATCH
+from app.services.lexical_index import build_paper_index, drop_paper_index
+from app.services.query_cache import invalidate_collections
 
 # Setup logger
 logger = logging.getLogger("uvicorn.error")
@@ -19,121 +23,135 @@ INSTRUCTION = "Represent the scientific research paper chunk for semantic retrie
 # Tokenizer (Mistral uses cl100k_base like OpenAI)
 encoding = tiktoken.get_encoding("cl100k_base")
 
-# Mistral embedding API
-MISTRAL_EMBED_URL = "https://api.mistral.ai/v1/embeddings"
-HEADERS = {
-    "Authorization": f"Bearer {settings.MISTRAL_API_KEY}",
-    "Content-Type": "application/json"
-}
-EMBED_MODEL = "mistral-embed"  # 1024-dim embeddings
+# Embedding input limit, and the chunk budget left after the instruction
+EMBED_TOKEN_LIMIT = 512
+INSTRUCTION_TOKENS = len(encoding.encode(INSTRUCTION))
+EMBED_CHUNK_TOKENS = min(480, EMBED_TOKEN_LIMIT - INSTRUCTION_TOKENS)
+EMBED_CHUNK_OVERLAP = 50
 
-# Safe request size
-MAX_BATCH_SIZE = 12
-MAX_RETRIES = 3  # Retry failed batches
 
+def embed_chunks(text: str) -> List[str]:
+    """
+    Split text into chunks within 512-token limit (including instruction).
+    The chunker counts tokens exactly, so no truncation pass is needed.
+    """
+    return chunk_text(text, max_tokens=EMBED_CHUNK_TOKENS, overlap=EMBED_CHUNK_OVERLAP)
 
-def get_token_count(instr: str, chunk: str) -> int:
-    """Count tokens for instruction + text chunk."""
-    return len(encoding.encode(instr)) + len(encoding.encode(chunk))
 
+def _cache_lookup(cache: EmbeddingCache, chunks: List[str]) -> Tuple[List[str], Dict[str, List[float]]]:
+    keys = [cache.make_key(EMBED_MODEL, INSTRUCTION, chunk) for chunk in chunks]
+    return keys, cache.get_many(keys)
 
-def embed_chunks(text: str) -> List[str]:
+
+async def embed_aligned(chunks: List[str], priority: int = BATCH) -> List[Optional[List[float]]]:
     """
-    Split text into chunks within 512-token limit (including instruction).
+    Return one embedding per chunk (None where it could not be embedded),
+    serving repeats from the embedding cache. Only cache misses are sent to Mistral.
+    The cache's SQLite tier is read and written off the event loop.
     """
-    raw_chunks = chunk_text(text, max_tokens=480, overlap=50)
-    processed_chunks = []
+    cache = get_embedding_cache()
+    if cache is None:
+        return await dispatch_embeddings(chunks, priority)
 
-    for chunk in raw_chunks:
-        truncated_chunk = chunk
-        while get_token_count(INSTRUCTION, truncated_chunk) > 512:
-            tokens = encoding.encode(truncated_chunk)
-            if len(tokens) <= 10:
-                truncated_chunk = ""
-                break
-            tokens = tokens[:-10]
-            truncated_chunk = encoding.decode(tokens)
+    loop = asyncio.get_running_loop()
+    keys, vectors = await loop.run_in_executor(None, _cache_lookup, cache, chunks)
 
-        if truncated_chunk:
-            processed_chunks.append(truncated_chunk)
-        else:
-            logger.warning("⚠️ Skipping chunk that exceeded token limit even after truncation.")
+    # Identical texts within one call are only sent once
+    missing = {}
+    for key, chunk in zip(keys, chunks):
+        if key not in vectors and key not in missing:
+            missing[key] = chunk
 
-    return processed_chunks
+    logger.debug(f"🗃️ Embedding cache: {len(chunks) - len(missing)} hits, {len(missing)} to fetch.")
 
+    if missing:
+        fetched = await dispatch_embeddings(list(missing.values()), priority)
+        new_vectors = {key: vector for key, vector in zip(missing, fetched) if vector is not None}
+        await loop.run_in_executor(None, cache.put_many, new_vectors)
+        vectors.update(new_vectors)
 
-async def get_mistral_embeddings(chunks: List[str]) -> List[List[float]]:
+    return [vectors.get(key) for key in keys]
+
+
+async def get_mistral_embeddings(chunks: List[str], priority: int = BATCH) -> List[List[float]]:
     """
-    Send chunks to Mistral in batches and return embeddings with retries.
+    Return embeddings for chunks, serving repeats from the embedding cache.
+    Chunks that fail to embed are dropped.
     """
     valid_chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
     if not valid_chunks:
         raise RuntimeError("No valid chunks to embed after filtering.")
 
-    all_embeddings = []
+    return [vector for vector in await embed_aligned(valid_chunks, priority) if vector is not None]
 
-    logger.debug(f"🔁 Sending {len(valid_chunks)} chunks to Mistral for embeddings in batches of {MAX_BATCH_SIZE}.")
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for i in range(0, len(valid_chunks), MAX_BATCH_SIZE):
-            batch = valid_chunks[i:i + MAX_BATCH_SIZE]
-            success = False
+async def embed_text(text: str) -> Tuple[List[str], List[List[float]]]:
+    """
+    Chunk and embed text.
+    Returns the chunks that were embedded and their vectors, aligned.
+    """
+    chunks = embed_chunks(text)
+    if not chunks:
+        return [], []
+
+    vectors = await embed_aligned(chunks)
 
-            for attempt in range(1, MAX_RETRIES + 1):
-                try:
-                    logger.debug(f"📤 Sending batch {i // MAX_BATCH_SIZE + 1} (size {len(batch)}) - Attempt {attempt}")
-                    payload = {"model": EMBED_MODEL, "input": batch}
-                    response = await client.post(MISTRAL_EMBED_URL, headers=HEADERS, json=payload)
-                    response.raise_for_status()
+    # ✅ Drop chunks whose batch failed so texts and vectors stay aligned
+    pairs = [(chunk, vector) for chunk, vector in zip(chunks, vectors) if vector is not None]
+    if len(pairs) != len(chunks):
+        logger.warning(f"⚠️ {len(chunks) - len(pairs)} of {len(chunks)} chunks could not be embedded and were skipped.")
 
-                    embeddings_data = response.json().get("data", [])
-                    if len(embeddings_data) != len(batch):
-                        logger.warning(f"⚠️ API returned {len(embeddings_data)} embeddings for {len(batch)} chunks.")
+    return [chunk for chunk, _ in pairs], [vector for _, vector in pairs]
 
-                    batch_embeddings = [entry["embedding"] for entry in embeddings_data]
-                    all_embeddings.extend(batch_embeddings)
-                    success = True
-                    break  # ✅ Success — no more retries for this batch
 
-                except httpx.HTTPStatusError as e:
-                    logger.error(f"🚨 Mistral API Error (Attempt {attempt}): {e.response.text}")
-                except Exception as e:
-                    logger.exception(f"❌ Unexpected error from Mistral API (Attempt {attempt})")
+def store_embeddings(collection_name: str, chunks: List[str], vectors: List[List[float]], ids: Optional[List[str]] = None) -> int:
+    """
+    Store precomputed chunk embeddings in ChromaDB under collection_name.
+    With explicit ids the write is an upsert, so repeating it is harmless.
+    """
+    if not chunks or not vectors:
+        logger.error(f"❌ No embeddings stored for '{collection_name}'.")
+        return 0
+
+    upsert = ids is not None
+    if ids is None:
+        ids = [str(uuid4()) for _ in range(len(chunks))]
+    add_paper_chunks(collection_name, ids, chunks, vectors, upsert=upsert)
+    invalidate_collections([collection_name])
+    catalog = get_collection_catalog()
+    catalog.refresh(collection_name)
+    catalog.mark_logged([collection_name])
+
+    # BM25 index next to the chunks; a failure here only delays it to first query
+    try:
+        build_paper_index(collection_name)
+    except Exception as e:
+        logger.warning(f"⚠️ Lexical index for '{collection_name}' not built: {e}")
 
-                # Delay before retrying
-                await asyncio.sleep(1.5 * attempt)
+    logger.info(f"✅ Stored {len(chunks)} chunks with Mistral embeddings in collection '{collection_name}'")
+    return len(chunks)
 
-            if not success:
-                logger.error(f"❌ Failed to embed batch {i // MAX_BATCH_SIZE + 1} after {MAX_RETRIES} retries.")
 
-    return all_embeddings
+def discard_embeddings(collection_name: str) -> None:
+    """
+    Undo `store_embeddings`: remove the chunks, their lexical index and any cached answers.
+    """
+    delete_paper_chunks(collection_name)
+    drop_paper_index(collection_name)
+    invalidate_collections([collection_name])
+    catalog = get_collection_catalog()
+    catalog.refresh(collection_name)
+    catalog.forget_logged(collection_name)
+    logger.info(f"🗑️ Discarded chunks of collection '{collection_name}'")
 
 
 async def embed_and_store(text: str, collection_name: str) -> int:
     """
     Generate embeddings for text, store in ChromaDB under collection_name.
     """
-    chunks = embed_chunks(text)
+    chunks, vectors = await embed_text(text)
     if not chunks:
         logger.warning(f"⚠️ No valid chunks generated for collection '{collection_name}'.")
         return 0
 
-    vectors = await get_mistral_embeddings(chunks)
-
-    # ✅ Guard against mismatches
-    if len(vectors) != len(chunks):
-        logger.warning(f"⚠️ Mismatch: {len(chunks)} chunks but {len(vectors)} embeddings returned. Trimming to match.")
-        min_len = min(len(chunks), len(vectors))
-        chunks = chunks[:min_len]
-        vectors = vectors[:min_len]
-
-    if not chunks or not vectors:
-        logger.error(f"❌ No embeddings stored for '{collection_name}'.")
-        return 0
-
-    ids = [str(uuid4()) for _ in range(len(chunks))]
-    collection = get_or_create_collection(collection_name)
-    collection.add(documents=chunks, ids=ids, embeddings=vectors)
-
-    logger.info(f"✅ Stored {len(chunks)} chunks with Mistral embeddings in collection '{collection_name}'")
-    return len(chunks)
+    return store_embeddings(collection_name, chunks, vectors)
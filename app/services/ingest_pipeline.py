@@ -0,0 +1,227 @@
+# app/services/ingest_pipeline.py
+
+import asyncio
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+
+from app.models.content_alias import ContentAlias
+from app.models.pdf_log import PDFLog
+from app.services.embeddings import discard_embeddings, embed_text, store_embeddings
+from app.services.pdf_extractor import extract_pdf_data
+from app.utils.config import settings
+from app.utils.hashing import text_sha256
+from app.utils.sanitizer import sanitize_collection_name, sanitize_text
+
+logger = logging.getLogger("uvicorn.error")
+
+# Chunk id from `chunk_ids`, optionally behind "<paper_id>:" in a shared collection
+_CHUNK_ID_RE = re.compile(r"(?:^|:)[0-9a-f]{16}-(\d+)$")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class IngestError(Exception):
+    """
+    Raised when one file of an ingest batch fails; carries the offending filename.
+    """
+
+    def __init__(self, filename: str, cause: Exception):
+        super().__init__(str(cause))
+        self.filename = filename
+        self.cause = cause
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INGEST_EXTRACT_WORKERS,
+                thread_name_prefix="pdf-extract",
+            )
+    return _executor
+
+
+def new_collection_name(filename: str) -> str:
+    base_name = filename.replace(".pdf", "")
+    safe_name = sanitize_collection_name(base_name)
+    return f"{safe_name}_{uuid4().hex[:8]}"
+
+
+def chunk_ids(text_hash: str, count: int) -> List[str]:
+    """
+    Deterministic chunk ids, so re-running an ingest upserts instead of duplicating.
+    """
+    return [f"{text_hash[:16]}-{i}" for i in range(count)]
+
+
+def chunk_position(chunk_id: str) -> Optional[int]:
+    """
+    Index of a chunk within its paper, read back from an id made by `chunk_ids`
+    (also under its shared-collection prefix). None for other ids (random UUIDs).
+    """
+    match = _CHUNK_ID_RE.search(chunk_id or "")
+    return int(match.group(1)) if match else None
+
+
+async def find_paper_by_content(content_sha256: str) -> Optional[PDFLog]:
+    """
+    The ingested paper for these upload bytes: stored under their hash, or an
+    earlier upload of them whose text matched an existing paper.
+    """
+    paper = await PDFLog.filter(content_sha256=content_sha256).first()
+    if paper is None:
+        alias = await ContentAlias.filter(content_sha256=content_sha256).select_related("pdf_log").first()
+        paper = alias.pdf_log if alias else None
+    return paper
+
+
+async def _record_alias(content_sha256: Optional[str], paper: PDFLog) -> None:
+    # Next upload of the same bytes resolves to `paper` before extraction
+    if content_sha256 and content_sha256 != paper.content_sha256:
+        await ContentAlias.bulk_create(
+            [ContentAlias(content_sha256=content_sha256, pdf_log=paper)], ignore_conflicts=True
+        )
+
+
+async def ingest_files(jobs: List[Dict], on_progress: Optional[Callable[[Dict, str], None]] = None) -> Dict[int, Dict]:
+    """
+    Run uploaded PDFs through a staged pipeline:
+
+        extract (thread pool) -> embed (concurrent across files) -> store (Chroma + PDFLog)
+
+    with bounded queues between stages, so one paper can be embedded while the next is
+    still being extracted. `jobs` are dicts with `index`, `filename`, `contents` and
+    `content_sha256`; returns {index: {"collection_name", "title"}}.
+
+    A file whose normalized text matches an already ingested paper (or an earlier file
+    in the same batch) is resolved to that paper and skips embedding entirely. A job may
+    pin its `collection_name`; `on_progress(job, stage)` is called as each job advances.
+    Upload hashes resolved through a text match are recorded as ContentAlias rows.
+    """
+    loop = asyncio.get_running_loop()
+    extracted: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+    embedded: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+    embed_workers = max(1, min(settings.INGEST_EMBED_WORKERS, len(jobs)))
+    results: Dict[int, Dict] = {}
+    claimed: Dict[str, int] = {}   # text hash -> index of the job ingesting it
+    aliases: Dict[int, int] = {}   # duplicate job index -> index of the job it repeats
+
+    def progress(job: Dict, stage: str):
+        if on_progress:
+            on_progress(job, stage)
+
+    async def extract_one(job: Dict):
+        progress(job, "extracting")
+        try:
+            result = await loop.run_in_executor(_get_executor(), extract_pdf_data, job["contents"], job["filename"])
+        except Exception as e:
+            raise IngestError(job["filename"], e) from e
+
+        job["contents"] = None  # release the upload buffer early
+        # One normalized text feeds the hash, the stored row and the chunker
+        job["full_text"] = sanitize_text(result.pop("text"))
+        job["text_sha256"] = text_sha256(job["full_text"])
+
+        # Same paper under a different file (re-saved, re-downloaded): reuse it
+        existing = await PDFLog.filter(text_sha256=job["text_sha256"]).first()
+        if existing:
+            logger.info(f"♻️ '{job['filename']}' matches the text of '{existing.filename}', reusing '{existing.collection_name}'")
+            await _record_alias(job.get("content_sha256"), existing)
+            results[job["index"]] = {"collection_name": existing.collection_name, "title": existing.title}
+            progress(job, "done")
+            return
+        if job["text_sha256"] in claimed:
+            aliases[job["index"]] = claimed[job["text_sha256"]]
+            return
+        claimed[job["text_sha256"]] = job["index"]
+
+        job["collection_name"] = job.get("collection_name") or new_collection_name(job["filename"])
+        job["title"] = sanitize_text(result["title"])
+        job["text_excerpt"] = sanitize_text(result["text_excerpt"])
+        await extracted.put(job)
+
+    async def extract_stage():
+        await asyncio.gather(*[extract_one(job) for job in jobs])
+        for _ in range(embed_workers):
+            await extracted.put(None)
+
+    async def embed_worker():
+        while (job := await extracted.get()) is not None:
+            progress(job, "embedding")
+            try:
+                job["chunks"], job["vectors"] = await embed_text(job["full_text"])
+            except Exception as e:
+                raise IngestError(job["filename"], e) from e
+            await embedded.put(job)
+
+    async def embed_stage():
+        await asyncio.gather(*[embed_worker() for _ in range(embed_workers)])
+        await embedded.put(None)
+
+    async def store_stage():
+        while (job := await embedded.get()) is not None:
+            progress(job, "storing")
+            try:
+                if job["chunks"]:
+                    ids = chunk_ids(job["text_sha256"], len(job["chunks"]))
+                    await loop.run_in_executor(
+                        None, store_embeddings, job["collection_name"], job["chunks"], job["vectors"], ids
+                    )
+                else:
+                    logger.warning(f"⚠️ No valid chunks generated for collection '{job['collection_name']}'.")
+
+                try:
+                    await PDFLog.create(
+                        filename=job["filename"],
+                        title=job["title"],
+                        collection_name=job["collection_name"],
+                        content_sha256=job["content_sha256"],
+                        text_sha256=job["text_sha256"],
+                        text_excerpt=job["text_excerpt"],
+                        full_text=job["full_text"],
+                    )
+                except IntegrityError:
+                    # A concurrent request ingested the same paper first; use its row
+                    existing = await PDFLog.filter(
+                        Q(content_sha256=job["content_sha256"]) | Q(text_sha256=job["text_sha256"])
+                    ).first()
+                    if not existing:
+                        raise
+                    logger.warning(f"⚠️ '{job['filename']}' was ingested concurrently, using '{existing.collection_name}'")
+                    await _record_alias(job["content_sha256"], existing)
+                    # Our copy of the chunks belongs to no paper; a pinned name may be the winner's own
+                    if job["chunks"] and existing.collection_name != job["collection_name"]:
+                        await loop.run_in_executor(None, discard_embeddings, job["collection_name"])
+                    job["collection_name"], job["title"] = existing.collection_name, existing.title
+            except Exception as e:
+                raise IngestError(job["filename"], e) from e
+
+            results[job["index"]] = {"collection_name": job["collection_name"], "title": job["title"]}
+            progress(job, "done")
+            logger.info(f"📥 Ingested '{job['filename']}' into '{job['collection_name']}'")
+
+    tasks = [asyncio.create_task(stage()) for stage in (extract_stage, embed_stage, store_stage)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    by_index = {job["index"]: job for job in jobs}
+    for index, original in aliases.items():
+        results[index] = results[original]
+        paper = await PDFLog.filter(text_sha256=by_index[index]["text_sha256"]).first()
+        if paper:
+            await _record_alias(by_index[index].get("content_sha256"), paper)
+    return results
@@ -0,0 +1,257 @@
+# app/services/lexical_index.py
+
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+
+from app.db.chroma_db import get_paper_chunks, is_shared_mode
+from app.utils.config import settings
+from app.utils.hashing import sha256_hex
+
+logger = logging.getLogger("uvicorn.error")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Bump when the on-disk layout or tokenization changes; older files are rebuilt
+INDEX_FORMAT = 1
+
+# Words joined by - . / _ stay one term ("gpt-4", "resnet-50", "eq.3", "imagenet_1k")
+_TOKEN_RE = re.compile(r"\w+(?:[-./_]\w+)*")
+_PART_RE = re.compile(r"[-./_]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how in into is it its of on or "
+    "that the their these this those to was were what when where which who why will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Case-folded terms for BM25. Compound technical terms are kept whole and
+    also emitted as their parts, so "BERT-large" matches "bert" and "bert-large".
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.casefold()):
+        if token not in STOPWORDS:
+            terms.append(token)
+        if _PART_RE.search(token):
+            terms.extend(part for part in _PART_RE.split(token) if part and part not in STOPWORDS)
+    return terms
+
+
+class LexicalIndex:
+    """
+    Compact BM25 inverted index over one paper's chunks.
+
+    Terms are a sorted array; postings are stored CSR-style: the postings of
+    term i are doc_ids/term_freqs[term_ptr[i]:term_ptr[i + 1]]. `ids` are the
+    chunk ids as stored in the vector store.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        doc_lens: np.ndarray,
+        terms: np.ndarray,
+        term_ptr: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        shared: bool,
+    ):
+        self.ids = ids
+        self.doc_lens = doc_lens
+        self.terms = terms
+        self.term_ptr = term_ptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.shared = shared
+        self._lookup = {term: i for i, term in enumerate(terms.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: Sequence[str], documents: Sequence[str], shared: bool = False) -> "LexicalIndex":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lens = np.zeros(len(ids), dtype=np.int32)
+
+        for doc, text in enumerate(documents):
+            counts = Counter(tokenize(text or ""))
+            doc_lens[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        terms = sorted(postings)
+        term_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            term_ptr[i + 1] = term_ptr[i] + len(postings[term])
+
+        doc_ids = np.empty(term_ptr[-1], dtype=np.int32)
+        term_freqs = np.empty(term_ptr[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            entries = np.asarray(postings[term], dtype=np.int64).reshape(-1, 2)
+            doc_ids[term_ptr[i]:term_ptr[i + 1]] = entries[:, 0]
+            term_freqs[term_ptr[i]:term_ptr[i + 1]] = np.minimum(entries[:, 1], np.iinfo(np.uint16).max)
+
+        return cls(
+            ids=np.asarray(list(ids), dtype=str),
+            doc_lens=doc_lens,
+            terms=np.asarray(terms, dtype=str),
+            term_ptr=term_ptr,
+            doc_ids=doc_ids,
+            term_freqs=term_freqs,
+            shared=shared,
+        )
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            format=np.int32(INDEX_FORMAT),
+            shared=np.bool_(self.shared),
+            ids=self.ids,
+            doc_lens=self.doc_lens,
+            terms=self.terms,
+            term_ptr=self.term_ptr,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        """
+        Read an index from disk; None if it is missing or in an older format.
+        """
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["format"]) != INDEX_FORMAT:
+                    return None
+                return cls(
+                    ids=data["ids"],
+                    doc_lens=data["doc_lens"],
+                    terms=data["terms"],
+                    term_ptr=data["term_ptr"],
+                    doc_ids=data["doc_ids"],
+                    term_freqs=data["term_freqs"],
+                    shared=bool(data["shared"]),
+                )
+        except FileNotFoundError:
+            return None
+
+    def document_frequencies(self, terms: Iterable[str]) -> Dict[str, int]:
+        df = {}
+        for term in terms:
+            i = self._lookup.get(term)
+            df[term] = int(self.term_ptr[i + 1] - self.term_ptr[i]) if i is not None else 0
+        return df
+
+    def scores(self, query_terms: Dict[str, int], idf: Dict[str, float], avg_len: float) -> np.ndarray:
+        """
+        BM25 score of every chunk for the query (term -> query frequency).
+        """
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens / max(avg_len, 1e-9))
+        for term, qtf in query_terms.items():
+            i = self._lookup.get(term)
+            if i is None:
+                continue
+            docs = self.doc_ids[self.term_ptr[i]:self.term_ptr[i + 1]]
+            tf = self.term_freqs[self.term_ptr[i]:self.term_ptr[i + 1]].astype(np.float32)
+            scores[docs] += qtf * idf[term] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+
+def index_path(paper_id: str) -> str:
+    return os.path.join(settings.LEXICAL_INDEX_DIR, f"{sha256_hex(paper_id)[:32]}.npz")
+
+
+_indexes: LRUCache = LRUCache(maxsize=settings.LEXICAL_INDEX_CACHE_ENTRIES)
+_indexes_lock = threading.Lock()
+
+
+def build_paper_index(paper_id: str) -> LexicalIndex:
+    """
+    (Re)build a paper's index from the chunks currently in the vector store and persist it.
+    """
+    stored = get_paper_chunks(paper_id, include=["documents"])
+    index = LexicalIndex.build(stored["ids"], stored["documents"], shared=is_shared_mode())
+    index.save(index_path(paper_id))
+    with _indexes_lock:
+        _indexes[paper_id] = index
+    logger.info(f"🔤 Lexical index for '{paper_id}': {len(index)} chunks, {len(index.terms)} terms")
+    return index
+
+
+def drop_paper_index(paper_id: str) -> None:
+    """
+    Forget a paper's index, in memory and on disk.
+    """
+    with _indexes_lock:
+        _indexes.pop(paper_id, None)
+    try:
+        os.remove(index_path(paper_id))
+    except FileNotFoundError:
+        pass
+
+
+def get_paper_index(paper_id: str) -> LexicalIndex:
+    """
+    A paper's index from memory or disk. Papers ingested before lexical indexing
+    existed (or indexed under the other storage mode) are indexed on first use.
+    """
+    with _indexes_lock:
+        index = _indexes.get(paper_id)
+    if index is None:
+        index = LexicalIndex.load(index_path(paper_id))
+        if index is not None:
+            with _indexes_lock:
+                _indexes[paper_id] = index
+    if index is None or index.shared != is_shared_mode():
+        index = build_paper_index(paper_id)
+    return index
+
+
+def search_papers(paper_ids: Sequence[str], query: str, top_k: int) -> List[Tuple[str, str, float]]:
+    """
+    BM25 top-k across several papers as (paper_id, chunk_id, score), best first.
+
+    IDF and average chunk length are computed over the union of the papers, so
+    scores are comparable across papers.
+    """
+    query_terms = Counter(tokenize(query))
+    if not query_terms or top_k <= 0:
+        return []
+
+    indexes = [(paper_id, get_paper_index(paper_id)) for paper_id in paper_ids]
+    total_docs = sum(len(index) for _, index in indexes)
+    if not total_docs:
+        return []
+
+    df = Counter()
+    for _, index in indexes:
+        df.update(index.document_frequencies(query_terms))
+    idf = {term: math.log(1 + (total_docs - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+    avg_len = sum(float(index.doc_lens.sum()) for _, index in indexes) / total_docs
+
+    candidates = []
+    for paper_id, index in indexes:
+        scores = index.scores(query_terms, idf, avg_len)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        candidates.extend((paper_id, str(index.ids[doc]), float(scores[doc])) for doc in matched)
+
+    candidates.sort(key=lambda hit: -hit[2])
+    return candidates[:top_k]
+
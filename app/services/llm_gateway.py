@@ -0,0 +1,150 @@
+# app/services/llm_gateway.py
+
+import asyncio
+import logging
+import random
+from typing import AsyncIterator, Optional
+
+from mistralai.async_client import MistralAsyncClient
+from mistralai.exceptions import MistralAPIException, MistralAPIStatusException, MistralException
+
+from app.services.context_packer import count_tokens
+from app.services.rate_limiter import BATCH, get_rate_limiter, retry_after_seconds
+from app.utils.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+_client: Optional[MistralAsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_llm_client() -> MistralAsyncClient:
+    """
+    Pooled async Mistral client shared by every chat call in the process.
+    Like the embedding client it is bound to the event loop that created it, so
+    a new one (with its own concurrency limit) is built for a different loop;
+    code that runs its own loop closes it with `close_llm_client` before the loop ends.
+    """
+    global _client, _client_loop, _semaphore
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        # Retries are ours (with jitter); max_retries=1 turns off the SDK's fixed backoff
+        _client = MistralAsyncClient(
+            api_key=settings.MISTRAL_API_KEY,
+            endpoint=settings.MISTRAL_API_BASE,
+            max_retries=1,
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+            max_concurrent_requests=settings.LLM_MAX_CONCURRENCY,
+        )
+        _client_loop = loop
+        _semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        logger.debug(f"🌐 Created pooled LLM client ({settings.LLM_MAX_CONCURRENCY} calls in flight)")
+    return _client
+
+
+async def close_llm_client() -> None:
+    global _client, _client_loop, _semaphore
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _client_loop = None
+    _semaphore = None
+
+
+def _retryable(error: Exception) -> bool:
+    """
+    Rate limits, server errors, timeouts and connection failures are retried;
+    other API errors (bad request, auth) are not.
+    """
+    if isinstance(error, MistralAPIStatusException):
+        return True
+    if isinstance(error, MistralAPIException):
+        return False
+    return isinstance(error, (MistralException, asyncio.TimeoutError))
+
+
+async def _backoff(attempt: int, error: Exception, what: str) -> None:
+    """
+    Sleep before the next attempt, or re-raise when the error is final. A 429 also
+    pauses the rate limiter for every other call, for as long as Retry-After asks.
+    """
+    if attempt >= settings.LLM_MAX_RETRIES or not _retryable(error):
+        raise error
+    delay = settings.LLM_RETRY_BASE_DELAY * 2 ** (attempt - 1) * (1 + random.random())
+    if isinstance(error, MistralAPIException) and error.http_status == 429:
+        delay = max(delay, retry_after_seconds(error.headers) or 0.0)
+        get_rate_limiter().pause(delay)
+    logger.warning(f"⚠️ {what} failed (attempt {attempt}/{settings.LLM_MAX_RETRIES}): {error!r}; retrying in {delay:.1f}s")
+    await asyncio.sleep(delay)
+
+
+def _estimate_tokens(prompt: str) -> int:
+    # Charged against the tokens/min budget until the API reports the real usage
+    return count_tokens(prompt) + settings.LLM_COMPLETION_TOKEN_ESTIMATE
+
+
+async def chat(model: str, prompt: str, timeout: Optional[float] = None, priority: int = BATCH) -> str:
+    """
+    Answer to a single-message prompt. Calls are admitted by the rate limiter in
+    `priority` order and at most LLM_MAX_CONCURRENCY run at once; each attempt is
+    bounded by `timeout` (default LLM_REQUEST_TIMEOUT).
+    """
+    client = get_llm_client()
+    limiter = get_rate_limiter()
+    timeout = timeout or settings.LLM_REQUEST_TIMEOUT
+    estimate = _estimate_tokens(prompt)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await limiter.acquire(estimate, priority)
+            async with _semaphore:
+                response = await asyncio.wait_for(
+                    client.chat(model=model, messages=[{"role": "user", "content": prompt}]), timeout
+                )
+            limiter.settle(estimate, response.usage.total_tokens if response.usage else None)
+            return response.choices[0].message.content
+        except Exception as e:
+            await _backoff(attempt, e, f"{model} chat")
+
+
+async def chat_stream(
+    model: str, prompt: str, timeout: Optional[float] = None, priority: int = BATCH
+) -> AsyncIterator[str]:
+    """
+    Answer to a single-message prompt, yielded as text deltas as the model produces them.
+    Admission works as in `chat`; the call holds a concurrency slot until the stream ends
+    and `timeout` bounds the wait for each delta. Failures are retried only before the
+    first delta is yielded.
+    """
+    client = get_llm_client()
+    limiter = get_rate_limiter()
+    timeout = timeout or settings.LLM_REQUEST_TIMEOUT
+    estimate = _estimate_tokens(prompt)
+    attempt = 0
+    while True:
+        attempt += 1
+        started = False
+        try:
+            await limiter.acquire(estimate, priority)
+            async with _semaphore:
+                stream = client.chat_stream(model=model, messages=[{"role": "user", "content": prompt}])
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            return
+                        if chunk.usage:
+                            limiter.settle(estimate, chunk.usage.total_tokens)
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            started = True
+                            yield delta
+                finally:
+                    await stream.aclose()
+        except Exception as e:
+            if started:
+                raise
+            await _backoff(attempt, e, f"{model} stream")
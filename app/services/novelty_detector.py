@@ -64,41 +64,59 @@
 
 # app/services/novelty_detector.py
 from app.utils.config import settings
-from mistralai.client import MistralClient
-from app.services.embeddings import get_mistral_embeddings  # async
-from sklearn.metrics.pairwise import cosine_similarity
+from app.services.llm_gateway import chat
+from app.services.embeddings import embed_aligned  # async
+from app.services.similarity import max_similarity_to_others, stack_papers
+from app.services.quantization import QuantizedVectors, stack_vectors
+from typing import List, Tuple, Union
 import numpy as np
 import asyncio
 import logging
 
 logger = logging.getLogger("uvicorn.error")
-mistral = MistralClient(api_key=settings.MISTRAL_API_KEY)
 
-async def get_unique_chunks(base_chunks, comparison_chunks, threshold=0.60):
+
+def _text(chunk: dict) -> str:
+    return (chunk.get("text") or "").strip()
+
+
+async def chunk_vectors(chunks: List[dict]) -> Tuple[List[int], Union[np.ndarray, QuantizedVectors]]:
     """
-    Compare base paper chunks with comparison paper chunks and return unique ones.
-    Uses Mistral embeddings to measure similarity.
+    Return (positions, matrix) for chunks, using each chunk's stored "embedding"
+    and only calling the embedding API for chunks that lack one.
+    Chunks that still have no vector are left out of `positions`.
+    The matrix is in the EMBEDDING_QUANTIZATION representation.
     """
-    base_texts = [c["text"] for c in base_chunks]
-    comp_texts = [c["text"] for c in comparison_chunks]
+    vectors = [c.get("embedding") for c in chunks]
+    missing = [i for i, vector in enumerate(vectors) if vector is None and _text(chunks[i])]
 
-    if not base_texts or not comp_texts:
-        logger.warning("Empty chunks passed to get_unique_chunks")
-        return base_texts
+    if missing:
+        logger.info(f"Embedding {len(missing)} of {len(chunks)} chunks without stored vectors")
+        fetched = await embed_aligned([_text(chunks[i]) for i in missing])
+        for i, vector in zip(missing, fetched):
+            vectors[i] = vector
 
-    # Batch embedding calls for all base and comparison chunks
-    base_vecs = np.array(await get_mistral_embeddings(base_texts))
-    comp_vecs = np.array(await get_mistral_embeddings(comp_texts))
+    positions = [i for i, vector in enumerate(vectors) if vector is not None]
+    if not positions:
+        return [], np.empty((0, 0), dtype=np.float32)
+    return positions, stack_vectors([vectors[i] for i in positions], settings.EMBEDDING_QUANTIZATION)
 
-    # Compute cosine similarities between base and comparison vectors
-    similarities = cosine_similarity(base_vecs, comp_vecs)
 
-    # Keep only those base chunks whose max similarity is below the threshold
-    unique_indices = [i for i, row in enumerate(similarities) if max(row) < threshold]
-    unique_texts = [base_chunks[i]["text"] for i in unique_indices]
+async def get_unique_chunks_for_papers(papers: List[List[dict]], threshold=0.60) -> List[List[dict]]:
+    """
+    Unique chunks of every paper against all the others, in one pass.
+    All vectors are stacked once and each cross-paper similarity block is computed once.
+    """
+    vector_sets = await asyncio.gather(*[chunk_vectors(chunks) for chunks in papers])
+    matrix, offsets = stack_papers([vectors for _, vectors in vector_sets], settings.EMBEDDING_QUANTIZATION)
+    best = max_similarity_to_others(matrix, offsets, settings.SIMILARITY_BLOCK_BYTES)
 
-    logger.info(f"Identified {len(unique_texts)} unique chunks out of {len(base_chunks)} base chunks")
-    return unique_texts
+    results = []
+    for chunks, (positions, _), scores in zip(papers, vector_sets, best):
+        unique = [chunks[p] for p, score in zip(positions, scores) if score < threshold]
+        logger.info(f"Identified {len(unique)} unique chunks out of {len(chunks)} base chunks")
+        results.append(unique)
+    return results
 
 
 async def generate_novelty_summary(title, unique_chunks, all_titles):
@@ -121,14 +139,5 @@ The following content is found only in the paper titled '{title}' and not in oth
 Please summarize the novel contributions, unexplored ideas, or distinctive insights from this content.
 """
 
-    loop = asyncio.get_running_loop()
-    response = await loop.run_in_executor(
-        None,
-        lambda: mistral.chat(
-            model="mistral-medium",
-            messages=[{"role": "user", "content": prompt}]
-        )
-    )
-
-    return response.choices[0].message.content
+    return await chat("mistral-medium", prompt)
 
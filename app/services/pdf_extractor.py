@@ -1,17 +1,73 @@
 # app/services/pdf_extractor.py
 import fitz  # PyMuPDF
-from typing import Dict
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from app.utils.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _worker_count() -> int:
+    return settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Shared process pool for page rendering, or None where child processes
+    are not allowed (e.g. inside a daemonic Celery prefork worker).
+    """
+    global _pool
+    if multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_worker_count())
+    return _pool
+
+
+def _extract_page_range(file_bytes: bytes, start: int, stop: int) -> List[str]:
+    """
+    Worker entry point: extract text for pages [start, stop).
+    """
+    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+
+def extract_pdf_text(file_bytes: bytes, doc: fitz.Document) -> str:
+    """
+    Text of every page, in order. Large documents are split into page ranges
+    rendered across the process pool.
+    """
+    page_count = doc.page_count
+    pool = _get_pool() if page_count >= settings.PDF_PARALLEL_PAGE_THRESHOLD else None
+    if pool is None:
+        return "".join(page.get_text("text") for page in doc)
+
+    workers = _worker_count()
+    step = max(1, -(-page_count // (workers * 2)))
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    logger.debug(f"📄 Extracting {page_count} pages in {len(ranges)} ranges across {workers} processes")
+
+    futures = [pool.submit(_extract_page_range, file_bytes, start, stop) for start, stop in ranges]
+    return "".join(text for future in futures for text in future.result())
+
 
 def extract_pdf_data(file_bytes: bytes, filename: str) -> Dict:
     """
     Extract title, text, and metadata from a PDF file.
+    Pages are read in parallel for large documents (see `extract_pdf_text`).
     """
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    text = ""
-    for page in doc:
-        text += page.get_text("text")
-
-    metadata = doc.metadata
+    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        metadata = doc.metadata or {}
+        text = extract_pdf_text(file_bytes, doc)
 
     return {
         "filename": filename,
@@ -0,0 +1,129 @@
+# app/services/quantization.py
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+# Embedding representations (EMBEDDING_QUANTIZATION, VECTOR_QUANTIZATION)
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+INT8 = "int8"
+
+CODE_DTYPES = {FLOAT32: np.float32, FLOAT16: np.float16, INT8: np.int8}
+
+INT8_MAX = 127.0
+
+
+class QuantizedVectors:
+    """
+    Compact vectors: float16 codes, or int8 codes with one float32 scale per vector
+    (x ~= codes * scale, symmetric, scale = max|x| / 127). Holds a matrix (n, dim)
+    or, indexed with an integer, a single vector (dim,).
+
+    Converts to float32 through `np.asarray`, so it can stand in for an embedding
+    anywhere one is consumed. Similarity kernels read it tile by tile with `rows`.
+    """
+
+    __slots__ = ("kind", "codes", "scales")
+
+    def __init__(self, kind: str, codes: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index) -> "QuantizedVectors":
+        scales = self.scales[index] if self.scales is not None else None
+        return QuantizedVectors(self.kind, self.codes[index], scales)
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """
+        Rows start:stop as float32; the only full-precision copy a kernel materializes.
+        """
+        return dequantize(self[start:stop])
+
+    def __array__(self, dtype=None, copy=None):
+        vectors = dequantize(self)
+        return vectors if dtype is None else vectors.astype(dtype, copy=False)
+
+
+def quantize(vectors, kind: str, normalize: bool = False) -> Union[np.ndarray, QuantizedVectors]:
+    """
+    Vectors (one per row, or a single vector) in the `kind` representation.
+    FLOAT32 gives a plain float32 array.
+
+    With `normalize`, rows come out with unit L2 norm as they will be read back:
+    for int8 the scale is fitted to the codes, so quantization error never skews
+    cosine similarities towards longer vectors.
+    """
+    if kind not in CODE_DTYPES:
+        raise ValueError(f"Unknown quantization '{kind}'")
+    if isinstance(vectors, QuantizedVectors) and vectors.kind == kind and not normalize:
+        return vectors
+
+    vectors = np.array(vectors, dtype=np.float32)
+    if normalize and kind != INT8:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+    if kind == FLOAT32:
+        return vectors
+    if kind == FLOAT16:
+        return QuantizedVectors(FLOAT16, vectors.astype(np.float16))
+
+    peak = np.abs(vectors).max(axis=-1) if vectors.shape[-1] else np.zeros(vectors.shape[:-1], dtype=np.float32)
+    scales = (peak / INT8_MAX).astype(np.float32)
+    safe = np.where(scales == 0, 1.0, scales)[..., None]
+    codes = np.clip(np.rint(vectors / safe), -INT8_MAX, INT8_MAX).astype(np.int8)
+    if normalize:
+        norms = np.linalg.norm(codes.astype(np.float32), axis=-1)
+        scales = np.where(norms == 0, 0.0, 1.0 / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+    return QuantizedVectors(INT8, codes, scales)
+
+
+def dequantize(vectors) -> np.ndarray:
+    """
+    float32 copy (or view, for float32 input) of vectors in any representation.
+    """
+    if not isinstance(vectors, QuantizedVectors):
+        return np.asarray(vectors, dtype=np.float32)
+    values = vectors.codes.astype(np.float32)
+    if vectors.kind == INT8:
+        values *= np.asarray(vectors.scales, dtype=np.float32)[..., None]
+    return values
+
+
+def rows_float32(vectors, start: int, stop: int) -> np.ndarray:
+    """
+    Rows start:stop of a float32 matrix (a view) or of quantized vectors (dequantized).
+    """
+    if isinstance(vectors, QuantizedVectors):
+        return vectors.rows(start, stop)
+    return vectors[start:stop]
+
+
+def stack_vectors(vectors: Sequence, kind: str) -> Union[np.ndarray, QuantizedVectors]:
+    """
+    One (n, dim) matrix in the `kind` representation from per-chunk vectors.
+    Rows that are already quantized in that representation are stacked as codes,
+    without a float32 round trip.
+    """
+    if vectors and kind != FLOAT32 and all(isinstance(v, QuantizedVectors) and v.kind == kind for v in vectors):
+        codes = np.stack([v.codes for v in vectors])
+        scales = np.asarray([v.scales for v in vectors], dtype=np.float32) if kind == INT8 else None
+        return QuantizedVectors(kind, codes, scales)
+    return quantize(np.asarray([np.asarray(v, dtype=np.float32) for v in vectors], dtype=np.float32), kind)
+
+
+def bytes_per_vector(dim: int, kind: str) -> int:
+    return dim * np.dtype(CODE_DTYPES[kind]).itemsize + (4 if kind == INT8 else 0)
@@ -0,0 +1,168 @@
+# app/services/query_cache.py
+
+import logging
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import redis
+from cachetools import TTLCache
+
+from app.utils.config import settings
+from app.utils.hashing import normalize_text
+
+logger = logging.getLogger("uvicorn.error")
+
+GENERATION_KEY = "query-cache:generation:{}"
+
+
+def normalize_question(question: str) -> str:
+    """
+    Cache form of a question: NFKC, collapsed whitespace, case-folded.
+    """
+    return normalize_text(question).casefold()
+
+
+class QueryCache:
+    """
+    Two-level cache for question answering, each level TTL-bounded with LRU eviction:
+
+        vectors: (model, normalized question) -> query embedding
+        answers: (normalized question, collections, prompt version) -> answer
+
+    Answer keys embed a generation counter per collection. Storing chunks into a
+    collection bumps its counter (see `invalidate_collections`), so every answer
+    that used it stops matching and ages out of the LRU.
+
+    With a Redis client the counters are shared (INCR/MGET), so a paper re-ingested
+    by the worker or another API process retires answers here too; while Redis is
+    unreachable, answers are neither served nor stored. Without one they are local.
+    """
+
+    def __init__(
+        self,
+        vector_entries: int,
+        vector_ttl: float,
+        answer_entries: int,
+        answer_ttl: float,
+        shared_generations: Optional[redis.Redis] = None,
+    ):
+        self._vectors: TTLCache = TTLCache(maxsize=vector_entries, ttl=vector_ttl)
+        self._answers: TTLCache = TTLCache(maxsize=answer_entries, ttl=answer_ttl)
+        self._generations: dict = {}
+        self._shared = shared_generations
+        self._lock = threading.Lock()
+
+        self.vector_hits = 0
+        self.answer_hits = 0
+        self.misses = 0
+
+    def _generations_of(self, names: List[str]) -> Optional[List[int]]:
+        if self._shared is None:
+            with self._lock:
+                return [self._generations.get(name, 0) for name in names]
+        try:
+            values = self._shared.mget([GENERATION_KEY.format(name) for name in names])
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Query cache generations unavailable: {e}")
+            return None
+        return [int(value or 0) for value in values]
+
+    def _answer_key(self, question: str, collections: Iterable[str], prompt_version: str) -> Optional[Tuple]:
+        """
+        Cache key of an answer; None when the collections' generations can't be read.
+        """
+        names = sorted(set(collections))
+        generations = self._generations_of(names)
+        if generations is None:
+            return None
+        return (normalize_question(question), tuple(zip(names, generations)), prompt_version)
+
+    def get_vector(self, model: str, question: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._vectors.get((model, normalize_question(question)))
+            if vector is not None:
+                self.vector_hits += 1
+            return vector
+
+    def put_vector(self, model: str, question: str, vector: List[float]) -> None:
+        with self._lock:
+            self._vectors[(model, normalize_question(question))] = vector
+
+    def get_answer(self, question: str, collections: Iterable[str], prompt_version: str) -> Optional[str]:
+        key = self._answer_key(question, collections, prompt_version)
+        with self._lock:
+            answer = self._answers.get(key) if key is not None else None
+            if answer is None:
+                self.misses += 1
+            else:
+                self.answer_hits += 1
+            return answer
+
+    def put_answer(self, question: str, collections: Iterable[str], prompt_version: str, answer: str) -> None:
+        key = self._answer_key(question, collections, prompt_version)
+        if key is not None:
+            with self._lock:
+                self._answers[key] = answer
+
+    def invalidate_collections(self, collections: Iterable[str]) -> None:
+        """
+        Retire every cached answer that was computed over any of `collections`.
+        """
+        names = list(collections)
+        with self._lock:
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+        if self._shared is not None and names:
+            try:
+                pipe = self._shared.pipeline(transaction=False)
+                for name in names:
+                    pipe.incr(GENERATION_KEY.format(name))
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"⚠️ Cached answers for {names} not retired in other processes: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vector_hits": self.vector_hits,
+                "answer_hits": self.answer_hits,
+                "misses": self.misses,
+                "vector_entries": len(self._vectors),
+                "answer_entries": len(self._answers),
+            }
+
+
+_cache: Optional[QueryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[QueryCache]:
+    """
+    Process-wide cache instance, or None when caching is disabled.
+    """
+    global _cache
+    if not settings.QUERY_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryCache(
+                    vector_entries=settings.QUERY_VECTOR_CACHE_ENTRIES,
+                    vector_ttl=settings.QUERY_VECTOR_CACHE_TTL,
+                    answer_entries=settings.ANSWER_CACHE_ENTRIES,
+                    answer_ttl=settings.ANSWER_CACHE_TTL,
+                    shared_generations=(
+                        redis.Redis.from_url(settings.REDIS_BROKER_URL, socket_timeout=1.0)
+                        if settings.QUERY_CACHE_SHARED_GENERATIONS else None
+                    ),
+                )
+    return _cache
+
+
+def invalidate_collections(collections: Iterable[str]) -> None:
+    """
+    Hook for writers: call after storing chunks into any of `collections`.
+    """
+    cache = get_query_cache()
+    if cache is not None:
+        cache.invalidate_collections(collections)
@@ -59,13 +59,13 @@
 #     return [result]
 
 
-from app.db.chroma_db import get_or_create_collection
+from app.services.retrieval import retrieval_deadline, retrieve
 from app.utils.config import settings
 from app.services.embeddings import get_mistral_embeddings
-from mistralai.client import MistralClient
-import asyncio
-
-mistral = MistralClient(api_key=settings.MISTRAL_API_KEY)
+from app.services.context_packer import context_budget, pack_context
+from app.services.ingest_pipeline import chunk_position
+from app.services.llm_gateway import chat
+from typing import Optional
 
 PROMPT_TEMPLATE = """
 Compare the following research content across papers.
@@ -93,58 +93,41 @@ Missing Gaps:
 <your answer>
 """
 
-MAX_CONTEXT_CHUNKS = 50      # total max retrieved chunks across all PDFs
-MAX_CHUNK_CHARS = 1500       # trim each chunk to avoid token overflow
+CHAT_MODEL = "mistral-medium"
 
-async def query_multi_pdf_collections(collection_names: list[str], question: str, top_k: int = 3) -> str:
+async def query_multi_pdf_collections(
+    collection_names: list[str],
+    question: str,
+    top_k: Optional[int] = None,
+    deadline_ms: Optional[int] = None,
+) -> str:
     """
     Query multiple Chroma collections using precomputed Mistral embeddings.
     Batch-safe retrieval & context trimming to avoid token errors.
     """
-    all_results = []
-
     # ✅ Get embedding for the question
     question_embedding = (await get_mistral_embeddings([question]))[0]
 
-    for name in collection_names:
-        try:
-            collection = get_or_create_collection(name)
-        except Exception as e:
-            raise ValueError(f"Collection '{name}' not found or invalid: {str(e)}")
-
-        results = collection.query(
-            query_embeddings=[question_embedding],
-            n_results=top_k
-        )
-
-        documents = results.get('documents', [[]])[0]
-        all_results.extend(documents)
-
-    # ✅ Deduplicate and trim size
-    unique_context = list(dict.fromkeys(all_results))[:MAX_CONTEXT_CHUNKS]
-    if not unique_context:
+    hits, _ = await retrieve(collection_names, question_embedding, top_k or settings.RAG_TOP_K, retrieval_deadline(deadline_ms))
+    if not hits:
         raise ValueError("No context found from the provided PDF collections.")
 
-    # ✅ Limit each chunk's size
-    trimmed_context = [(chunk[:MAX_CHUNK_CHARS] + "...") if len(chunk) > MAX_CHUNK_CHARS else chunk
-                       for chunk in unique_context]
-
-    context = "\n\n---\n\n".join(trimmed_context)
+    # ✅ Merge overlaps, drop near-duplicates, fit the model's token budget
+    budget = context_budget(CHAT_MODEL, PROMPT_TEMPLATE.format(context="", question=question))
+    context = pack_context(
+        [
+            {"text": hit["document"], "vector": hit.get("embedding"), "paper_id": hit["paper_id"], "position": chunk_position(hit["id"])}
+            for hit in hits
+        ],
+        budget,
+        query_vector=question_embedding,
+    )
 
     # Final prompt
     prompt = PROMPT_TEMPLATE.format(context=context, question=question)
 
-    # Send to Mistral safely
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        None,
-        lambda: mistral.chat(
-            model="mistral-medium",
-            messages=[{"role": "user", "content": prompt}]
-        )
-    )
-
-    return response.choices[0].message.content
+    # Send to Mistral through the shared gateway
+    return await chat(CHAT_MODEL, prompt)
 
 
 def parse_rag_output(output: str) -> dict:
@@ -112,71 +112,129 @@
 #     return parsed
 
 
-from app.db.chroma_db import get_or_create_collection
+from app.services.retrieval import retrieval_deadline, retrieve
 from app.utils.config import settings
 from app.services.embeddings import get_mistral_embeddings
-from mistralai.client import MistralClient
-import asyncio
+from app.services.embedding_client import EMBED_MODEL
+from app.services.query_cache import get_query_cache
+from app.services.context_packer import context_budget, pack_context
+from app.services.ingest_pipeline import chunk_position
+from app.services.llm_gateway import chat, chat_stream
+from app.services.rate_limiter import INTERACTIVE
+from typing import AsyncIterator, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
 
-mistral = MistralClient(api_key=settings.MISTRAL_API_KEY)
+CHAT_MODEL = "mistral-medium"
+PROMPT_VERSION = "ask-v2"    # bump when the prompt changes so cached answers are retired
 
-MAX_CONTEXT_CHUNKS = 50      # max total chunks retrieved
-MAX_CHUNK_CHARS = 1500       # trim each chunk to avoid token overflow
 
-async def query_multi_pdf_collections(collection_names: list[str], question: str, top_k: int = 3) -> str:
+def build_prompt(context: str, question: str) -> str:
+    return (
+        f"You are an AI assistant helping to answer questions based on the following research papers content.\n\n"
+        f"Context:\n{context}\n\n"
+        f"Question:\n{question}\n\n"
+        f"Please provide a detailed and clear answer based on the context above."
+    )
+
+
+async def _answer_prompt(
+    collection_names: list[str],
+    question: str,
+    top_k: Optional[int],
+    deadline_ms: Optional[int],
+) -> Tuple[Optional[str], Optional[str], bool, str]:
     """
-    Query multiple Chroma collections using Mistral embeddings.
-    Retrieve context chunks relevant to the question, then ask the model to answer the question using that context.
+    (cached answer, prompt, complete, answer version) for a question. The prompt is
+    None on a cache hit; `complete` is False when the search hit its deadline.
     """
-    all_results = []
+    top_k = top_k or settings.RAG_TOP_K
+    answer_version = f"{PROMPT_VERSION}:{CHAT_MODEL}:top{top_k}"
+
+    cache = get_query_cache()
+    if cache is not None:
+        # Reads the shared collection generations from Redis; keep it off the event loop
+        answer = await run_in_threadpool(cache.get_answer, question, collection_names, answer_version)
+        if answer is not None:
+            return answer, None, True, answer_version
 
     # Get embedding for the question
-    question_embedding = (await get_mistral_embeddings([question]))[0]
-
-    # Retrieve relevant chunks from each collection
-    for name in collection_names:
-        try:
-            collection = get_or_create_collection(name)
-        except Exception as e:
-            raise ValueError(f"Collection '{name}' not found or invalid: {str(e)}")
-
-        results = collection.query(
-            query_embeddings=[question_embedding],
-            n_results=top_k
-        )
-        documents = results.get('documents', [[]])[0]
-        all_results.extend(documents)
-
-    # Deduplicate and limit total context size
-    unique_context = list(dict.fromkeys(all_results))[:MAX_CONTEXT_CHUNKS]
-    if not unique_context:
+    question_embedding = cache.get_vector(EMBED_MODEL, question) if cache is not None else None
+    if question_embedding is None:
+        question_embedding = (await get_mistral_embeddings([question], INTERACTIVE))[0]
+        if cache is not None:
+            cache.put_vector(EMBED_MODEL, question, question_embedding)
+
+    # Search every collection in parallel (vector + BM25) and keep the best top_k chunks overall
+    hits, complete = await retrieve(
+        collection_names, question_embedding, top_k, retrieval_deadline(deadline_ms), query_text=question
+    )
+    if not hits:
         raise ValueError("No context found from the provided PDF collections.")
 
-    # Trim each chunk to max chars
-    trimmed_context = [
-        (chunk[:MAX_CHUNK_CHARS] + "...") if len(chunk) > MAX_CHUNK_CHARS else chunk
-        for chunk in unique_context
-    ]
-
-    # Compose the context string to provide to the model
-    context = "\n\n---\n\n".join(trimmed_context)
+    # Merge overlapping neighbours, drop near-duplicates and fill the model's token budget
+    budget = context_budget(CHAT_MODEL, build_prompt("", question))
+    context = pack_context(
+        [
+            {"text": hit["document"], "vector": hit.get("embedding"), "paper_id": hit["paper_id"], "position": chunk_position(hit["id"])}
+            for hit in hits
+        ],
+        budget,
+        query_vector=question_embedding,
+    )
 
     # Compose a natural prompt combining context + user question
-    prompt = (
-        f"You are an AI assistant helping to answer questions based on the following research papers content.\n\n"
-        f"Context:\n{context}\n\n"
-        f"Question:\n{question}\n\n"
-        f"Please provide a detailed and clear answer based on the context above."
-    )
+    return None, build_prompt(context, question), complete, answer_version
 
-    # Send prompt to Mistral chat model safely
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        None,
-        lambda: mistral.chat(
-            model="mistral-medium",
-            messages=[{"role": "user", "content": prompt}]
-        )
-    )
 
-    return response.choices[0].message.content
+def _remember_answer(collection_names: list[str], question: str, answer_version: str, answer: str, complete: bool) -> None:
+    # Answers built from a deadline-truncated search are not reused
+    cache = get_query_cache()
+    if cache is not None and complete:
+        cache.put_answer(question, collection_names, answer_version, answer)
+
+
+async def query_multi_pdf_collections(
+    collection_names: list[str],
+    question: str,
+    top_k: Optional[int] = None,
+    deadline_ms: Optional[int] = None,
+) -> str:
+    """
+    Query multiple Chroma collections using Mistral embeddings.
+    Retrieve context chunks relevant to the question, then ask the model to answer the question using that context.
+    """
+    cached, prompt, complete, answer_version = await _answer_prompt(collection_names, question, top_k, deadline_ms)
+    if cached is not None:
+        return cached
+
+    # Send prompt to Mistral chat model through the shared gateway
+    answer = await chat(CHAT_MODEL, prompt, priority=INTERACTIVE)
+
+    await run_in_threadpool(_remember_answer, collection_names, question, answer_version, answer, complete)
+    return answer
+
+
+async def stream_multi_pdf_answer(
+    collection_names: list[str],
+    question: str,
+    top_k: Optional[int] = None,
+    deadline_ms: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """
+    Streaming form of `query_multi_pdf_collections`. Retrieval runs (and fails)
+    when awaited; the returned iterator then yields the answer as the model writes it.
+    A cached answer comes back as a single piece.
+    """
+    cached, prompt, complete, answer_version = await _answer_prompt(collection_names, question, top_k, deadline_ms)
+
+    async def pieces():
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async for delta in chat_stream(CHAT_MODEL, prompt, priority=INTERACTIVE):
+            parts.append(delta)
+            yield delta
+        await run_in_threadpool(_remember_answer, collection_names, question, answer_version, "".join(parts), complete)
+
+    return pieces()
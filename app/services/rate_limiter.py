@@ -0,0 +1,172 @@
+# app/services/rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, List, Mapping, Optional, Tuple
+
+from app.utils.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Priority lanes: a waiting interactive call is always let through before batch work
+INTERACTIVE = 0
+BATCH = 1
+
+
+class TokenBucket:
+    """
+    Allowance refilled continuously at `per_minute` units a minute, holding at most a
+    minute's worth. A request larger than the whole bucket goes through once the bucket
+    is full and leaves it in debt, so later requests wait for the refill. 0 = unlimited.
+    """
+
+    def __init__(self, per_minute: float, now: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` can be taken.
+        """
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.rate:
+            self._refill(now)
+            self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        # Correction once the real usage is known (negative when the estimate was low)
+        if self.rate:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimitScheduler:
+    """
+    Admits API calls within requests/min and tokens/min budgets shared by chat and
+    embedding traffic. Waiting calls are served by priority lane, first come first
+    served within a lane. While the API has asked us to back off (Retry-After),
+    nothing is admitted.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._clock = clock
+        now = clock()
+        self.requests = TokenBucket(requests_per_minute, now)
+        self.tokens = TokenBucket(tokens_per_minute, now)
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []   # heap of (lane, seq, tokens, future)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(not future.done() for _, _, _, future in self._waiters)
+
+    async def acquire(self, tokens: int, priority: int = BATCH) -> None:
+        """
+        Wait until a call of about `tokens` tokens may be sent.
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # A cancelled waiter is dropped from the heap by the next dispatch
+            self._dispatch()
+            raise
+
+    def settle(self, estimated: int, used: Optional[int]) -> None:
+        """
+        Correct the token budget with the usage the API reported for an admitted call.
+        """
+        if used is not None:
+            self.tokens.give_back(estimated - used)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Admit nothing for `seconds` (the API answered 429).
+        """
+        until = self._clock() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            logger.warning(f"⏸️ API rate limit hit; holding {self.waiting} waiting calls for {seconds:.1f}s")
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = self._clock()
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = max(
+                self._paused_until - now,
+                self.requests.delay(1, now),
+                self.tokens.delay(tokens, now),
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            future.set_result(None)
+
+
+_scheduler: Optional[RateLimitScheduler] = None
+_scheduler_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_rate_limiter() -> RateLimitScheduler:
+    """
+    Scheduler shared by every Mistral call in the process. Its waiters are futures of
+    the running loop, so, like the pooled clients, a new one is made for a different loop.
+    """
+    global _scheduler, _scheduler_loop
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = RateLimitScheduler(settings.LLM_REQUESTS_PER_MINUTE, settings.LLM_TOKENS_PER_MINUTE)
+        _scheduler_loop = loop
+    return _scheduler
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Delay requested by a Retry-After header (seconds or HTTP date), if any.
+    """
+    value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,210 @@
+# app/services/retrieval.py
+
+import asyncio
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.db.chroma_db import get_chunks_by_id, is_shared_mode, query_paper, query_shared
+from app.db.collection_catalog import get_collection_catalog
+from app.services.lexical_index import search_papers
+from app.utils.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Dedicated pool for blocking vector searches, so they neither run on the
+    event loop nor compete with the default executor.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RETRIEVAL_MAX_WORKERS,
+                thread_name_prefix="vector-search",
+            )
+    return _executor
+
+
+def retrieval_deadline(deadline_ms: Optional[int] = None) -> Optional[float]:
+    """
+    Search deadline in seconds from a per-request value, falling back to the
+    configured default; None means no deadline.
+    """
+    deadline_ms = deadline_ms or settings.RAG_RETRIEVAL_DEADLINE_MS
+    return deadline_ms / 1000 if deadline_ms and deadline_ms > 0 else None
+
+
+def merge_top_k(hit_lists: List[List[Dict]], top_k: int) -> List[Dict]:
+    """
+    Global top-k across per-paper result lists, by ascending distance.
+    """
+    return heapq.nsmallest(top_k, (hit for hits in hit_lists for hit in hits), key=lambda hit: hit["distance"])
+
+
+def fuse_rrf(rankings: List[List[Dict]], top_k: int, k: int) -> List[Dict]:
+    """
+    Reciprocal rank fusion: each hit scores sum(1 / (k + rank)) over the rankings
+    it appears in. Hits are identified by (paper_id, id); the first copy seen is kept.
+    """
+    fused: Dict[Tuple[str, str], Dict] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = (hit["paper_id"], hit["id"])
+            entry = fused.setdefault(key, {**hit, "score": 0.0})
+            if entry.get("document") is None:
+                entry["document"], entry["embedding"] = hit.get("document"), hit.get("embedding")
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: -hit["score"])[:top_k]
+
+
+def _lexical_hits(paper_ids: List[str], query_text: str, depth: int) -> List[Dict]:
+    return [
+        {"id": chunk_id, "document": None, "distance": None, "paper_id": paper_id, "embedding": None}
+        for paper_id, chunk_id, _ in search_papers(paper_ids, query_text, depth)
+    ]
+
+
+def _fill_documents(hits: List[Dict]) -> List[Dict]:
+    """
+    Fetch the text (and vector) of hits that only came from the lexical index.
+    """
+    missing: Dict[str, List[Dict]] = {}
+    for hit in hits:
+        if hit.get("document") is None:
+            missing.setdefault(hit["paper_id"], []).append(hit)
+
+    for paper_id, paper_hits in missing.items():
+        stored = get_chunks_by_id(paper_id, [hit["id"] for hit in paper_hits], include=["documents", "embeddings"])
+        rows = {chunk_id: i for i, chunk_id in enumerate(stored["ids"])}
+        for hit in paper_hits:
+            row = rows.get(hit["id"])
+            if row is not None:
+                hit["document"] = stored["documents"][row]
+                hit["embedding"] = stored["embeddings"][row]
+
+    return [hit for hit in hits if hit.get("document")]
+
+
+def _prefiltered_search(paper_ids: List[str], query_embedding: List[float], query_text: str, depth: int) -> Optional[List[List[Dict]]]:
+    """
+    For very large libraries: take BM25 candidates first and score only those
+    against the query vector. Returns [dense ranking, lexical ranking], or None
+    if the query matches no terms (the caller then falls back to a full search).
+    """
+    candidates = _lexical_hits(paper_ids, query_text, settings.LEXICAL_PREFILTER_CANDIDATES)
+    if not candidates:
+        return None
+
+    by_paper: Dict[str, List[Dict]] = {}
+    for hit in candidates:
+        by_paper.setdefault(hit["paper_id"], []).append(hit)
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    for paper_id, paper_hits in by_paper.items():
+        stored = get_chunks_by_id(paper_id, [hit["id"] for hit in paper_hits], include=["documents", "embeddings"])
+        rows = {chunk_id: i for i, chunk_id in enumerate(stored["ids"])}
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32).reshape(len(rows), -1)
+        # Squared L2, the same metric (and scale) as Chroma's default distance
+        distances = ((vectors - query) ** 2).sum(axis=1) if len(rows) else np.empty(0)
+        for hit in paper_hits:
+            row = rows.get(hit["id"])
+            if row is not None:
+                hit["document"] = stored["documents"][row]
+                hit["embedding"] = vectors[row]
+                hit["distance"] = float(distances[row])
+
+    scored = [hit for hit in candidates if hit["distance"] is not None]
+    dense = heapq.nsmallest(depth, scored, key=lambda hit: hit["distance"])
+    return [dense, scored[:depth]]
+
+
+async def _wait(futures: List[asyncio.Future], deadline: Optional[float], what: str) -> Tuple[List, bool]:
+    """
+    Results of the futures that finished within the deadline, in order
+    (None for the rest), and whether all of them finished.
+    """
+    done, pending = await asyncio.wait(futures, timeout=deadline)
+    for future in pending:
+        future.cancel()
+    if pending:
+        logger.warning(f"⏱️ Retrieval deadline of {deadline}s hit: using {len(done)} of {len(futures)} {what}")
+
+    results = []
+    for future in futures:
+        if future in pending:
+            results.append(None)
+            continue
+        error = future.exception()
+        if error:
+            raise error
+        results.append(future.result())
+    return results, not pending
+
+
+async def retrieve(
+    paper_ids: List[str],
+    query_embedding: List[float],
+    top_k: int,
+    deadline: Optional[float] = None,
+    query_text: Optional[str] = None,
+) -> Tuple[List[Dict], bool]:
+    """
+    Search every paper concurrently off the event loop and merge into a global top-k.
+
+    With `query_text` (and HYBRID_RETRIEVAL on), a BM25 search over the papers'
+    lexical indexes runs alongside the vector searches and the two rankings are
+    combined with reciprocal rank fusion. Libraries of LEXICAL_PREFILTER_MIN_CHUNKS
+    chunks or more are searched lexically first, scoring only those candidates by vector.
+
+    With a `deadline` (seconds), searches still running when it expires are abandoned
+    and the top-k is taken from whatever finished in time. Returns (hits, complete),
+    where `complete` is False if any search was cut off.
+
+    Raises UnknownCollectionError if any paper has no stored chunks.
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    started = loop.time()
+    catalog = get_collection_catalog()
+    paper_ids = await loop.run_in_executor(executor, catalog.require, paper_ids)
+    hybrid = bool(query_text and query_text.strip()) and settings.HYBRID_RETRIEVAL
+    depth = max(top_k, settings.HYBRID_CANDIDATES) if hybrid else top_k
+
+    if hybrid and settings.LEXICAL_PREFILTER_MIN_CHUNKS > 0:
+        # Counts are cached by the catalog (every paper was just looked up by `require`)
+        if catalog.total_chunks(paper_ids) >= settings.LEXICAL_PREFILTER_MIN_CHUNKS:
+            future = loop.run_in_executor(executor, _prefiltered_search, paper_ids, query_embedding, query_text, depth)
+            remaining = None if deadline is None else max(0.0, deadline - (loop.time() - started))
+            (rankings,), complete = await _wait([future], remaining, "prefiltered searches")
+            if not complete:
+                return [], False
+            if rankings is not None:
+                return fuse_rrf(rankings, top_k, settings.RRF_K), True
+
+    if is_shared_mode():
+        futures = [loop.run_in_executor(executor, query_shared, query_embedding, depth, paper_ids)]
+    else:
+        futures = [loop.run_in_executor(executor, query_paper, paper_id, query_embedding, depth) for paper_id in paper_ids]
+    if hybrid:
+        futures.append(loop.run_in_executor(executor, _lexical_hits, paper_ids, query_text, depth))
+
+    remaining = None if deadline is None else max(0.0, deadline - (loop.time() - started))
+    results, complete = await _wait(futures, remaining, "searches")
+    lexical = results.pop() if hybrid else None
+    dense = merge_top_k([hits for hits in results if hits is not None], depth)
+
+    if not lexical:
+        return dense[:top_k], complete
+
+    fused = fuse_rrf([dense, lexical], top_k, settings.RRF_K)
+    return await loop.run_in_executor(executor, _fill_documents, fused), complete
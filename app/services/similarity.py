@@ -0,0 +1,164 @@
+# app/services/similarity.py
+
+from typing import List, Optional, Sequence, Tuple, Union
+import logging
+import math
+
+import numpy as np
+
+from app.services.quantization import CODE_DTYPES, FLOAT32, INT8, QuantizedVectors, quantize, rows_float32
+
+logger = logging.getLogger("uvicorn.error")
+
+# Default cap on the similarity tile held in memory at once
+DEFAULT_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """
+    Row-normalize a float32 matrix in place (zero rows stay zero) and return it.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def stack_papers(paper_vectors: Sequence, kind: str = FLOAT32) -> Tuple[Union[np.ndarray, QuantizedVectors], List[int]]:
+    """
+    Stack every paper's chunk vectors into one L2-normalized matrix, float32 or
+    quantized (`kind`). Paper i owns rows offsets[i]:offsets[i + 1].
+
+    Quantized matrices are filled paper by paper, so no float32 copy of the whole
+    set is ever held.
+    """
+    offsets = [0]
+    for vectors in paper_vectors:
+        offsets.append(offsets[-1] + len(vectors))
+
+    dim = next((np.shape(v)[1] for v in paper_vectors if len(v)), 0)
+    if kind == FLOAT32:
+        matrix = np.empty((offsets[-1], dim), dtype=np.float32)
+        for i, vectors in enumerate(paper_vectors):
+            if len(vectors):
+                matrix[offsets[i]:offsets[i + 1]] = np.asarray(vectors, dtype=np.float32)
+        return l2_normalize(matrix), offsets
+
+    codes = np.empty((offsets[-1], dim), dtype=CODE_DTYPES[kind])
+    scales = np.empty(offsets[-1], dtype=np.float32) if kind == INT8 else None
+    for i, vectors in enumerate(paper_vectors):
+        if len(vectors):
+            part = quantize(vectors, kind, normalize=True)
+            codes[offsets[i]:offsets[i + 1]] = part.codes
+            if scales is not None:
+                scales[offsets[i]:offsets[i + 1]] = part.scales
+    return QuantizedVectors(kind, codes, scales), offsets
+
+
+def _normalized(vectors) -> Union[np.ndarray, QuantizedVectors]:
+    if isinstance(vectors, QuantizedVectors):
+        return quantize(vectors, vectors.kind, normalize=True)
+    return l2_normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def _tile_shape(n_rows: int, n_cols: int, block_bytes: int) -> Tuple[int, int]:
+    """
+    Tile (rows, cols) whose float32 scores fit in block_bytes.
+    """
+    elems = max(1, block_bytes // 4)
+    if n_rows * n_cols <= elems:
+        return max(1, n_rows), max(1, n_cols)
+    row_block = max(1, min(n_rows, int(math.sqrt(elems))))
+    col_block = max(1, min(n_cols, elems // row_block))
+    row_block = max(1, min(n_rows, elems // col_block))
+    return row_block, col_block
+
+
+def blocked_top1(
+    rows,
+    cols,
+    block_bytes: int = DEFAULT_BLOCK_BYTES,
+    with_cols: bool = False,
+) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Best match of every row of `rows` among `cols` (both L2-normalized float32),
+    streaming fixed-size tiles through a BLAS matmul and keeping only running
+    maxima and argmaxima. Peak extra memory is one tile of at most `block_bytes`.
+
+    Either side may be QuantizedVectors; only the slices feeding the current tile
+    are widened to float32 (BLAS has no float16/int8 GEMM).
+
+    Returns (row_max, row_arg, col_max, col_arg); the column results are only
+    computed when `with_cols` is set, otherwise they are None.
+    """
+    n_rows, n_cols = len(rows), len(cols)
+    row_max = np.full(n_rows, -np.inf, dtype=np.float32)
+    row_arg = np.full(n_rows, -1, dtype=np.int64)
+    col_max = np.full(n_cols, -np.inf, dtype=np.float32) if with_cols else None
+    col_arg = np.full(n_cols, -1, dtype=np.int64) if with_cols else None
+    if not n_rows or not n_cols:
+        return row_max, row_arg, col_max, col_arg
+
+    row_block, col_block = _tile_shape(n_rows, n_cols, block_bytes)
+    buffer = np.empty(row_block * col_block, dtype=np.float32)
+
+    for c0 in range(0, n_cols, col_block):
+        c1 = min(c0 + col_block, n_cols)
+        cols_t = np.ascontiguousarray(rows_float32(cols, c0, c1).T)
+        for r0 in range(0, n_rows, row_block):
+            r1 = min(r0 + row_block, n_rows)
+            tile = buffer[:(r1 - r0) * (c1 - c0)].reshape(r1 - r0, c1 - c0)
+            np.matmul(rows_float32(rows, r0, r1), cols_t, out=tile)
+
+            arg = tile.argmax(axis=1)
+            best = tile[np.arange(r1 - r0), arg]
+            better = best > row_max[r0:r1]
+            row_max[r0:r1][better] = best[better]
+            row_arg[r0:r1][better] = arg[better] + c0
+
+            if with_cols:
+                arg = tile.argmax(axis=0)
+                best = tile[arg, np.arange(c1 - c0)]
+                better = best > col_max[c0:c1]
+                col_max[c0:c1][better] = best[better]
+                col_arg[c0:c1][better] = arg[better] + r0
+
+    return row_max, row_arg, col_max, col_arg
+
+
+def novelty_scores(base, others, block_bytes: int = DEFAULT_BLOCK_BYTES) -> np.ndarray:
+    """
+    Per-chunk novelty of `base` against `others`: 1 - best cosine similarity.
+    Inputs are raw vectors; float32 arrays are normalized in place (no copy),
+    quantized ones are renormalized in their own representation.
+    """
+    base = _normalized(base)
+    others = _normalized(others)
+    row_max, _, _, _ = blocked_top1(base, others, block_bytes)
+    return 1.0 - row_max
+
+
+def max_similarity_to_others(matrix, offsets: List[int], block_bytes: int = DEFAULT_BLOCK_BYTES) -> List[np.ndarray]:
+    """
+    For every chunk, the highest cosine similarity to any chunk of a *different* paper.
+
+    Each cross-paper block is computed once (i < j), tile by tile, and feeds both
+    papers: its row maxima update paper i, its column maxima update paper j.
+    Papers with no other paper to compare against get -inf.
+    """
+    papers = len(offsets) - 1
+    best = [np.full(offsets[i + 1] - offsets[i], -np.inf, dtype=np.float32) for i in range(papers)]
+
+    for i in range(papers):
+        rows = matrix[offsets[i]:offsets[i + 1]]
+        if not len(rows):
+            continue
+        for j in range(i + 1, papers):
+            cols = matrix[offsets[j]:offsets[j + 1]]
+            if not len(cols):
+                continue
+            row_max, _, col_max, _ = blocked_top1(rows, cols, block_bytes, with_cols=True)
+            np.maximum(best[i], row_max, out=best[i])
+            np.maximum(best[j], col_max, out=best[j])
+
+    return best
@@ -1,71 +1,335 @@
 import asyncio
-from mistralai.client import MistralClient
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+from app.models.chunk_summary import ChunkSummary
+from app.models.pdf_log import PDFLog
+from app.services.context_packer import context_budget, count_tokens, fill_budget
+from app.services.llm_gateway import chat, chat_stream
 from app.utils.config import settings
-from typing import List
+from app.utils.hashing import sha256_hex, text_sha256
 from app.utils.text_splitter import chunk_text  # import your better splitter
 import logging
 
 logger = logging.getLogger("uvicorn.error")
 
-mistral = MistralClient(api_key=settings.MISTRAL_API_KEY)
+SUMMARY_MODEL = "mistral-medium"
+# Bump when a prompt or the chunking changes: stored summaries made with the old one are regenerated
+CHUNK_PROMPT_VERSION = "chunk-v1"
+PAPER_PROMPT_VERSION = "paper-v1"
+REDUCE_PROMPT_VERSION = "reduce-v1"
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP = 150
 
+# Stages reported through SummaryProgress
+MAP = "map"
+REDUCE = "reduce"
+FINAL = "final"
 
-async def summarize_chunk(chunk: str, idx: int, total: int) -> str:
-    prompt = f"""
+PARTIAL_SEPARATOR = "\n\n"
+PARTIAL_SEPARATOR_TOKENS = count_tokens(PARTIAL_SEPARATOR)
+
+
+def chunk_summary_key(chunk: str, idx: int, total: int) -> str:
+    # The prompt names the chunk's position, so it is part of the key
+    return sha256_hex(CHUNK_PROMPT_VERSION, SUMMARY_MODEL, idx, total, text_sha256(chunk))
+
+def paper_summary_key(text_hash: str) -> str:
+    # Everything that shapes the final summary: prompts, model, chunking and reduce grouping
+    return sha256_hex(
+        PAPER_PROMPT_VERSION, CHUNK_PROMPT_VERSION, REDUCE_PROMPT_VERSION, SUMMARY_MODEL,
+        CHUNK_TOKENS, CHUNK_OVERLAP, settings.SUMMARY_REDUCE_MAX_TOKENS, text_hash,
+    )
+
+def _record_summary_key(record: PDFLog) -> str:
+    # Ingest stores the hash of full_text; only rows from before it was recorded are hashed here
+    return paper_summary_key(record.text_sha256 or text_sha256(record.full_text or ""))
+
+class SummaryProgress:
+    """
+    Where a paper's summary is: `stage` is MAP (chunk summaries) or REDUCE (combining
+    them, `level` counting from 1); `done` of `total` calls have finished, `failed` of them failed.
+    """
+    __slots__ = ("stage", "level", "done", "total", "failed")
+
+    def __init__(self, stage: str, level: int, done: int, total: int, failed: int = 0):
+        self.stage = stage
+        self.level = level
+        self.done = done
+        self.total = total
+        self.failed = failed
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+ProgressCallback = Callable[[SummaryProgress], None]
+
+_slots: Optional[asyncio.Semaphore] = None
+_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _summary_slots() -> asyncio.Semaphore:
+    """
+    Process-wide cap on summary calls in flight, kept below LLM_MAX_CONCURRENCY so
+    a batch of long papers leaves gateway slots free for interactive requests.
+    Bound to the running loop, like the gateway's own semaphore.
+    """
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots_loop is not loop:
+        _slots = asyncio.Semaphore(settings.SUMMARY_MAX_CONCURRENCY)
+        _slots_loop = loop
+    return _slots
+
+async def _summary_call(prompt: str) -> str:
+    async with _summary_slots():
+        return (await chat(SUMMARY_MODEL, prompt)).strip()
+
+def _report(progress: Optional[ProgressCallback], update: SummaryProgress) -> None:
+    logger.debug(f"Summary {update.stage} L{update.level}: {update.done}/{update.total} ({update.failed} failed)")
+    if progress is not None:
+        progress(update)
+
+async def _tolerant_calls(
+    prompts: List[str], stage: str, level: int, progress: Optional[ProgressCallback]
+) -> List[Optional[str]]:
+    """
+    Run summary calls concurrently under the summary cap. A call that still fails after
+    the gateway's retries yields None, unless more than SUMMARY_MAX_FAILED_FRACTION
+    of the calls (or all of them) fail, in which case the first error is raised.
+    """
+    total = len(prompts)
+    counts = {"done": 0, "failed": 0}
+    _report(progress, SummaryProgress(stage, level, 0, total))
+
+    async def run(prompt: str):
+        try:
+            return await _summary_call(prompt)
+        except Exception as e:
+            logger.warning(f"⚠️ Summary {stage} call failed: {e!r}")
+            counts["failed"] += 1
+            return e
+        finally:
+            counts["done"] += 1
+            _report(progress, SummaryProgress(stage, level, counts["done"], total, counts["failed"]))
+
+    results = await asyncio.gather(*[run(prompt) for prompt in prompts])
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors and (len(errors) == total or len(errors) > settings.SUMMARY_MAX_FAILED_FRACTION * total):
+        raise errors[0]
+    return [None if isinstance(result, Exception) else result for result in results]
+
+async def _cached_summaries(
+    keys: List[str], prompts: List[str], stage: str, level: int, progress: Optional[ProgressCallback]
+) -> List[Optional[str]]:
+    """
+    Summaries for `prompts`: stored ones are read back from chunk_summaries; only the
+    missing ones are sent to the model, and those that succeed are stored. A failed
+    call leaves None in its place (see `_tolerant_calls`).
+    """
+    stored: Dict[str, str] = {
+        row.key: row.summary for row in await ChunkSummary.filter(key__in=list(set(keys)))
+    }
+    missing = [idx for idx, key in enumerate(keys) if key not in stored]
+
+    fresh = await _tolerant_calls([prompts[idx] for idx in missing], stage, level, progress) if missing else []
+    new_rows = {keys[idx]: summary for idx, summary in zip(missing, fresh) if summary is not None}
+    if new_rows:
+        # Another request may have stored the same summary meanwhile; either copy will do
+        await ChunkSummary.bulk_create(
+            [ChunkSummary(key=key, summary=summary) for key, summary in new_rows.items()], ignore_conflicts=True
+        )
+        stored.update(new_rows)
+
+    return [stored.get(key) for key in keys]
+
+def _chunk_prompt(chunk: str, idx: int, total: int) -> str:
+    return f"""
 You are a research assistant. Summarize the following chunk ({idx} of {total}) of a research paper text into 2-3 paragraphs.
 Avoid repeating information from previous chunks.
 
 Paper chunk:
 {chunk}
 """
-    loop = asyncio.get_running_loop()
-    response = await loop.run_in_executor(
-        None,
-        lambda: mistral.chat(
-            model="mistral-medium",
-            messages=[{"role": "user", "content": prompt}]
-        )
-    )
-    summary = response.choices[0].message.content.strip()
-    logger.debug(f"Chunk {idx}/{total} summary length: {len(summary)} chars")
-    return summary
 
-
-async def summarize_single_paper(paper_text: str) -> str:
+async def _chunk_summaries(paper_text: str, progress: Optional[ProgressCallback] = None) -> Tuple[List[str], int]:
+    """
+    (summaries of the paper's chunks in order, number of chunks that failed and are missing from them).
+    """
     # Use your improved sentence-aware chunker with tokens and overlap
-    chunks = chunk_text(paper_text, max_tokens=1500, overlap=150)  
-    logger.info(f"Paper split into {len(chunks)} chunks for summarization")
+    chunks = chunk_text(paper_text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP)
+    total = len(chunks)
+    keys = [chunk_summary_key(chunk, idx + 1, total) for idx, chunk in enumerate(chunks)]
+    prompts = [_chunk_prompt(chunk, idx + 1, total) for idx, chunk in enumerate(chunks)]
+
+    summaries = await _cached_summaries(keys, prompts, MAP, 0, progress)
+    kept = [summary for summary in summaries if summary is not None]
+    logger.info(f"Paper split into {total} chunks for summarization ({total - len(kept)} failed)")
+    return kept, total - len(kept)
 
-    # Summarize chunks concurrently for speed
-    chunk_summaries = await asyncio.gather(
-        *[summarize_chunk(chunk, idx + 1, len(chunks)) for idx, chunk in enumerate(chunks)]
+def _combine_prompt(partials: List[str]) -> str:
+    return (
+        "You are a research assistant. The following are consecutive partial summaries "
+        "of one research paper. Merge them into a single condensed summary that keeps "
+        "every key finding, method and result, in the order they appear.\n\n"
+        + PARTIAL_SEPARATOR.join(partials)
     )
 
-    # Aggregate summaries into a final combined summary
-    aggregate_prompt = (
+def _aggregate_prompt(chunk_summaries: List[str]) -> str:
+    return (
         "You are a research assistant. Combine the following partial summaries "
         "of a research paper into a clear, coherent, and concise overall summary "
         "in 3-4 paragraphs. Remove redundancies and synthesize key points.\n\n"
-        + "\n\n".join(chunk_summaries)
+        + PARTIAL_SEPARATOR.join(chunk_summaries)
     )
 
-    loop = asyncio.get_running_loop()
-    final_response = await loop.run_in_executor(
-        None,
-        lambda: mistral.chat(
-            model="mistral-medium",
-            messages=[{"role": "user", "content": aggregate_prompt}]
-        )
-    )
-    final_summary = final_response.choices[0].message.content.strip()
+def reduce_budget() -> int:
+    """
+    Tokens of partial summaries one combining prompt may hold.
+    """
+    overhead = max(_combine_prompt([]), _aggregate_prompt([]), key=len)
+    return min(context_budget(SUMMARY_MODEL, overhead), settings.SUMMARY_REDUCE_MAX_TOKENS)
+
+def _joined_tokens(partials: List[str]) -> int:
+    return sum(count_tokens(partial) for partial in partials) + PARTIAL_SEPARATOR_TOKENS * max(0, len(partials) - 1)
+
+def _group_partials(partials: List[str], budget: int) -> List[List[str]]:
+    """
+    Consecutive runs of partials that each fit `budget`. Every partial is first cut
+    to half the budget, so any two neighbours fit together and each level at least
+    halves the number of partials.
+    """
+    cap = (budget - PARTIAL_SEPARATOR_TOKENS) // 2
+    groups: List[List[str]] = []
+    used = 0
+    for partial in partials:
+        partial = (fill_budget([partial], cap) or [partial])[0]
+        cost = count_tokens(partial)
+        if groups and used + PARTIAL_SEPARATOR_TOKENS + cost <= budget:
+            groups[-1].append(partial)
+            used += PARTIAL_SEPARATOR_TOKENS + cost
+        else:
+            groups.append([partial])
+            used = cost
+    return groups
+
+async def _reduce_partials(partials: List[str], progress: Optional[ProgressCallback] = None) -> Tuple[List[str], int]:
+    """
+    Combine partial summaries level by level until they fit a single final prompt.
+    Returns (partials for the final prompt, number of groups that failed and were dropped).
+    Intermediate results are stored like chunk summaries, keyed by their inputs.
+    """
+    budget = reduce_budget()
+    level = 0
+    failed = 0
+    while len(partials) > 1 and _joined_tokens(partials) > budget:
+        level += 1
+        groups = _group_partials(partials, budget)
+        keys = [sha256_hex(REDUCE_PROMPT_VERSION, SUMMARY_MODEL, *map(text_sha256, group)) for group in groups]
+        combined = await _cached_summaries(keys, [_combine_prompt(group) for group in groups], REDUCE, level, progress)
+        failed += sum(summary is None for summary in combined)
+        partials = [summary for summary in combined if summary is not None]
+        logger.info(f"Reduce level {level}: {len(groups)} groups -> {len(partials)} partial summaries")
+    if partials and _joined_tokens(partials) > budget:
+        partials = fill_budget(partials, budget)
+    return partials, failed
+
+async def _final_partials(paper_text: str, progress: Optional[ProgressCallback] = None) -> Tuple[List[str], bool]:
+    """
+    Map-reduce up to the final prompt: (partial summaries that fit it, whether every
+    chunk and group made it in). An incomplete summary is served but not stored.
+    """
+    chunk_summaries, failed_chunks = await _chunk_summaries(paper_text, progress)
+    partials, failed_groups = await _reduce_partials(chunk_summaries, progress)
+    return partials, not (failed_chunks or failed_groups)
+
+async def _summarize_text(paper_text: str, progress: Optional[ProgressCallback] = None) -> Tuple[str, bool]:
+    partials, complete = await _final_partials(paper_text, progress)
+
+    # Aggregate summaries into a final combined summary
+    _report(progress, SummaryProgress(FINAL, 0, 0, 1))
+    async with _summary_slots():
+        final_summary = (await chat(SUMMARY_MODEL, _aggregate_prompt(partials))).strip()
+    _report(progress, SummaryProgress(FINAL, 0, 1, 1))
     logger.info(f"Final summary length: {len(final_summary)} chars")
 
-    return final_summary
+    return final_summary, complete
+
+async def summarize_single_paper(paper_text: str, progress: Optional[ProgressCallback] = None) -> str:
+    """
+    Map-reduce summary of a paper: chunks are summarized, the partial summaries are
+    combined in as many levels as the reduce budget requires, then merged by a final call.
+    """
+    return (await _summarize_text(paper_text, progress))[0]
+
+def stored_summary(record: PDFLog) -> Optional[str]:
+    """
+    The paper's persisted summary, if it was made from its current text with the current prompts.
+    """
+    if record.summary and record.summary_key == _record_summary_key(record):
+        return record.summary
+    return None
+
+async def save_summary(record: PDFLog, summary: str) -> None:
+    record.summary = summary
+    record.summary_key = _record_summary_key(record)
+    await record.save(update_fields=["summary", "summary_key"])
+
+async def summarize_record(record: PDFLog, progress: Optional[ProgressCallback] = None) -> str:
+    """
+    Summary of a stored paper: read from PDFLog.summary while still current,
+    otherwise regenerated (reusing stored chunk summaries) and persisted.
+    """
+    summary = stored_summary(record)
+    if summary is not None:
+        logger.info(f"Serving stored summary for '{record.title}'")
+        return summary
 
+    summary, complete = await _summarize_text(record.full_text or "", progress)
+    if complete:
+        await save_summary(record, summary)
+    return summary
+
+async def stream_record_summary(record: PDFLog) -> AsyncIterator[Union[SummaryProgress, str]]:
+    """
+    Streaming form of `summarize_record`: SummaryProgress updates while the chunks are
+    summarized and combined, then the summary as text deltas while the final call writes it.
+    A stored summary comes back as a single piece.
+    """
+    summary = stored_summary(record)
+    if summary is not None:
+        yield summary
+        return
+
+    updates: asyncio.Queue = asyncio.Queue()
+    folding = asyncio.create_task(_final_partials(record.full_text or "", updates.put_nowait))
+    folding.add_done_callback(lambda _: updates.put_nowait(None))
+    try:
+        while (update := await updates.get()) is not None:
+            yield update
+        partials, complete = folding.result()
+    finally:
+        folding.cancel()
+
+    yield SummaryProgress(FINAL, 0, 0, 1)
+    parts = []
+    async with _summary_slots():
+        async for delta in chat_stream(SUMMARY_MODEL, _aggregate_prompt(partials)):
+            parts.append(delta)
+            yield delta
+    if complete:
+        await save_summary(record, "".join(parts).strip())
 
 async def summarize_papers(paper_titles: List[str], paper_texts: List[str]) -> List[dict]:
-    # Summarize all papers concurrently
+    # Papers run concurrently; their model calls share the summary cap
     tasks = [summarize_single_paper(text) for text in paper_texts]
     results = await asyncio.gather(*tasks)
 
     return [{"title": title, "summary": summary} for title, summary in zip(paper_titles, results)]
+
+async def summarize_records(records: List[PDFLog]) -> List[dict]:
+    """
+    `summarize_papers` for stored papers, served from and saved to PDFLog.summary.
+    """
+    results = await asyncio.gather(*[summarize_record(record) for record in records])
+
+    return [{"title": record.title, "summary": summary} for record, summary in zip(records, results)]
@@ -1,8 +1,33 @@
 import streamlit as st
 import requests
+import itertools
+import json
 
 API_BASE = "http://localhost:8000/api"
 
+
+def stream_events(url, **kwargs):
+    """
+    POST to a streaming endpoint and yield its NDJSON events as they arrive.
+    """
+    with requests.post(url, params={**kwargs.pop("params", {}), "format": "ndjson"}, stream=True, **kwargs) as res:
+        if not res.ok:
+            raise RuntimeError(res.text)
+        for line in res.iter_lines(decode_unicode=True):
+            if line:
+                event = json.loads(line)
+                if event["event"] == "error":
+                    raise RuntimeError(event["detail"])
+                yield event
+
+
+def comparison_markdown(paper):
+    return (
+        f"**Novel Insights:** {paper['novel_insights'][0]}\n\n"
+        f"**Similarities:** {paper['similarities'][0]}\n\n"
+        f"**Missing Gaps:** {paper['missing_gaps'][0]}"
+    )
+
 st.set_page_config(page_title="AutoResearch AI", layout="wide")
 st.title("🤖 AutoResearch AI Interface")
 
@@ -42,22 +67,35 @@ if option == "Upload & Compare PDFs":
 
     if st.session_state.uploaded_files:
         if 2 <= len(st.session_state.uploaded_files) <= 5:
+            shown = False
             if st.button("Upload and Analyze"):
                 files = [("files", (f.name, f.read(), "application/pdf")) for f in st.session_state.uploaded_files]
-                with st.spinner("Analyzing uploaded PDFs..."):
-                    res = requests.post(f"{API_BASE}/upload-and-compare", files=files)
-                if res.ok:
-                    st.session_state.comparison_results = res.json()
-                else:
-                    st.error(res.text)
+                results, live = {}, {}
+                try:
+                    with st.spinner("Analyzing uploaded PDFs..."):
+                        # Papers are compared concurrently; each is shown as it is written, then replaced by its parsed sections
+                        for event in stream_events(f"{API_BASE}/upload-and-compare/stream", files=files):
+                            if event["event"] == "paper":
+                                st.subheader(event["title"])
+                                live[event["index"]] = (st.empty(), [])
+                            elif event["event"] == "token":
+                                placeholder, parts = live[event["index"]]
+                                parts.append(event["text"])
+                                placeholder.markdown("".join(parts))
+                            elif event["event"] == "result":
+                                paper = {key: event[key] for key in ("title", "novel_insights", "similarities", "missing_gaps")}
+                                live[event["index"]][0].markdown(comparison_markdown(paper))
+                                results[event["index"]] = paper
+                    st.session_state.comparison_results = [results[i] for i in sorted(results)]
+                    shown = True
+                except RuntimeError as e:
+                    st.error(str(e))
 
             # Show cached results
-            if st.session_state.comparison_results:
+            if st.session_state.comparison_results and not shown:
                 for paper in st.session_state.comparison_results:
                     st.subheader(paper["title"])
-                    st.markdown(f"**Novel Insights:** {paper['novel_insights'][0]}")
-                    st.markdown(f"**Similarities:** {paper['similarities'][0]}")
-                    st.markdown(f"**Missing Gaps:** {paper['missing_gaps'][0]}")
+                    st.markdown(comparison_markdown(paper))
         else:
             st.warning("Please upload between 2 to 5 PDFs.")
     else:
@@ -70,17 +108,31 @@ elif option == "Summarize Latest PDFs":
     limit = st.slider("How many recent PDFs?", min_value=1, max_value=5, value=st.session_state.get("summary_limit", 2))
     st.session_state.summary_limit = limit
 
+    shown = False
     if st.button("🧠 Generate Summaries"):
-        with st.spinner("Summarizing..."):
-            res = requests.post(f"{API_BASE}/generate-summary/latest?limit={limit}")
-        if res.ok:
-            st.session_state.summarized_results = res.json()
-        else:
-            st.error(res.text)
-
-    for item in st.session_state.get("summarized_results", []):
-        st.subheader(item["title"])
-        st.markdown(item["summary"])
+        summaries, live = {}, {}
+        try:
+            with st.spinner("Summarizing..."):
+                # Papers are summarized concurrently; each one's text fills in as it is written
+                for event in stream_events(f"{API_BASE}/generate-summary/latest/stream", params={"limit": limit}):
+                    if event["event"] == "paper":
+                        st.subheader(event["title"])
+                        live[event["index"]] = (st.empty(), [])
+                    elif event["event"] == "token":
+                        placeholder, parts = live[event["index"]]
+                        parts.append(event["text"])
+                        placeholder.markdown("".join(parts))
+                    elif event["event"] == "summary":
+                        summaries[event["index"]] = {"title": event["title"], "summary": event["summary"]}
+            st.session_state.summarized_results = [summaries[i] for i in sorted(summaries)]
+            shown = True
+        except RuntimeError as e:
+            st.error(str(e))
+
+    if not shown:
+        for item in st.session_state.get("summarized_results", []):
+            st.subheader(item["title"])
+            st.markdown(item["summary"])
 
 # === 4. Ask Question (RAG) ===
 elif option == "Ask Question (RAG)":
@@ -113,6 +165,7 @@ elif option == "Ask Question (RAG)":
     )
     st.session_state.selected_collections = selected_collections
 
+    answered = False
     if st.button("Ask"):
         if not question:
             st.warning("Please enter your question.")
@@ -120,14 +173,24 @@ elif option == "Ask Question (RAG)":
             st.warning("Please select at least one collection.")
         else:
             payload = {"question": question, "collection_names": selected_collections}
-            with st.spinner("Searching for answer..."):
-                res = requests.post(f"{API_BASE}/ask-question", json=payload)
-            if res.ok:
-                st.session_state.rag_answer = res.json().get("answer", "")
-            else:
-                st.error(res.text)
-
-    if st.session_state.get("rag_answer"):
+            st.session_state.rag_answer = ""
+            try:
+                with st.spinner("Searching for answer..."):
+                    events = stream_events(f"{API_BASE}/ask-question/stream", json=payload)
+                    first = next(events, None)   # the search is over once the first token arrives
+                st.success("✅ Answer:")
+                placeholder, parts = st.empty(), []
+                for event in itertools.chain([first] if first else [], events):
+                    if event["event"] == "token":
+                        parts.append(event["text"])
+                        placeholder.markdown("".join(parts))
+                    elif event["event"] == "done":
+                        st.session_state.rag_answer = event["answer"]
+                answered = True
+            except RuntimeError as e:
+                st.error(str(e))
+
+    if st.session_state.get("rag_answer") and not answered:
         st.success("✅ Answer:")
         st.markdown(st.session_state.rag_answer)
 
@@ -1,18 +1,140 @@
 # app/tasks.py
 
+import asyncio
+import logging
+import os
+
 from celery import Celery
+from tortoise import Tortoise
+
+from app.db.migrations import prepare_schema
+from app.services.embedding_client import close_http_client
+from app.services.llm_gateway import close_llm_client
+from app.services.ingest_pipeline import find_paper_by_content, ingest_files
 from app.utils.config import settings
+from app.utils.sanitizer import sanitize_collection_name
+
+logger = logging.getLogger("uvicorn.error")
 
 # Initialize Celery with Redis broker URL from .env
 celery_app = Celery(
     "autoresearch_tasks",
     broker=settings.REDIS_BROKER_URL,
+    backend=settings.REDIS_BACKEND_URL,
+)
+celery_app.conf.update(
+    task_track_started=True,
+    task_acks_late=True,              # a job lost with its worker is redelivered
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,     # ingest jobs are long; don't hoard them
+)
+
+# Rough completion fraction reported for each pipeline stage
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "extracting": 0.1,
+    "embedding": 0.3,
+    "storing": 0.8,
+    "done": 1.0,
+}
+
+
+def upload_path(content_sha256: str) -> str:
+    """
+    Content-addressed location of a stored upload.
+    """
+    return os.path.join(settings.UPLOAD_DIR, f"{content_sha256}.pdf")
+
+
+def ingest_job_id(content_sha256: str) -> str:
+    """
+    One job per document: re-uploading the same bytes maps to the same job.
+    """
+    return f"ingest-{content_sha256}"
+
+
+def claim_ingest_job(job_id: str) -> bool:
+    """
+    Atomically mark a job as queued (SET NX in the result backend's Redis).
+    False if another request has already queued it.
+    """
+    return bool(celery_app.backend.client.set(
+        f"{job_id}:queued", 1, nx=True, ex=settings.INGEST_QUEUED_TTL_SECONDS
+    ))
+
+
+def release_ingest_job(job_id: str) -> None:
+    """
+    Clear a job's queued marker so a later upload can queue it again.
+    """
+    celery_app.backend.client.delete(f"{job_id}:queued")
+
+
+async def _run_ingest(task, filename: str, content_sha256: str) -> dict:
+    await Tortoise.init(db_url=settings.DB_URL, modules={"models": ["app.models"]})
+    try:
+        # The worker may run before the API has migrated the tables
+        await prepare_schema()
+        # Idempotent: a retry (or a duplicate job) after success is a no-op
+        existing = await find_paper_by_content(content_sha256)
+        if existing:
+            return {"collection_name": existing.collection_name, "title": existing.title}
+
+        with open(upload_path(content_sha256), "rb") as f:
+            contents = f.read()
+
+        def on_progress(job: dict, stage: str):
+            task.update_state(
+                state="PROGRESS",
+                meta={"filename": filename, "stage": stage, "progress": STAGE_PROGRESS[stage]},
+            )
+
+        # Deterministic collection name + chunk ids make a partial earlier attempt safe to repeat
+        safe_name = sanitize_collection_name(filename.replace(".pdf", ""))
+        ingested = await ingest_files(
+            [{
+                "index": 0,
+                "filename": filename,
+                "contents": contents,
+                "content_sha256": content_sha256,
+                "collection_name": f"{safe_name}_{content_sha256[:8]}",
+            }],
+            on_progress=on_progress,
+        )
+        return ingested[0]
+    finally:
+        # Pooled clients are bound to this task's loop, which asyncio.run is about to close
+        await close_http_client()
+        await close_llm_client()
+        await Tortoise.close_connections()
+
+
+@celery_app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=settings.INGEST_TASK_MAX_RETRIES,
 )
+def ingest_pdf(self, filename: str, content_sha256: str) -> dict:
+    """
+    Extract, chunk, embed and store an uploaded PDF saved under UPLOAD_DIR.
+    """
+    logger.info(f"[CELERY] Ingest started for '{filename}' ({content_sha256[:12]})")
+    try:
+        result = asyncio.run(_run_ingest(self, filename, content_sha256))
+    except Exception:
+        # Out of retries: let the next upload of this file queue it afresh
+        if self.request.retries >= self.max_retries:
+            release_ingest_job(self.request.id)
+        raise
+
+    try:
+        os.remove(upload_path(content_sha256))
+    except FileNotFoundError:
+        pass
+    release_ingest_job(self.request.id)
 
-# Example: Background task to embed PDF (replace with real logic)
-@celery_app.task
-def embed_pdf(pdf_id: int):
-    print(f"[CELERY] Embedding started for PDF ID: {pdf_id}")
-    # Simulate time-consuming logic (like loading models, generating embeddings)
-    # You can import and call your actual PDF logic here
-    return {"status": "completed", "pdf_id": pdf_id}
+    logger.info(f"[CELERY] Ingest finished for '{filename}' -> '{result['collection_name']}'")
+    return {"status": "completed", "filename": filename, **result}
@@ -1,5 +1,7 @@
 # app/utils/config.py
 
+from typing import Dict
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import computed_field
 
@@ -10,6 +12,7 @@ class Settings(BaseSettings):
 
     # === Mistral AI ===
     MISTRAL_API_KEY: str
+    MISTRAL_API_BASE: str = "https://api.mistral.ai"   # chat and embeddings endpoint (e.g. a local fake API in tests)
 
     # === Instructor Model (local or HF path) ===
     INSTRUCTOR_MODEL_PATH: str = "hkunlp/instructor-xl"
@@ -25,6 +28,104 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: str = "6379"
 
+    # === Embedding cache ===
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_CACHE_PATH: str = "./embedding_cache/embeddings.sqlite3"
+    EMBED_CACHE_MAX_ENTRIES: int = 200_000     # rows kept on disk (LRU eviction)
+    EMBED_CACHE_MEMORY_ENTRIES: int = 5_000    # vectors kept in the in-memory tier
+
+    # === Embedding requests ===
+    EMBED_BATCH_MAX_TOKENS: int = 8_000        # token budget per embeddings request
+    EMBED_BATCH_MAX_ITEMS: int = 128           # hard cap on inputs per request
+    EMBED_MAX_CONCURRENCY: int = 4             # batches in flight at once
+    EMBED_REQUEST_TIMEOUT: float = 30.0
+    EMBED_RETRY_BASE_DELAY: float = 1.0        # seconds, doubled per attempt (+ jitter)
+
+    # === PDF extraction ===
+    PDF_PARALLEL_PAGE_THRESHOLD: int = 64      # pages before extraction fans out to processes
+    PDF_EXTRACT_WORKERS: int = 0               # 0 = one per CPU
+
+    # === Upload ingest pipeline ===
+    INGEST_EXTRACT_WORKERS: int = 4            # threads driving PDF extraction
+    INGEST_EMBED_WORKERS: int = 5              # files embedded concurrently
+    INGEST_QUEUE_SIZE: int = 2                 # bound on each inter-stage queue
+
+    # === Background ingest ===
+    UPLOAD_DIR: str = "./uploads"              # uploads waiting for a Celery worker
+    INGEST_TASK_MAX_RETRIES: int = 3
+    INGEST_QUEUED_TTL_SECONDS: int = 6 * 3600  # a queued-job marker outliving its job expires after this
+
+    # === LLM gateway ===
+    LLM_MAX_CONCURRENCY: int = 8               # chat calls in flight process-wide
+    LLM_REQUEST_TIMEOUT: float = 120.0         # seconds per call (per delta when streaming)
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 1.0          # seconds, doubled per attempt (+ jitter)
+
+    # === Rate limits (shared by chat and embedding calls) ===
+    LLM_REQUESTS_PER_MINUTE: int = 0           # workspace request quota; 0 = unlimited
+    LLM_TOKENS_PER_MINUTE: int = 0             # workspace token quota; 0 = unlimited
+    LLM_COMPLETION_TOKEN_ESTIMATE: int = 1_024 # answer tokens charged per chat call until usage is reported
+
+    # === Summarization ===
+    SUMMARY_MAX_CONCURRENCY: int = 4           # summary calls in flight process-wide (keep below LLM_MAX_CONCURRENCY)
+    SUMMARY_REDUCE_MAX_TOKENS: int = 8_000     # partial summaries combined per reduce call
+    SUMMARY_MAX_FAILED_FRACTION: float = 0.25  # chunk or reduce calls allowed to fail before a summary fails
+
+    # === Paper comparison ===
+    COMPARE_MAX_CONCURRENCY: int = 3           # papers of one comparison generated at once
+    COMPARE_DEADLINE_SECONDS: float = 300      # limit on generating all of a comparison's papers; 0 = none
+
+    # === Similarity kernels ===
+    SIMILARITY_BLOCK_BYTES: int = 64 * 1024 * 1024   # peak size of one similarity tile
+    EMBEDDING_QUANTIZATION: str = "float32"    # chunk vectors held for comparison: "float32", "float16" or "int8"
+
+    # === Vector storage ===
+    VECTOR_BACKEND: str = "chroma"             # "chroma" or "local" (memory-mapped matrix + IVF)
+    CHROMA_PATH: str = "./chroma_storage"
+    LOCAL_VECTOR_PATH: str = "./vector_storage"
+    IVF_MIN_ROWS: int = 20_000                 # collection size at which the local backend builds an IVF index
+    IVF_NPROBE: int = 16                       # IVF lists scanned per query
+    VECTOR_QUANTIZATION: str = "float32"       # local backend scan copy: "float32", "float16" or "int8"
+    VECTOR_RERANK_FACTOR: int = 4              # quantized hits re-scored in float32 per result (0 = off)
+    VECTOR_STORE_MODE: str = "per_paper"       # "per_paper" or "shared" (one collection, paper_id metadata)
+    SHARED_COLLECTION_NAME: str = "papers"
+    CATALOG_REFRESH_SECONDS: float = 60        # max age of the collection catalog's paper list
+
+    # === Retrieval ===
+    RETRIEVAL_MAX_WORKERS: int = 8             # threads running vector searches
+    RAG_TOP_K: int = 12                        # chunks kept after merging all papers' hits
+    RAG_RETRIEVAL_DEADLINE_MS: int = 0         # default search deadline; 0 = wait for every paper
+
+    # === Lexical (BM25) retrieval ===
+    HYBRID_RETRIEVAL: bool = True              # fuse BM25 with vector search for questions
+    LEXICAL_INDEX_DIR: str = "./lexical_index"
+    LEXICAL_INDEX_CACHE_ENTRIES: int = 256     # paper indexes kept in memory
+    HYBRID_CANDIDATES: int = 50                # depth of each ranking before fusion
+    RRF_K: int = 60                            # reciprocal rank fusion constant
+    LEXICAL_PREFILTER_MIN_CHUNKS: int = 200_000   # library size that switches to BM25-first; 0 = never
+    LEXICAL_PREFILTER_CANDIDATES: int = 2_000     # BM25 candidates scored by vector in that mode
+
+    # === Question cache ===
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_VECTOR_CACHE_ENTRIES: int = 4_096    # normalized question -> query embedding
+    QUERY_VECTOR_CACHE_TTL: float = 24 * 3600  # seconds
+    ANSWER_CACHE_ENTRIES: int = 1_024          # (question, collections, prompt version) -> answer
+    ANSWER_CACHE_TTL: float = 3600             # seconds
+    QUERY_CACHE_SHARED_GENERATIONS: bool = True  # collection generations in Redis, so every API and worker process sees re-ingests
+
+    # === Prompt context packing ===
+    MODEL_CONTEXT_TOKENS: Dict[str, int] = {   # context window per chat model
+        "mistral-medium": 32_000,
+        "mistral-medium-latest": 128_000,
+        "mistral-small-latest": 32_000,
+        "mistral-large-latest": 128_000,
+    }
+    DEFAULT_CONTEXT_TOKENS: int = 32_000       # window assumed for models not listed above
+    ANSWER_TOKEN_RESERVE: int = 2_048          # room left for the completion
+    CONTEXT_MAX_TOKENS: int = 12_000           # cap on context tokens regardless of window
+    CONTEXT_MMR_LAMBDA: float = 0.7            # relevance vs diversity when ordering context
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.95  # cosine at which a chunk counts as a duplicate
+
     # === Computed Fields ===
     @computed_field
     @property
@@ -36,6 +137,11 @@ class Settings(BaseSettings):
     def REDIS_BROKER_URL(self) -> str:
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/0"
 
+    @computed_field
+    @property
+    def REDIS_BACKEND_URL(self) -> str:
+        return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/1"
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -0,0 +1,37 @@
+# app/utils/hashing.py
+
+import hashlib
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a text used for content hashing:
+    NFKC unicode, collapsed whitespace, no leading/trailing spaces.
+    """
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def sha256_hex(*parts) -> str:
+    """
+    SHA-256 hex digest of one or more str/bytes parts (NUL separated).
+    """
+    digest = hashlib.sha256()
+    for i, part in enumerate(parts):
+        if i:
+            digest.update(b"\x00")
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    """
+    Fingerprint of a document's text, stable across whitespace/unicode differences.
+    """
+    return sha256_hex(normalize_text(text))
@@ -22,4 +22,3 @@ def sanitize_text(text: str) -> str:
         return ""
     # Remove NULL bytes and trim
     return text.replace("\x00", "").strip()
-
@@ -1,6 +1,6 @@
 import tiktoken
 from nltk.tokenize import sent_tokenize
-from typing import List
+from typing import Dict, List, Tuple
 import logging
 
 # Setup logger
@@ -12,43 +12,98 @@ encoding = tiktoken.get_encoding("cl100k_base")
 def get_token_count(text: str) -> int:
     return len(encoding.encode(text))
 
+
+def sentence_segments(text: str) -> List[Tuple[int, int]]:
+    """
+    Character spans of sentences, each extended over the whitespace that follows it,
+    so consecutive segments tile the text with no gaps.
+    """
+    starts = []
+    pos = 0
+    for sentence in sent_tokenize(text):
+        found = text.find(sentence, pos)
+        if found == -1:
+            # Tokenizer normalised the sentence; keep the previous boundary
+            continue
+        starts.append(found)
+        pos = found + len(sentence)
+
+    if not starts:
+        return [(0, len(text))] if text.strip() else []
+    return [(start, end) for start, end in zip(starts, starts[1:] + [len(text)])]
+
+
+def _token_units(text: str, spans: List[Tuple[int, int]], max_tokens: int) -> List[Tuple[int, int, int]]:
+    """
+    Encode every segment once (encode_batch) and return (start, end, token_count) units.
+    Segments longer than max_tokens are cut at token boundaries using
+    the token-to-character offsets of that segment.
+    """
+    units = []
+    token_lists = encoding.encode_batch([text[start:end] for start, end in spans])
+
+    for (start, end), tokens in zip(spans, token_lists):
+        if len(tokens) <= max_tokens:
+            units.append((start, end, len(tokens)))
+            continue
+
+        _, offsets = encoding.decode_with_offsets(tokens)
+        for i in range(0, len(tokens), max_tokens):
+            piece_start = start + offsets[i]
+            piece_end = start + offsets[i + max_tokens] if i + max_tokens < len(tokens) else end
+            if piece_end > piece_start:
+                units.append((piece_start, piece_end, min(max_tokens, len(tokens) - i)))
+
+    return units
+
+
+def split_into_chunks(text: str, max_tokens: int = 2048, overlap: int = 100) -> List[Dict]:
+    """
+    Single-pass, sentence-aligned chunking with token overlap.
+
+    Each sentence is tokenized once; windows are cut from running token counts, so each
+    chunk holds at most `max_tokens` tokens without re-encoding. Returns dicts with
+    `text`, `start`/`end` character offsets and `token_count`.
+    """
+    chunks = []
+    window: List[Tuple[int, int, int]] = []
+    total = 0
+
+    def emit():
+        chunk = text[window[0][0]:window[-1][1]].strip()
+        if chunk:
+            chunks.append({"text": chunk, "start": window[0][0], "end": window[-1][1], "token_count": total})
+
+    for unit in _token_units(text, sentence_segments(text), max_tokens):
+        if window and total + unit[2] > max_tokens:
+            emit()
+
+            # Carry trailing sentences that fit in the overlap budget, always dropping the first
+            keep = []
+            carried = 0
+            for prev in reversed(window[1:]):
+                if carried + prev[2] > overlap:
+                    break
+                keep.insert(0, prev)
+                carried += prev[2]
+            window, total = keep, carried
+
+            while window and total + unit[2] > max_tokens:
+                total -= window.pop(0)[2]
+
+        window.append(unit)
+        total += unit[2]
+
+    if window:
+        emit()
+    return chunks
+
+
 def chunk_text(text: str, max_tokens: int = 2048, overlap: int = 100) -> List[str]:
     """
     Splits text into token-limited chunks using sentence-based splitting and overlap.
     """
-    sentences = sent_tokenize(text)
-    chunks = []
-    current_chunk = []
-    current_len = 0
-
-    for sentence in sentences:
-        sentence_len = get_token_count(sentence)
-
-        if current_len + sentence_len > max_tokens:
-            chunks.append(" ".join(current_chunk))
-
-            # Apply overlap logic
-            if overlap > 0:
-                overlap_sentences = []
-                total = 0
-                for s in reversed(current_chunk):
-                    slen = get_token_count(s)
-                    if total + slen <= overlap:
-                        overlap_sentences.insert(0, s)
-                        total += slen
-                    else:
-                        break
-                current_chunk = overlap_sentences
-                current_len = total
-            else:
-                current_chunk = []
-                current_len = 0
-
-        current_chunk.append(sentence)
-        current_len += sentence_len
-
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
+    chunks = [chunk["text"] for chunk in split_into_chunks(text, max_tokens, overlap)]
 
     logger.debug(f"📚 Text split into {len(chunks)} chunks (max_tokens={max_tokens}, overlap={overlap})")
 
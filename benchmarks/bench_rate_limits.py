@@ -0,0 +1,185 @@
+# benchmarks/bench_rate_limits.py
+#
+# LLM request scheduling against a local fake Mistral API that enforces a
+# requests/min quota (answering 429 + Retry-After past it) and injects random
+# 429s on top. A batch of summary-style chat calls and embedding batches runs
+# while interactive questions arrive at a steady pace; each run reports the
+# 429s the API served, batch throughput and interactive latency (p50/p95),
+# first with the scheduler's quota off (429 handling only), then with it set
+# to the API's quota.
+#
+# Usage (from the repo root):
+#   PYTHONPATH=. python benchmarks/bench_rate_limits.py --rpm 600 --batch 120 --interactive 20
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fake_api(rpm: int, inject: float, latency: float, stats: dict):
+    """
+    FastAPI app speaking enough of the chat and embeddings API for the clients,
+    with a sliding one-minute request window of `rpm` requests.
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    lock = threading.Lock()
+
+    def admit():
+        window = stats["window"]
+        now = time.monotonic()
+        with lock:
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if len(window) >= rpm:
+                return 60 - (now - window[0])
+            if random.random() < inject:
+                return 1.0
+            window.append(now)
+            return None
+
+    def too_many(retry_after: float):
+        stats["429"] += 1
+        return JSONResponse({"message": "Requests rate limit exceeded"}, status_code=429,
+                            headers={"Retry-After": f"{retry_after:.2f}"})
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        retry_after = admit()
+        if retry_after is not None:
+            return too_many(retry_after)
+        body = await request.json()
+        await asyncio.sleep(latency)
+        stats["ok"] += 1
+        prompt = body["messages"][-1]["content"]
+        return {
+            "id": "fake", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": f"answer to {len(prompt)} chars"},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 50, "total_tokens": len(prompt) // 4 + 50},
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        retry_after = admit()
+        if retry_after is not None:
+            return too_many(retry_after)
+        body = await request.json()
+        await asyncio.sleep(latency / 4)
+        stats["ok"] += 1
+        return {
+            "id": "fake", "object": "list", "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": [0.0] * 8} for i in range(len(body["input"]))],
+            "usage": {"prompt_tokens": 10, "total_tokens": 10},
+        }
+
+    return app
+
+
+def serve(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def workload(args) -> dict:
+    from app.services.embedding_client import close_http_client, dispatch_embeddings
+    from app.services.llm_gateway import chat, close_llm_client
+    from app.services.rate_limiter import INTERACTIVE
+
+    interactive_ms = []
+    failures = {"batch": 0, "interactive": 0}
+
+    async def batch_call(i: int):
+        try:
+            if i % 4 == 0:
+                await dispatch_embeddings([f"chunk {i} {j} " * 20 for j in range(16)])
+            else:
+                await chat("mistral-medium", f"Summarize chunk {i}: " + "lorem ipsum " * 300)
+        except Exception:
+            failures["batch"] += 1
+
+    async def questions():
+        for i in range(args.interactive):
+            await asyncio.sleep(args.question_interval)
+            started = time.perf_counter()
+            try:
+                await chat("mistral-medium", f"Question {i}?", priority=INTERACTIVE)
+                interactive_ms.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                failures["interactive"] += 1
+
+    started = time.perf_counter()
+    batch = asyncio.gather(*[batch_call(i) for i in range(args.batch)])
+    await asyncio.gather(batch, questions())
+    elapsed = time.perf_counter() - started
+    await close_llm_client()
+    await close_http_client()
+
+    latencies = np.array(interactive_ms or [float("nan")])
+    return {
+        "elapsed_s": elapsed,
+        "batch_per_s": args.batch / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rpm", type=int, default=600, help="quota enforced by the fake API")
+    parser.add_argument("--inject", type=float, default=0.02, help="fraction of requests answered 429 regardless")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake chat completion")
+    parser.add_argument("--batch", type=int, default=120, help="batch calls (every 4th is an embeddings batch)")
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--question-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    port = _free_port()
+    os.environ["MISTRAL_API_BASE"] = f"http://127.0.0.1:{port}"
+    for name in ("MISTRAL_API_KEY", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB", "DB_HOST", "DB_PORT"):
+        os.environ.setdefault(name, "bench")
+    os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+
+    from app.utils.config import settings
+
+    stats = {"429": 0, "ok": 0, "window": deque()}
+    serve(fake_api(args.rpm, args.inject, args.latency, stats), port)
+
+    print(f"fake API: {args.rpm} req/min, {args.inject:.0%} injected 429s, {args.latency}s per completion")
+    print(f"{'scheduler':<16} {'429s':>6} {'batch/s':>8} {'total s':>8} {'q p50 ms':>9} {'q p95 ms':>9}  failures")
+    for label, rpm in (("429 only", 0), (f"{args.rpm} rpm", args.rpm)):
+        settings.LLM_REQUESTS_PER_MINUTE = rpm
+        # Each run starts with the API's quota untouched
+        stats.update({"429": 0, "ok": 0, "window": deque()})
+        result = asyncio.run(workload(args))
+        print(
+            f"{label:<16} {stats['429']:>6} {result['batch_per_s']:>8.1f} {result['elapsed_s']:>8.1f} "
+            f"{result['p50_ms']:>9.0f} {result['p95_ms']:>9.0f}  {result['failures']}"
+        )
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_shared_collection.py
+#
+# Multi-paper query latency: one Chroma collection per paper queried in a loop
+# (per_paper mode) vs one shared collection queried once with a paper_id filter
+# (shared mode), as the number of papers in the question grows.
+#
+# "cold" reopens the store first, so per-collection index loads are included.
+#
+# Usage (from the repo root):
+#   python benchmarks/bench_shared_collection.py --papers 1 5 10 20 50 --chunks 150
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+
+def build(path: str, n_papers: int, chunks: int, dim: int) -> None:
+    client = chromadb.PersistentClient(path=path)
+    shared = client.get_or_create_collection("papers")
+    rng = np.random.default_rng(0)
+    for p in range(n_papers):
+        name = f"paper_{p}"
+        vectors = rng.standard_normal((chunks, dim), dtype=np.float32)
+        ids = [str(i) for i in range(chunks)]
+        documents = [f"{name} chunk {i}" for i in range(chunks)]
+        client.get_or_create_collection(name).add(ids=ids, documents=documents, embeddings=vectors)
+        shared.add(
+            ids=[f"{name}:{i}" for i in ids],
+            documents=documents,
+            embeddings=vectors,
+            metadatas=[{"paper_id": name, "collection_name": name}] * chunks,
+        )
+
+
+def query_per_paper(client, names, query, top_k):
+    hits = []
+    for name in names:
+        results = client.get_collection(name).query(query_embeddings=[query], n_results=top_k)
+        hits.extend(results["documents"][0])
+    return hits
+
+
+def query_shared(client, names, query, top_k):
+    results = client.get_collection("papers").query(
+        query_embeddings=[query],
+        n_results=top_k * len(names),
+        where={"paper_id": {"$in": names}},
+    )
+    return results["documents"][0]
+
+
+def time_ms(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="per_paper vs shared collection query latency")
+    parser.add_argument("--papers", type=int, nargs="+", default=[1, 5, 10, 20, 50])
+    parser.add_argument("--chunks", type=int, default=150, help="chunks per paper")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="bench_chroma_")
+    print(f"Building {max(args.papers)} papers x {args.chunks} chunks in {path} ...")
+    build(path, max(args.papers), args.chunks, args.dim)
+
+    rng = np.random.default_rng(1)
+    print(f"{'papers':>6} {'per_paper cold':>15} {'shared cold':>12} {'per_paper p50':>14} {'shared p50':>11}  (ms)")
+    for n in args.papers:
+        names = [f"paper_{p}" for p in range(n)]
+        query = rng.standard_normal(args.dim).astype(np.float32).tolist()
+
+        # Fresh clients so neither layout starts with its indexes in memory
+        chromadb.api.client.SharedSystemClient.clear_system_cache()
+        cold_per_paper = time_ms(query_per_paper, chromadb.PersistentClient(path=path), names, query, args.top_k)
+        chromadb.api.client.SharedSystemClient.clear_system_cache()
+        cold_shared = time_ms(query_shared, chromadb.PersistentClient(path=path), names, query, args.top_k)
+
+        client = chromadb.PersistentClient(path=path)
+        warm_per_paper = [time_ms(query_per_paper, client, names, query, args.top_k) for _ in range(args.repeats)]
+        warm_shared = [time_ms(query_shared, client, names, query, args.top_k) for _ in range(args.repeats)]
+
+        print(
+            f"{n:>6} {cold_per_paper:>15.1f} {cold_shared:>12.1f} "
+            f"{statistics.median(warm_per_paper):>14.1f} {statistics.median(warm_shared):>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_similarity.py
+#
+# Novelty kernel benchmark: full cosine_similarity matrix + Python max(row)
+# (the previous get_unique_chunks) vs the blocked top-1 kernel.
+# Each run happens in a fresh process so peak RSS is measured in isolation.
+#
+# Usage (from the repo root):
+#   PYTHONPATH=. python benchmarks/bench_similarity.py --base 3000 --others 12000 --block-mb 64
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+
+import numpy as np
+
+
+def _make_data(n_base: int, n_others: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((n_base, dim), dtype=np.float32)
+    others = rng.standard_normal((n_others, dim), dtype=np.float32)
+    return base, others
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_baseline(args, queue):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    base, others = _make_data(args.base, args.others, args.dim)
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    similarities = cosine_similarity(base, others)
+    unique = [i for i, row in enumerate(similarities) if max(row) < args.threshold]
+    elapsed = time.perf_counter() - start
+    queue.put(("baseline (cosine_similarity + max(row))", elapsed, _peak_rss_mb(), rss_before, len(unique)))
+
+
+def _run_blocked(args, queue):
+    from app.services.similarity import novelty_scores
+
+    base, others = _make_data(args.base, args.others, args.dim)
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    scores = novelty_scores(base, others, block_bytes=args.block_mb * 1024 * 1024)
+    unique = np.flatnonzero(scores > 1.0 - args.threshold)
+    elapsed = time.perf_counter() - start
+    queue.put((f"blocked top-1 ({args.block_mb} MB tiles)", elapsed, _peak_rss_mb(), rss_before, len(unique)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base", type=int, default=3000, help="chunks in the base paper")
+    parser.add_argument("--others", type=int, default=12000, help="chunks across the other papers")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--block-mb", type=int, default=64)
+    parser.add_argument("--threshold", type=float, default=0.60)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    runners = [_run_blocked] if args.skip_baseline else [_run_baseline, _run_blocked]
+    print(f"base={args.base} others={args.others} dim={args.dim}")
+    print(f"{'implementation':45} {'time (s)':>9} {'peak RSS (MB)':>14} {'data RSS (MB)':>14} {'unique':>7}")
+
+    ctx = multiprocessing.get_context("spawn")
+    for runner in runners:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=runner, args=(args, queue))
+        proc.start()
+        name, elapsed, peak, before, unique = queue.get()
+        proc.join()
+        print(f"{name:45} {elapsed:9.2f} {peak:14.0f} {before:14.0f} {unique:7d}")
+
+
+if __name__ == "__main__":
+    main()
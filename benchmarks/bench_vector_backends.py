@@ -0,0 +1,200 @@
+# benchmarks/bench_vector_backends.py
+#
+# VectorStore backends compared on one corpus: Chroma vs the local memory-mapped
+# IVF store. Reports ingest throughput, cold start (open + first query), warm
+# query latency (p50/p99, unfiltered and filtered to a few papers), recall@k
+# against exact search, and RSS growth over the process baseline (the corpus
+# itself excluded). Each backend runs in a fresh process.
+#
+# The corpus is either synthetic (clustered, like real embeddings) or copied
+# from an existing Chroma store with --from-chroma, to measure on the real library.
+#
+# Usage (from the repo root):
+#   PYTHONPATH=. python benchmarks/bench_vector_backends.py --papers 200 --chunks 150
+#   PYTHONPATH=. python benchmarks/bench_vector_backends.py --from-chroma ./chroma_storage
+
+import argparse
+import multiprocessing
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+COLLECTION = "bench"
+BATCH = 500
+
+
+def _rss_mb() -> float:
+    """
+    Current RSS on Linux; elsewhere falls back to the peak (ru_maxrss).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _synthetic_corpus(papers: int, chunks: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(8, papers // 4), dim), dtype=np.float32)
+    paper_topic = topics[rng.integers(len(topics), size=papers)]
+    vectors = np.repeat(paper_topic, chunks, axis=0) + 0.6 * rng.standard_normal((papers * chunks, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    paper_ids = np.repeat([f"paper_{p}" for p in range(papers)], chunks)
+    return vectors, paper_ids.tolist()
+
+
+def _chroma_corpus(path: str):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    vectors, paper_ids = [], []
+    for collection in client.list_collections():
+        data = collection.get(include=["embeddings"])
+        if len(data["ids"]):
+            vectors.append(np.asarray(data["embeddings"], dtype=np.float32))
+            paper_ids.extend([collection.name] * len(data["ids"]))
+    return np.vstack(vectors), paper_ids
+
+
+def _queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(len(vectors), size=count)] + 0.3 * rng.standard_normal((count, vectors.shape[1]), dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, mask=None):
+    truth = []
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    for query in queries:
+        distances = norms - 2.0 * (vectors @ query)
+        if mask is not None:
+            distances = np.where(mask, distances, np.inf)
+        truth.append(set(np.argsort(distances)[:k].tolist()))
+    return truth
+
+
+def _open_store(backend: str, path: str):
+    if backend == "chroma":
+        from app.db.chroma_store import ChromaVectorStore
+        return ChromaVectorStore(path)
+    from app.db.local_store import LocalVectorStore
+    from app.utils.config import settings
+    return LocalVectorStore(
+        path,
+        ivf_min_rows=settings.IVF_MIN_ROWS,
+        nprobe=settings.IVF_NPROBE,
+        quantization=settings.VECTOR_QUANTIZATION,
+        rerank_factor=settings.VECTOR_RERANK_FACTOR,
+    )
+
+
+def _run_ingest(backend, path, vectors, paper_ids, queue):
+    baseline = _rss_mb()
+    store = _open_store(backend, path)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), BATCH):
+        ids = [str(j) for j in range(i, min(i + BATCH, len(vectors)))]
+        store.add(
+            COLLECTION,
+            ids,
+            [f"chunk {j}" for j in ids],
+            vectors[i:i + BATCH],
+            metadatas=[{"paper_id": paper_ids[int(j)]} for j in ids],
+        )
+    queue.put((time.perf_counter() - start, _rss_mb() - baseline))
+
+
+def _run_queries(backend, path, queries, filter_papers, k, queue):
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    store = _open_store(backend, path)
+    first = store.query(COLLECTION, queries[0].tolist(), k, include=[])
+    cold = time.perf_counter() - start
+
+    plain, filtered, plain_ids, filtered_ids = [], [], [], []
+    where = {"paper_id": {"$in": filter_papers}}
+    for query in queries:
+        t = time.perf_counter()
+        plain_ids.append(store.query(COLLECTION, query.tolist(), k, include=[])["ids"])
+        plain.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        filtered_ids.append(store.query(COLLECTION, query.tolist(), k, where=where, include=[])["ids"])
+        filtered.append(time.perf_counter() - t)
+
+    queue.put((cold, plain, filtered, plain_ids, filtered_ids, _rss_mb() - baseline, len(first["ids"])))
+
+
+def _in_process(target, *args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=target, args=(*args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _recall(found, truth) -> float:
+    hits = [len({int(i) for i in ids} & expected) / max(1, len(expected)) for ids, expected in zip(found, truth)]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma vs local IVF vector store")
+    parser.add_argument("--papers", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=150, help="chunks per paper (synthetic corpus)")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--from-chroma", help="copy the corpus from this Chroma storage path instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--filter-papers", type=int, default=5, help="papers in the filtered queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "local"])
+    args = parser.parse_args()
+
+    if args.from_chroma:
+        vectors, paper_ids = _chroma_corpus(args.from_chroma)
+    else:
+        vectors, paper_ids = _synthetic_corpus(args.papers, args.chunks, args.dim)
+    queries = _queries(vectors, args.queries)
+    papers = list(dict.fromkeys(paper_ids))
+    filter_papers = papers[:args.filter_papers]
+    mask = np.isin(np.asarray(paper_ids), filter_papers)
+
+    print(f"corpus: {len(vectors)} chunks x {vectors.shape[1]} dims, {len(papers)} papers; {len(queries)} queries, k={args.top_k}")
+    truth = _exact_top_k(vectors, queries, args.top_k)
+    filtered_truth = _exact_top_k(vectors, queries, args.top_k, mask)
+
+    print(
+        f"{'backend':8} {'ingest/s':>9} {'ingest RSS':>10} {'cold (ms)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+        f"{'recall':>7} {'filt p50':>9} {'filt p99':>9} {'filt rec':>9} {'query RSS':>10}"
+    )
+    for backend in args.backends:
+        path = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+        try:
+            ingest_s, ingest_rss = _in_process(_run_ingest, backend, path, vectors, paper_ids)
+            cold, plain, filtered, plain_ids, filtered_ids, query_rss, _ = _in_process(
+                _run_queries, backend, path, queries, filter_papers, args.top_k
+            )
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+        ms = lambda values, q: float(np.percentile(values, q)) * 1000
+        print(
+            f"{backend:8} {len(vectors) / ingest_s:9.0f} {ingest_rss:10.0f} {cold * 1000:10.1f} "
+            f"{ms(plain, 50):9.2f} {ms(plain, 99):9.2f} {_recall(plain_ids, truth):7.3f} "
+            f"{ms(filtered, 50):9.2f} {ms(filtered, 99):9.2f} {_recall(filtered_ids, filtered_truth):9.3f} {query_rss:10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/report_quantization.py
+#
+# What float16 / int8 embeddings cost and save on one corpus:
+#   - storage: bytes per vector and for the whole corpus, against float32 and
+#     against the list-of-Python-floats form chunks used to be passed around in
+#   - retrieval: recall@k of the local store scanning the quantized copy, with
+#     and without the float32 re-rank, against exact float32 search
+#   - novelty: how many "unique chunk" decisions (best cross-paper similarity
+#     below the threshold) change, and the largest similarity error
+#
+# The corpus is synthetic (clustered, like real embeddings) or read from an
+# existing Chroma store with --from-chroma, to measure on the real library.
+#
+# Usage (from the repo root):
+#   PYTHONPATH=. python benchmarks/report_quantization.py --papers 100 --chunks 150
+#   PYTHONPATH=. python benchmarks/report_quantization.py --from-chroma ./chroma_storage
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_vector_backends import BATCH, _chroma_corpus, _exact_top_k, _queries, _recall, _synthetic_corpus
+
+KINDS = ["float32", "float16", "int8"]
+COLLECTION = "report"
+
+
+def _python_list_bytes(vector: np.ndarray) -> int:
+    values = vector.tolist()
+    return sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+
+
+def _storage(vectors: np.ndarray) -> None:
+    from app.services.quantization import bytes_per_vector
+
+    n, dim = vectors.shape
+    float32 = bytes_per_vector(dim, "float32")
+    print(f"\nstorage ({n} vectors x {dim} dims)")
+    print(f"{'representation':16} {'bytes/vector':>13} {'corpus (MB)':>12} {'vs float32':>11}")
+    rows = [("python floats", _python_list_bytes(vectors[0]))] + [(kind, bytes_per_vector(dim, kind)) for kind in KINDS]
+    for name, size in rows:
+        print(f"{name:16} {size:13d} {n * size / 2**20:12.1f} {size / float32:10.2f}x")
+
+
+def _retrieval(vectors, paper_ids, queries, k: int, rerank_factor: int) -> None:
+    from app.db.local_store import LocalVectorStore
+
+    truth = _exact_top_k(vectors, queries, k)
+    print(f"\nretrieval (local store, exact scan, k={k})")
+    print(f"{'scan':10} {'re-rank':>8} {'recall':>7} {'p50 (ms)':>9}")
+    for kind in KINDS:
+        path = tempfile.mkdtemp(prefix=f"quant_{kind}_")
+        try:
+            store = LocalVectorStore(path, ivf_min_rows=len(vectors) + 1, quantization=kind, rerank_factor=0)
+            for i in range(0, len(vectors), BATCH):
+                ids = [str(j) for j in range(i, min(i + BATCH, len(vectors)))]
+                store.add(COLLECTION, ids, ids, vectors[i:i + BATCH], metadatas=[{"paper_id": paper_ids[int(j)]} for j in ids])
+
+            for factor in ([0] if kind == "float32" else [0, rerank_factor]):
+                store.rerank_factor = factor
+                found, times = [], []
+                for query in queries:
+                    t = time.perf_counter()
+                    found.append(store.query(COLLECTION, query.tolist(), k, include=[])["ids"])
+                    times.append(time.perf_counter() - t)
+                label = f"{factor}x" if factor else "-"
+                print(f"{kind:10} {label:>8} {_recall(found, truth):7.3f} {np.percentile(times, 50) * 1000:9.2f}")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _novelty(vectors, paper_ids, papers: int, threshold: float) -> None:
+    from app.services.similarity import max_similarity_to_others, stack_papers
+
+    names = list(dict.fromkeys(paper_ids))[:papers]
+    labels = np.asarray(paper_ids)
+    paper_vectors = [vectors[labels == name] for name in names]
+
+    reference = None
+    print(f"\nnovelty ({len(names)} papers, threshold {threshold})")
+    print(f"{'matrix':10} {'MB':>8} {'max |dsim|':>11} {'decisions changed':>18}")
+    for kind in KINDS:
+        matrix, offsets = stack_papers(paper_vectors, kind)
+        best = np.concatenate(max_similarity_to_others(matrix, offsets))
+        if reference is None:
+            reference = best
+        changed = int(np.sum((best < threshold) != (reference < threshold)))
+        print(f"{kind:10} {matrix.nbytes / 2**20:8.1f} {np.abs(best - reference).max():11.4f} {changed:9d} / {len(best)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage saved and accuracy lost by quantized embeddings")
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--chunks", type=int, default=150, help="chunks per paper (synthetic corpus)")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--from-chroma", help="read the corpus from this Chroma storage path instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--novelty-papers", type=int, default=20, help="papers compared all-pairs for novelty")
+    parser.add_argument("--threshold", type=float, default=0.60, help="novelty similarity threshold")
+    args = parser.parse_args()
+
+    if args.from_chroma:
+        vectors, paper_ids = _chroma_corpus(args.from_chroma)
+    else:
+        vectors, paper_ids = _synthetic_corpus(args.papers, args.chunks, args.dim)
+    queries = _queries(vectors, args.queries)
+
+    _storage(vectors)
+    _retrieval(vectors, paper_ids, queries, args.top_k, args.rerank_factor)
+    _novelty(vectors, paper_ids, args.novelty_papers, args.threshold)
+
+
+if __name__ == "__main__":
+    main()